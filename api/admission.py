@@ -0,0 +1,340 @@
+"""
+Admission Control
+Priority classes with bounded queues, concurrency shares and deadline-aware load shedding
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from .metrics import pipeline_metrics
+
+# Priority classes, highest first
+PRIORITY_CLASSES = ("interactive", "standard", "batch")
+
+# Concurrent admitted requests per worker (0 disables admission control)
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "0"))
+# Guaranteed share of the concurrency limit per class; idle share is lent to other classes
+ADMISSION_SHARES: Dict[str, float] = json.loads(
+    os.getenv("ADMISSION_SHARES", '{"interactive": 0.6, "standard": 0.3, "batch": 0.1}')
+)
+# Fraction of higher classes' unused guaranteed slots that lower classes may not borrow
+# (1 = guarantees are strict and classes without one only get spare slots; 0 = lend everything)
+ADMISSION_RESERVED_FRACTION = float(os.getenv("ADMISSION_RESERVED_FRACTION", "0.5"))
+# Queue bound per class; a full queue sheds new arrivals
+ADMISSION_QUEUE_LIMITS: Dict[str, int] = json.loads(
+    os.getenv("ADMISSION_QUEUE_LIMITS", '{"interactive": 50, "standard": 100, "batch": 500}')
+)
+# API key -> highest class it may use; other callers get ADMISSION_DEFAULT_CLASS
+ADMISSION_KEY_TIERS: Dict[str, str] = json.loads(os.getenv("ADMISSION_KEY_TIERS", "{}"))
+ADMISSION_DEFAULT_CLASS = os.getenv("ADMISSION_DEFAULT_CLASS", "standard")
+# Service-time estimate used until requests have completed
+ADMISSION_INITIAL_SERVICE_SECONDS = float(os.getenv("ADMISSION_INITIAL_SERVICE_SECONDS", "5"))
+ADMISSION_EWMA_ALPHA = 0.2
+
+# Header a caller can use to lower its own priority class
+PRIORITY_HEADER = "x-priority"
+# Highest class for /query/batch items and background jobs
+BACKGROUND_CLASS = "batch"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the suggested Retry-After in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """
+    A held admission slot
+
+    `release` is idempotent, so every exit path of a response that
+    outlives its handler (stream end, disconnect, background task,
+    garbage collection of a stream that never started) can call it.
+    It must run on the event loop that granted the slot.
+    """
+
+    __slots__ = ("controller", "priority", "started", "released", "loop")
+
+    def __init__(self, controller: "AdmissionController", priority: str):
+        self.controller = controller
+        self.priority = priority
+        self.started = time.monotonic()
+        self.released = False
+        self.loop = asyncio.get_running_loop()
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller.release(self.priority, time.monotonic() - self.started)
+
+    def __del__(self):
+        # Last resort for a streamed response whose body was never iterated. The
+        # collector may run on any thread, so the release is handed to the loop.
+        if not self.released:
+            try:
+                self.loop.call_soon_threadsafe(self.release)
+            except RuntimeError:
+                pass  # loop closed: nothing left to admit
+
+
+class AdmissionController:
+    """
+    Per-class queues in front of the query endpoints
+
+    At most `max_concurrent` requests run at once. Each class has a
+    guaranteed share of those slots (normalised to fit within the
+    limit). A class may borrow slots beyond its share only while
+    `reserved_fraction` of the unused guarantees of every higher class
+    stays free, so a saturating batch load still leaves headroom for
+    interactive requests to start at once; at 1.0 the guarantees are
+    strict. When a slot frees, classes below their share are served
+    first (highest priority first), then any class allowed to borrow,
+    in priority order. A request is shed with AdmissionRejected when its
+    class queue is full or its projected wait exceeds the time left
+    before its deadline.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        shares: Optional[Dict[str, float]] = None,
+        queue_limits: Optional[Dict[str, int]] = None,
+        key_tiers: Optional[Dict[str, str]] = None,
+        default_class: str = ADMISSION_DEFAULT_CLASS,
+        reserved_fraction: float = ADMISSION_RESERVED_FRACTION,
+    ):
+        shares = ADMISSION_SHARES if shares is None else shares
+        queue_limits = ADMISSION_QUEUE_LIMITS if queue_limits is None else queue_limits
+        for name in (*shares, *queue_limits, default_class, *(key_tiers or ADMISSION_KEY_TIERS).values()):
+            if name not in PRIORITY_CLASSES:
+                raise RuntimeError(f"Unknown priority class: {name}. Use one of {list(PRIORITY_CLASSES)}")
+        self.max_concurrent = max_concurrent
+        self.enabled = max_concurrent > 0
+        self.key_tiers = ADMISSION_KEY_TIERS if key_tiers is None else key_tiers
+        self.default_class = default_class
+        self.queue_limits = {c: int(queue_limits.get(c, 100)) for c in PRIORITY_CLASSES}
+        self.guaranteed = self._guarantees(shares, max_concurrent)
+        self.reserved_fraction = reserved_fraction
+        self.service_time = ADMISSION_INITIAL_SERVICE_SECONDS
+
+        self._queues: Dict[str, Deque[asyncio.Future]] = {c: deque() for c in PRIORITY_CLASSES}
+        self._in_flight = {c: 0 for c in PRIORITY_CLASSES}
+        self._running = 0
+
+        self.admitted_count = {c: 0 for c in PRIORITY_CLASSES}
+        self.shed = {c: 0 for c in PRIORITY_CLASSES}
+        self.total_wait = {c: 0.0 for c in PRIORITY_CLASSES}
+
+    @staticmethod
+    def _guarantees(shares: Dict[str, float], max_concurrent: int) -> Dict[str, int]:
+        """
+        Whole slots guaranteed per class, summing to at most `max_concurrent`
+
+        Shares are scaled down if they add up to more than 1; each class
+        with a share gets floor(share * limit), and classes rounded down
+        to zero get one slot each, highest priority first, while slots
+        remain.
+        """
+        total = sum(max(0.0, shares.get(c, 0)) for c in PRIORITY_CLASSES)
+        scale = 1 / total if total > 1 else 1.0
+        guaranteed = {
+            c: math.floor(max(0.0, shares.get(c, 0)) * scale * max_concurrent) for c in PRIORITY_CLASSES
+        }
+        for c in PRIORITY_CLASSES:
+            if guaranteed[c] == 0 and shares.get(c, 0) > 0 and sum(guaranteed.values()) < max_concurrent:
+                guaranteed[c] = 1
+        return guaranteed
+
+    def priority_for(self, api_key: Optional[str], requested: Optional[str]) -> str:
+        """
+        Priority class for a caller
+
+        The API key's tier is the highest class allowed; an X-Priority
+        header may only choose the same or a lower class.
+        """
+        ceiling = self.key_tiers.get(api_key, self.default_class) if api_key else self.default_class
+        if requested in PRIORITY_CLASSES and PRIORITY_CLASSES.index(requested) >= PRIORITY_CLASSES.index(ceiling):
+            return requested
+        return ceiling
+
+    def projected_wait(self, priority: str) -> float:
+        """Estimated seconds a request joining `priority`'s queue now would wait"""
+        slots = self.guaranteed[priority] or 1
+        return (len(self._queues[priority]) + 1) * self.service_time / slots
+
+    def _publish(self, priority: str) -> None:
+        pipeline_metrics.record_admission(priority, len(self._queues[priority]), self._in_flight[priority])
+
+    def _reject(self, priority: str, reason: str, wait: float) -> AdmissionRejected:
+        self.shed[priority] += 1
+        pipeline_metrics.record_shed(priority, reason)
+        return AdmissionRejected(reason, max(1, math.ceil(wait)))
+
+    def _can_run(self, priority: str) -> bool:
+        """Whether a `priority` request may take a free slot now"""
+        free = self.max_concurrent - self._running
+        if free <= 0:
+            return False
+        if self._in_flight[priority] < self.guaranteed[priority]:
+            return True
+        # Borrowing: keep (a fraction of) the unused guarantees of higher classes free
+        higher = PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority)]
+        unused = sum(max(0, self.guaranteed[c] - self._in_flight[c]) for c in higher)
+        return free > math.floor(unused * self.reserved_fraction)
+
+    def _grant(self, priority: str) -> None:
+        self._in_flight[priority] += 1
+        self._running += 1
+        self.admitted_count[priority] += 1
+
+    async def acquire(self, priority: str, remaining: Optional[float] = None, shed: bool = True) -> None:
+        """
+        Wait for a slot in `priority`, or raise AdmissionRejected
+
+        Args:
+            priority: One of PRIORITY_CLASSES
+            remaining: Seconds left before the request deadline, if any
+            shed: False for durable work (background jobs) that should
+                wait for a slot rather than be turned away when the queue
+                is full or the projected wait is long; it is still
+                rejected if its own deadline passes while queued
+        """
+        waiting_ahead = any(self._queues[c] for c in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1])
+        if not waiting_ahead and self._can_run(priority):
+            self._grant(priority)
+            self._publish(priority)
+            return
+
+        queue = self._queues[priority]
+        wait = self.projected_wait(priority)
+        if shed and len(queue) >= self.queue_limits[priority]:
+            raise self._reject(priority, "queue_full", wait)
+        if shed and remaining is not None and wait > remaining:
+            raise self._reject(priority, "deadline", wait)
+
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        self._publish(priority)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), remaining)
+        except asyncio.TimeoutError:
+            self._abandon(priority, future)
+            raise self._reject(priority, "deadline", self.projected_wait(priority))
+        except asyncio.CancelledError:
+            self._abandon(priority, future)
+            raise
+        waited = time.monotonic() - started
+        self.total_wait[priority] += waited
+        pipeline_metrics.observe_admission_wait(priority, waited)
+
+    def _abandon(self, priority: str, future: asyncio.Future) -> None:
+        """Drop a waiter that gave up, handing its slot on if it was granted meanwhile"""
+        if future.done():
+            self.release(priority)
+            return
+        future.cancel()
+        try:
+            self._queues[priority].remove(future)
+        except ValueError:
+            pass
+        self._publish(priority)
+
+    def release(self, priority: str, duration: Optional[float] = None) -> None:
+        """Free a slot and admit the next waiter"""
+        self._in_flight[priority] -= 1
+        self._running -= 1
+        if duration is not None:
+            self.service_time += ADMISSION_EWMA_ALPHA * (duration - self.service_time)
+        self._publish(priority)
+        self._dispatch()
+
+    def _next_class(self) -> Optional[str]:
+        waiting = [c for c in PRIORITY_CLASSES if self._queues[c]]
+        for priority in waiting:
+            if self._in_flight[priority] < self.guaranteed[priority]:
+                return priority
+        for priority in waiting:
+            if self._can_run(priority):
+                return priority
+        return None
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrent:
+            priority = self._next_class()
+            if priority is None:
+                return
+            future = self._queues[priority].popleft()
+            if future.done():
+                continue
+            self._grant(priority)
+            future.set_result(None)
+            self._publish(priority)
+
+    async def admit(
+        self, priority: str, remaining: Optional[float] = None, shed: bool = True
+    ) -> Optional[AdmissionTicket]:
+        """Acquire a slot for a response that outlives its handler (None when disabled)"""
+        if not self.enabled:
+            return None
+        await self.acquire(priority, remaining, shed)
+        return AdmissionTicket(self, priority)
+
+    @asynccontextmanager
+    async def admitted(
+        self, priority: str, remaining: Optional[float] = None, shed: bool = True
+    ) -> AsyncIterator[None]:
+        """Hold an admission slot for the body of the block (no-op when disabled)"""
+        ticket = await self.admit(priority, remaining, shed)
+        try:
+            yield
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    def stats(self) -> Dict:
+        """Per-class queue depth, running count, wait and shed counters for /stats"""
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "reserved_fraction": self.reserved_fraction,
+            "running": self._running,
+            "service_time_ms": round(self.service_time * 1000, 1),
+            "classes": {
+                c: {
+                    "guaranteed": self.guaranteed[c],
+                    "queue_limit": self.queue_limits[c],
+                    "queued": len(self._queues[c]),
+                    "in_flight": self._in_flight[c],
+                    "admitted": self.admitted_count[c],
+                    "shed": self.shed[c],
+                    "avg_wait_ms": round(self.total_wait[c] / self.admitted_count[c] * 1000, 1)
+                    if self.admitted_count[c] else 0.0,
+                    "projected_wait_ms": round(self.projected_wait(c) * 1000, 1) if self._queues[c] else 0.0,
+                }
+                for c in PRIORITY_CLASSES
+            },
+        }
+
+
+async def hold_while_streaming(ticket: Optional[AdmissionTicket], body: AsyncIterator) -> AsyncIterator:
+    """Yield from a response body, releasing `ticket` once the stream ends or is abandoned"""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+
+# Worker-wide instance
+admission_controller = AdmissionController()
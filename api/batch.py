@@ -0,0 +1,119 @@
+"""
+Batch Scheduling
+Parses batch uploads and bounds concurrency of prompt x model calls
+"""
+
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, Dict, List
+
+# Batch configuration (override via environment)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_PER_MODEL_CONCURRENCY = int(os.getenv("BATCH_PER_MODEL_CONCURRENCY", "4"))
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "10000"))
+# Batches with at least this many prompts to classify are classified on a worker thread
+BATCH_CLASSIFY_THREAD_MIN = int(os.getenv("BATCH_CLASSIFY_THREAD_MIN", "64"))
+
+
+class BatchParseError(ValueError):
+    """Raised when a batch body cannot be parsed"""
+
+
+def parse_batch_body(body: bytes, content_type: str) -> List[Dict]:
+    """
+    Parse a batch upload into raw request dicts
+
+    Accepts NDJSON (one request object per line) when the content type
+    mentions ndjson/jsonl, otherwise a JSON array or {"requests": [...]}.
+    """
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise BatchParseError(f"Body is not valid UTF-8 (byte {e.start})")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = []
+        for line_no, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise BatchParseError(f"Invalid JSON on line {line_no}: {e.msg}")
+    else:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise BatchParseError(f"Invalid JSON body: {e.msg}")
+        items = data.get("requests") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise BatchParseError("Body must be a JSON array or an object with a 'requests' array")
+
+    if not items:
+        raise BatchParseError("Batch is empty")
+    if len(items) > BATCH_MAX_PROMPTS:
+        raise BatchParseError(f"Batch exceeds the limit of {BATCH_MAX_PROMPTS} prompts")
+    return items
+
+
+class BatchScheduler:
+    """
+    Bounds upstream calls from batch jobs
+
+    Every call holds a slot on its model's semaphore and then on the
+    global semaphore, so a single slow model cannot occupy the whole
+    global budget while waiting for its own cap.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        per_model_concurrency: int = BATCH_PER_MODEL_CONCURRENCY,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_model_concurrency = per_model_concurrency
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._per_model: Dict[str, asyncio.Semaphore] = {}
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+
+    def _model_semaphore(self, model_id: str) -> asyncio.Semaphore:
+        sem = self._per_model.get(model_id)
+        if sem is None:
+            sem = self._per_model[model_id] = asyncio.Semaphore(self.per_model_concurrency)
+        return sem
+
+    async def call(self, model_id: str, fn: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Run one upstream call once a model slot and a global slot are free"""
+        self.waiting += 1
+        started = False
+        try:
+            async with self._model_semaphore(model_id):
+                async with self._global:
+                    self.waiting -= 1
+                    started = True
+                    self.active += 1
+                    try:
+                        return await fn()
+                    finally:
+                        self.active -= 1
+                        self.completed += 1
+        finally:
+            if not started:
+                # Cancelled while queued
+                self.waiting -= 1
+
+    def stats(self) -> Dict:
+        """Scheduler counters for /stats"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "per_model_concurrency": self.per_model_concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+        }
+
+
+# Worker-wide scheduler shared by all batch requests
+batch_scheduler = BatchScheduler()
@@ -0,0 +1,121 @@
+"""
+Circuit Breakers
+Per-model closed / open / half-open breakers so dead providers fail fast
+"""
+
+import os
+import time
+from typing import Dict
+
+# Breaker configuration (override via environment)
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Breaker for one model id
+
+    Opens after `failure_threshold` consecutive failures. After
+    `recovery_seconds` it lets up to `half_open_max_calls` probe calls
+    through; a successful probe closes it, a failed one re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        recovery_seconds: float = CIRCUIT_RECOVERY_SECONDS,
+        half_open_max_calls: int = CIRCUIT_HALF_OPEN_MAX_CALLS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+
+    def _refresh(self) -> None:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_seconds:
+            self.state = HALF_OPEN
+            self.probes = 0
+
+    def is_open(self) -> bool:
+        """True if calls would currently be rejected (does not consume a probe)"""
+        self._refresh()
+        if self.state == OPEN:
+            return True
+        return self.state == HALF_OPEN and self.probes >= self.half_open_max_calls
+
+    def allow(self) -> bool:
+        """Admit one call, consuming a probe slot when half-open"""
+        self._refresh()
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self.probes < self.half_open_max_calls:
+            self.probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self.probes = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probes = 0
+
+    def release(self) -> None:
+        """Return a probe slot for a call that was cancelled before finishing"""
+        if self.state == HALF_OPEN and self.probes:
+            self.probes -= 1
+
+
+class CircuitBreakerRegistry:
+    """Lazily created breaker per model id"""
+
+    def __init__(self, enabled: bool = CIRCUIT_BREAKER_ENABLED):
+        self.enabled = enabled
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, model_id: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model_id)
+        if breaker is None:
+            breaker = self._breakers[model_id] = CircuitBreaker()
+        return breaker
+
+    def is_open(self, model_id: str) -> bool:
+        if not self.enabled:
+            return False
+        breaker = self._breakers.get(model_id)
+        return breaker is not None and breaker.is_open()
+
+    def stats(self) -> Dict:
+        """Breaker states for /stats"""
+        return {
+            "enabled": self.enabled,
+            "models": {
+                model_id: {
+                    "state": breaker.state,
+                    "consecutive_failures": breaker.failures,
+                    "rejected": breaker.rejected,
+                }
+                for model_id, breaker in self._breakers.items()
+            },
+        }
+
+
+# Worker-wide instance
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,286 @@
+"""
+Response Compression
+Accept-Encoding negotiation (zstd, brotli, gzip) for buffered and streaming responses
+"""
+
+import asyncio
+import json
+import os
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Compression configuration (override via environment)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Buffered responses smaller than this are sent as-is
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Level per encoding (gzip 1-9, br 0-11, zstd 1-22)
+COMPRESSION_LEVELS: Dict[str, int] = json.loads(
+    os.getenv("COMPRESSION_LEVELS", '{"gzip": 6, "br": 4, "zstd": 3}')
+)
+# Server preference when the client accepts several encodings equally
+COMPRESSION_ENCODINGS: List[str] = json.loads(os.getenv("COMPRESSION_ENCODINGS", '["zstd", "br", "gzip"]'))
+# Payloads at least this large are compressed on a worker thread instead of the event loop
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", "16384"))
+
+# Content types worth compressing (prefix match on the media type)
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+)
+
+AVAILABLE_ENCODINGS = {
+    "gzip": True,
+    "br": brotli is not None,
+    "zstd": zstandard is not None,
+}
+
+
+class StreamCompressor:
+    """
+    Incremental compressor for one response
+
+    `compress` returns everything needed to decode the bytes seen so far
+    (each chunk ends with a flush), so streamed events reach the client
+    without waiting for later ones.
+    """
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk and flush it"""
+        if self.encoding == "gzip":
+            return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        """Compress the final chunk and end the stream"""
+        if self.encoding == "gzip":
+            return self._compressor.compress(data) + self._compressor.flush()
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class ResponseCompressor:
+    """
+    Encoding negotiation, settings and byte counters for CompressionMiddleware
+
+    Encodings whose library is not installed are never offered.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = COMPRESSION_ENABLED,
+        min_size: int = COMPRESSION_MIN_SIZE,
+        levels: Optional[Dict[str, int]] = None,
+        encodings: Optional[List[str]] = None,
+        thread_min_size: int = COMPRESSION_THREAD_MIN_SIZE,
+    ):
+        encodings = COMPRESSION_ENCODINGS if encodings is None else encodings
+        for name in encodings:
+            if name not in AVAILABLE_ENCODINGS:
+                raise RuntimeError(f"Unknown encoding: {name}. Use one of {list(AVAILABLE_ENCODINGS)}")
+        self.enabled = enabled
+        self.min_size = min_size
+        self.levels = COMPRESSION_LEVELS if levels is None else levels
+        self.encodings = [name for name in encodings if AVAILABLE_ENCODINGS[name]]
+        self.thread_min_size = thread_min_size
+
+        self.responses = {name: 0 for name in self.encodings}
+        self.bytes_in = {name: 0 for name in self.encodings}
+        self.bytes_out = {name: 0 for name in self.encodings}
+        self.skipped_small = 0
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """
+        Pick an encoding from an Accept-Encoding header
+
+        The highest q-value wins; ties go to the earlier entry in
+        `encodings`. Returns None when nothing acceptable is available.
+        """
+        offered: Dict[str, float] = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.partition(";")
+            quality = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            offered[name.strip().lower()] = quality
+        best, best_quality = None, 0.0
+        for name in self.encodings:
+            quality = offered.get(name, offered.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = name, quality
+        return best
+
+    def compressor(self, encoding: str) -> StreamCompressor:
+        return StreamCompressor(encoding, self.levels.get(encoding, COMPRESSION_LEVELS.get(encoding, 6)))
+
+    async def run(self, func, data: bytes) -> bytes:
+        """Call func(data), on a worker thread when `data` is large enough to stall the loop"""
+        if len(data) >= self.thread_min_size:
+            return await asyncio.to_thread(func, data)
+        return func(data)
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int) -> None:
+        self.responses[encoding] += 1
+        self.bytes_in[encoding] += bytes_in
+        self.bytes_out[encoding] += bytes_out
+
+    def stats(self) -> Dict:
+        """Settings and per-encoding byte counts for /stats"""
+        return {
+            "enabled": self.enabled,
+            "min_size": self.min_size,
+            "encodings": {
+                name: {
+                    "level": self.levels.get(name, COMPRESSION_LEVELS.get(name, 6)),
+                    "responses": self.responses[name],
+                    "bytes_in": self.bytes_in[name],
+                    "bytes_out": self.bytes_out[name],
+                    "ratio": round(self.bytes_out[name] / self.bytes_in[name], 4) if self.bytes_in[name] else None,
+                }
+                for name in self.encodings
+            },
+            "skipped_small": self.skipped_small,
+        }
+
+
+def _header(headers: List, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _weaken_etag(headers: List) -> List:
+    """
+    Mark a strong ETag weak
+
+    The compressed body is not byte-identical to the representation the
+    strong validator was computed for, so only a weak validator still
+    holds; If-None-Match uses weak comparison, so revalidation still works.
+    """
+    return [
+        (k, v if k.lower() != b"etag" or v.startswith(b"W/") else b"W/" + v)
+        for k, v in headers
+    ]
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing responses the client can decode
+
+    Responses with a Content-Length are buffered and compressed whole
+    when at least `min_size` bytes; responses without one (streaming
+    SSE, NDJSON and markdown) are compressed chunk by chunk with a flush
+    after each, so events still arrive as they are produced. Large
+    chunks are compressed on a worker thread. A strong ETag on a
+    compressed response, or on a 304 sent to a client that negotiated an
+    encoding, is made weak.
+    """
+
+    def __init__(self, app, compressor: Optional[ResponseCompressor] = None):
+        self.app = app
+        self.compressor = compressor or response_compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD" or not self.compressor.enabled:
+            await self.app(scope, receive, send)
+            return
+        accept = _header(scope.get("headers", ()), b"accept-encoding")
+        encoding = self.compressor.negotiate(accept.decode("latin-1")) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        compressor = self.compressor
+        state: Dict = {"mode": None, "start": None, "chunks": [], "stream": None, "bytes_in": 0, "bytes_out": 0}
+
+        async def compressing_send(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                media_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+                length = _header(headers, b"content-length")
+                if (
+                    _header(headers, b"content-encoding") is not None
+                    or not media_type.startswith(COMPRESSIBLE_TYPES)
+                    or message["status"] in (204, 304)
+                ):
+                    state["mode"] = "identity"
+                    if message["status"] == 304:
+                        headers = _weaken_etag(headers)
+                elif length is not None and int(length) < compressor.min_size:
+                    compressor.skipped_small += 1
+                    state["mode"] = "identity"
+                    headers.append((b"vary", b"Accept-Encoding"))
+                else:
+                    state["mode"] = "buffer" if length is not None else "stream"
+                    headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                    headers = _weaken_etag(headers)
+                    headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                message = {**message, "headers": headers}
+                if state["mode"] == "buffer":
+                    state["start"] = message
+                    return
+                if state["mode"] == "stream":
+                    state["stream"] = compressor.compressor(encoding)
+                await send(message)
+                return
+
+            if message["type"] != "http.response.body" or state["mode"] == "identity":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            state["bytes_in"] += len(body)
+            if state["mode"] == "buffer":
+                state["chunks"].append(body)
+                if more_body:
+                    return
+                data = b"".join(state["chunks"])
+                compressed = await compressor.run(compressor.compressor(encoding).finish, data)
+                start = state["start"]
+                start["headers"].append((b"content-length", str(len(compressed)).encode()))
+                await send(start)
+                await send({"type": "http.response.body", "body": compressed})
+                compressor.record(encoding, len(data), len(compressed))
+                return
+
+            stream = state["stream"]
+            compressed = await compressor.run(stream.compress if more_body else stream.finish, body)
+            state["bytes_out"] += len(compressed)
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+            if not more_body:
+                compressor.record(encoding, state["bytes_in"], state["bytes_out"])
+
+        await self.app(scope, receive, compressing_send)
+
+
+# Worker-wide instance
+response_compressor = ResponseCompressor()
@@ -0,0 +1,53 @@
+"""
+Fast JSON
+Optional orjson-backed encoding and decoding for the query hot path
+"""
+
+import json
+import os
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Fast JSON configuration (override via environment)
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "false").lower() == "true"
+
+# The fast path needs orjson; without it responses keep FastAPI's default serialization
+fast_json_active = FAST_JSON_ENABLED and orjson is not None
+
+
+def loads(data: bytes) -> Any:
+    """
+    Decode a JSON body straight from bytes
+
+    Skips the intermediate str that `aiohttp.ClientResponse.json()` builds;
+    orjson parses the raw UTF-8 directly when the fast path is active.
+    """
+    if fast_json_active:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Encode `obj` as compact JSON text"""
+    if fast_json_active:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson
+
+    Returned directly by the /query endpoints on the fast path, so FastAPI
+    neither re-validates the body against `response_model` nor walks it
+    through `jsonable_encoder` before encoding.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
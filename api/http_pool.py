@@ -0,0 +1,141 @@
+"""
+HTTP Connection Pool
+Long-lived aiohttp session shared by all upstream OpenRouter calls
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+import aiohttp
+
+from . import fast_json
+from .metrics import pipeline_metrics
+
+# Pool configuration (override via environment)
+POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "50"))
+POOL_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_POOL_KEEPALIVE_TIMEOUT", "30"))
+POOL_DNS_TTL = int(os.getenv("HTTP_POOL_DNS_TTL", "300"))
+
+# Upstream call timeouts in seconds (0 disables one); the first-byte timeout
+# also bounds each gap between streamed chunks
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "10"))
+UPSTREAM_FIRST_BYTE_TIMEOUT = float(os.getenv("UPSTREAM_FIRST_BYTE_TIMEOUT", "60"))
+UPSTREAM_TOTAL_TIMEOUT = float(os.getenv("UPSTREAM_TOTAL_TIMEOUT", "120"))
+# Per-model overrides, e.g. {"openai/o1": {"first_byte": 120, "total": 300}}
+UPSTREAM_MODEL_TIMEOUTS: Dict[str, Dict[str, float]] = json.loads(
+    os.getenv("UPSTREAM_MODEL_TIMEOUTS", "{}")
+)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _build_connector() -> aiohttp.TCPConnector:
+    """Create the pooled TCP connector from the configured limits"""
+    return aiohttp.TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        keepalive_timeout=POOL_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=POOL_DNS_TTL,
+        use_dns_cache=True,
+    )
+
+
+def model_timeouts(model_id: str) -> Dict[str, float]:
+    """Connect / first-byte / total timeouts for a model, with per-model overrides applied"""
+    timeouts = {
+        "connect": UPSTREAM_CONNECT_TIMEOUT,
+        "first_byte": UPSTREAM_FIRST_BYTE_TIMEOUT,
+        "total": UPSTREAM_TOTAL_TIMEOUT,
+    }
+    timeouts.update(UPSTREAM_MODEL_TIMEOUTS.get(model_id, {}))
+    return timeouts
+
+
+def upstream_timeout(model_id: str, remaining: Optional[float] = None) -> aiohttp.ClientTimeout:
+    """
+    Build the aiohttp timeout for one upstream call
+
+    Args:
+        model_id: Model being called
+        remaining: Seconds left before the request deadline, if any
+
+    Returns:
+        ClientTimeout whose total never outlives the request deadline
+    """
+    timeouts = model_timeouts(model_id)
+    total = timeouts["total"] or None
+    if remaining is not None:
+        total = remaining if total is None else min(total, remaining)
+    return aiohttp.ClientTimeout(
+        total=total,
+        sock_connect=timeouts["connect"] or None,
+        sock_read=timeouts["first_byte"] or None,
+    )
+
+
+async def open_session() -> aiohttp.ClientSession:
+    """
+    Open the shared session (called from the app lifespan)
+
+    Returns:
+        The worker-wide ClientSession
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=_build_connector(),
+            trace_configs=pipeline_metrics.trace_configs(),
+            json_serialize=fast_json.dumps
+        )
+    return _session
+
+
+async def close_session() -> None:
+    """Close the shared session and release pooled connections"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    Get the shared session, opening it lazily if the lifespan has not run
+    (e.g. when the app is driven without startup events)
+    """
+    if _session is None or _session.closed:
+        return await open_session()
+    return _session
+
+
+def get_pool_stats() -> Dict:
+    """
+    Get connection pool utilization for the shared session
+
+    Returns:
+        Dict with configured limits and in-use / idle connection counts
+    """
+    stats = {
+        "open": _session is not None and not _session.closed,
+        "limit": POOL_LIMIT,
+        "limit_per_host": POOL_LIMIT_PER_HOST,
+        "keepalive_timeout": POOL_KEEPALIVE_TIMEOUT,
+        "dns_cache_ttl": POOL_DNS_TTL,
+        "in_use": 0,
+        "idle": 0,
+        "utilization": 0.0,
+    }
+    if not stats["open"]:
+        return stats
+
+    connector = _session.connector
+    # aiohttp does not expose these counters publicly; read them defensively
+    acquired = getattr(connector, "_acquired", ())
+    idle_conns = getattr(connector, "_conns", {})
+    stats["in_use"] = len(acquired)
+    stats["idle"] = sum(len(conns) for conns in idle_conns.values())
+    if POOL_LIMIT:
+        stats["utilization"] = round(stats["in_use"] / POOL_LIMIT, 4)
+    return stats
@@ -0,0 +1,367 @@
+"""
+Jobs
+Asynchronous query jobs with a worker pool and a SQLite store that survives restarts
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .request_context import current_client, request_deadline
+from .shared_state import shared_segment
+
+# Job configuration (override via environment)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+# Longest a GET /jobs/{id} long-poll may wait
+JOBS_MAX_WAIT_SECONDS = float(os.getenv("JOBS_MAX_WAIT_SECONDS", "30"))
+# Finished jobs older than this are deleted
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", "86400"))
+# Long-polls re-read the store at least this often
+JOBS_POLL_INTERVAL = 1.0
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+# Fields of a model result kept as per-model progress
+PROGRESS_FIELDS = ("model", "success", "response", "tokens", "prompt_tokens", "completion_tokens", "cached")
+
+
+class JobStore:
+    """
+    Blocking SQLite store for jobs and their per-model results; call
+    through asyncio.to_thread
+
+    Every change bumps the job's `version`, which long-polling clients
+    pass back as `since` to wait for the next change.
+    """
+
+    def __init__(self, path: str, retention_seconds: float = JOBS_RETENTION_SECONDS):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, client TEXT NOT NULL,"
+            " request TEXT NOT NULL, task_type TEXT, models TEXT, result TEXT, error TEXT,"
+            " version INTEGER NOT NULL, attempts INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            " job_id TEXT NOT NULL, model TEXT NOT NULL, result TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, model))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._conn.commit()
+        self._creates = 0
+
+    def create(self, job_id: str, client: str, request: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, client, request, version, attempts, created_at, updated_at)"
+                " VALUES (?, 'queued', ?, ?, 1, 0, ?, ?)",
+                (job_id, client, json.dumps(request), now, now),
+            )
+            self._creates += 1
+            # Prune periodically rather than on every submit
+            if self._creates % 100 == 0:
+                self._prune()
+            self._conn.commit()
+
+    def claim(self, job_id: str) -> Optional[Dict]:
+        """Mark a queued job running; returns its request and finished model results, or None"""
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, version = version + 1,"
+                " updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            ).rowcount
+            self._conn.commit()
+            if not updated:
+                return None
+            client, request = self._conn.execute(
+                "SELECT client, request FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT result FROM job_results WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        results = [json.loads(row[0]) for row in rows]
+        return {
+            "client": client,
+            "request": json.loads(request),
+            "results": {r["model"]: r for r in results},
+        }
+
+    def set_plan(self, job_id: str, task_type: str, models: List[str]) -> None:
+        self._update(job_id, "task_type = ?, models = ?", (task_type, json.dumps(models)))
+
+    def add_result(self, job_id: str, result: Dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_results (job_id, model, result) VALUES (?, ?, ?)",
+                (job_id, result["model"], json.dumps(result)),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET version = version + 1, updated_at = ? WHERE id = ?", (time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def finish(self, job_id: str, result: Optional[Dict], error: Optional[str] = None) -> None:
+        status = "failed" if error is not None else "succeeded"
+        self._update(
+            job_id, "status = ?, result = ?, error = ?",
+            (status, json.dumps(result) if result is not None else None, error)
+        )
+
+    def _update(self, job_id: str, assignments: str, values: tuple) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments}, version = version + 1, updated_at = ? WHERE id = ?",
+                (*values, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status, plan, per-model progress and (when finished) the result"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, task_type, models, result, error, version, attempts, created_at, updated_at"
+                " FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT result FROM job_results WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        status, task_type, models, result, error, version, attempts, created_at, updated_at = row
+        finished = {}
+        for (value,) in rows:
+            model_result = json.loads(value)
+            finished[model_result["model"]] = {f: model_result[f] for f in PROGRESS_FIELDS if f in model_result}
+        models = json.loads(models) if models else []
+        return {
+            "job_id": job_id,
+            "status": status,
+            "version": version,
+            "attempts": attempts,
+            "task_type": task_type,
+            "models": models,
+            "completed_models": sum(1 for m in models if m in finished),
+            "progress": [finished[m] for m in models if m in finished],
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def recover(self, requeue_running: bool = True) -> List[str]:
+        """Requeue jobs left running by a previous process; returns all queued ids, oldest first"""
+        with self._lock:
+            if requeue_running:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', version = version + 1, updated_at = ?"
+                    " WHERE status = 'running'", (time.time(),)
+                )
+            self._prune()
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        self._conn.execute(
+            "DELETE FROM job_results WHERE job_id IN ("
+            " SELECT id FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at <= ?)",
+            (cutoff,),
+        )
+        self._conn.execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at <= ?", (cutoff,)
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# runner(request, finished model results, on_plan, on_result) -> final response dict
+JobRunner = Callable[
+    [Dict, Dict[str, Dict], Callable[[str, List[str]], None], Callable[[Dict], None]],
+    Awaitable[Dict]
+]
+
+
+class JobManager:
+    """
+    Runs submitted queries on a pool of worker tasks
+
+    Jobs are written to the store before they are queued, and model
+    results are saved as they land, so a job interrupted by a restart is
+    requeued on startup and only re-queries the models that had not
+    finished. The store is opened on first use (or at startup if the
+    database file exists). In multi-worker mode every worker picks up
+    queued jobs (claims are atomic), and only the first worker to start
+    requeues interrupted ones.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH, workers: int = JOBS_WORKERS):
+        self.path = path
+        self.workers = workers
+        self._store: Optional[JobStore] = None
+        self._runner: Optional[JobRunner] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._events: Dict[str, asyncio.Event] = {}
+        self._waiters: Dict[str, int] = {}
+        self.running = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.recovered = 0
+
+    def _job_store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore(self.path)
+        return self._store
+
+    async def start(self, runner: JobRunner) -> None:
+        """Start the worker pool and requeue unfinished jobs from the store"""
+        self._runner = runner
+        self._queue = asyncio.Queue()
+        if os.path.exists(self.path):
+            requeue = shared_segment is None or shared_segment.claim_once("jobs_recovered")
+            for job_id in await asyncio.to_thread(self._job_store().recover, requeue):
+                self._queue.put_nowait(job_id)
+                self.recovered += 1
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel the workers; jobs they were running stay running in the store until the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    async def submit(self, request: Dict, client: str) -> str:
+        """Store a new job and queue it; returns the job id"""
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._job_store().create, job_id, client, request)
+        self._queue.put_nowait(job_id)
+        self.submitted += 1
+        return job_id
+
+    async def get(self, job_id: str, since: Optional[int] = None, wait: float = 0) -> Optional[Dict]:
+        """
+        Get a job, long-polling for up to `wait` seconds
+
+        Without `since`, waits until the job finishes; with it, until the
+        job's version is newer than `since`.
+
+        Returns:
+            The job dict, or None if no such job exists
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(wait, JOBS_MAX_WAIT_SECONDS)
+        # Events are reference-counted by their pollers so ids from clients never accumulate
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            while True:
+                # Register before reading so a change between the two is not missed
+                event = self._events.setdefault(job_id, asyncio.Event())
+                job = await asyncio.to_thread(self._job_store().get, job_id)
+                if job is None or job["status"] in FINISHED_STATUSES:
+                    return job
+                if since is not None and job["version"] > since:
+                    return job
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, JOBS_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                self._events.pop(job_id, None)
+
+    def _notify(self, job_id: str) -> None:
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _save(self, method, job_id: str, *args) -> None:
+        await asyncio.to_thread(method, job_id, *args)
+        self._notify(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            store = self._job_store()
+            job = await asyncio.to_thread(store.claim, job_id)
+            if job is None:
+                continue
+            self._notify(job_id)
+            self.running += 1
+            try:
+                await self._run(job_id, job)
+            finally:
+                self.running -= 1
+
+    async def _run(self, job_id: str, job: Dict) -> None:
+        store = self._job_store()
+        # Jobs run outside any HTTP request: attribute usage to the submitter
+        current_client.set(job["client"])
+        request_deadline.set(None)
+        writes: List[asyncio.Task] = []
+
+        def on_plan(task_type: str, models: List[str]) -> None:
+            writes.append(asyncio.create_task(self._save(store.set_plan, job_id, task_type, models)))
+
+        def on_result(result: Dict) -> None:
+            writes.append(asyncio.create_task(self._save(store.add_result, job_id, result)))
+
+        try:
+            result = await self._runner(job["request"], job["results"], on_plan, on_result)
+            error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result, error = None, str(getattr(e, "detail", None) or e) or type(e).__name__
+        await asyncio.gather(*writes)
+        await self._save(store.finish, job_id, result, error)
+        if error is None:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def stats(self) -> Dict:
+        """Job counters for /stats"""
+        return {
+            "store": self.path,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "long_polls": sum(self._waiters.values()),
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "recovered": self.recovered,
+        }
+
+
+# Worker-wide instance
+job_manager = JobManager()
@@ -3,23 +3,83 @@ Universal OZ Multi-Model API
 Routes prompts to top 5 models per task type and compiles unified responses
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ValidationError
+from typing import Optional, List, Dict, Tuple, Callable
 import asyncio
 import aiohttp
 import os
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-from .task_detector import detect_task_type
-from .model_router import get_top_models
-from .response_compiler import compile_responses
+from .task_classifier import get_classifier
+from .model_router import (
+    ModelRecord, get_top_model_records, rank_models, get_failover_models, get_registry, registry_stats, ROUTING_MODES,
+    reload_registry_if_changed, watch_registry_file, MODEL_REGISTRY_PATH
+)
+from .response_compiler import compile_responses_async, DocumentBuilder
+from .synthesis import synthesis_stage
+from .metrics import pipeline_metrics, MetricsMiddleware
+from .http_pool import open_session, close_session, get_session, get_pool_stats, upstream_timeout
+from .streaming import format_sse, iter_stream_chunks, chunk_delta
+from . import fast_json
+from .fast_json import FastJSONResponse, fast_json_active
+from .model_stats import (
+    latency_tracker, model_health, hedge_budget,
+    HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES
+)
+from .response_cache import response_cache, make_cache_key
+from .singleflight import model_calls, SINGLEFLIGHT_ENABLED
+from .semantic_cache import semantic_cache
+from .circuit_breaker import circuit_breakers
+from .batch import batch_scheduler, BatchScheduler, parse_batch_body, BatchParseError, BATCH_CLASSIFY_THREAD_MIN
+from .rate_limiter import rate_limiter, estimate_tokens, completion_budget, RATE_LIMIT_MAX_RETRIES
+from .usage_ledger import usage_ledger
+from .jobs import job_manager
+from .admission import (
+    admission_controller, AdmissionRejected, AdmissionTicket, hold_while_streaming,
+    PRIORITY_HEADER, BACKGROUND_CLASS
+)
+from .compression import CompressionMiddleware, response_compressor
+from .request_context import (
+    current_client, tighten_deadline, remaining_seconds, remaining_ms, cancel_on_disconnect,
+    RequestContextMiddleware
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared upstream session on startup and close it on shutdown"""
+    # Fail fast on a misconfigured classifier rather than on the first request
+    get_classifier()
+    await open_session()
+    registry_watcher = None
+    if MODEL_REGISTRY_PATH:
+        await reload_registry_if_changed(MODEL_REGISTRY_PATH)
+        registry_watcher = asyncio.create_task(watch_registry_file(MODEL_REGISTRY_PATH))
+    lag_probe = asyncio.create_task(pipeline_metrics.watch_loop_lag()) if pipeline_metrics.enabled else None
+    await job_manager.start(run_job)
+    try:
+        yield
+    finally:
+        if registry_watcher is not None:
+            registry_watcher.cancel()
+        if lag_probe is not None:
+            lag_probe.cancel()
+        await job_manager.stop()
+        await rate_limiter.close()
+        await close_session()
+        response_cache.close()
 
 app = FastAPI(
     title="Universal OZ API",
     description="Multi-model AI API that queries top 5 models and compiles responses",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for web interface
@@ -31,6 +91,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request client identity for fair queueing
+app.add_middleware(RequestContextMiddleware)
+# gzip/br/zstd negotiation; inside MetricsMiddleware so it records bytes on the wire
+app.add_middleware(CompressionMiddleware)
+# Request counts, latency and response sizes for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Request models
 class QueryRequest(BaseModel):
     prompt: str
@@ -38,37 +105,71 @@ class QueryRequest(BaseModel):
     max_tokens: Optional[int] = 2000
     temperature: Optional[float] = 0.7
     include_synthesis: Optional[bool] = True
+    completion_policy: Optional[str] = "all"
+    min_responses: Optional[int] = None
+    deadline_ms: Optional[int] = None
+    use_cache: Optional[bool] = True
+    routing_mode: Optional[str] = None
+    max_cost_usd: Optional[float] = None
+    max_latency_ms: Optional[float] = None
+    min_models: Optional[int] = None
+    max_models: Optional[int] = None
+    response_mode: Optional[str] = "full"
 
 class QueryResponse(BaseModel):
     prompt: str
     task_type: str
     models_used: List[str]
-    responses: Dict[str, str]
+    responses: Optional[Dict[str, str]]
     synthesis: Optional[str]
-    unified_document: str
+    synthesis_model: Optional[str] = None
+    unified_document: Optional[str]
     timestamp: str
     total_tokens: int
     estimated_cost: float
+    cache_hits: int = 0
+    cache_misses: int = 0
+    semantic_match: Optional[Dict] = None
+    routing: Optional[Dict] = None
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: str
+    poll_url: str
+
+# Fan-out completion policies:
+#   all         - wait for every model
+#   first_k     - return once `min_responses` models succeed
+#   deadline_ms - return whatever has finished after `deadline_ms`
+COMPLETION_POLICIES = ("all", "first_k", "deadline_ms")
+
+# Response modes (the answer text is otherwise carried twice):
+#   full      - both `responses` and `unified_document`
+#   document  - only `unified_document`; `responses` is null
+#   responses - only `responses`; the document is not rendered
+RESPONSE_MODES = ("full", "document", "responses")
 
 # OpenRouter API configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions")
 
-async def query_model(
-    session: aiohttp.ClientSession,
-    model_id: str,
-    prompt: str,
-    max_tokens: int,
-    temperature: float
-) -> Dict:
-    """Query a single model via OpenRouter"""
-    headers = {
+def build_headers() -> Dict:
+    """Request headers for OpenRouter"""
+    return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
         "HTTP-Referer": "https://github.com/midnghtsapphire/universal_oz",
         "X-Title": "Universal OZ API"
     }
-    
+
+def build_payload(
+    model_id: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    stream: bool = False
+) -> Dict:
+    """Chat-completions payload for a single model"""
     payload = {
         "model": model_id,
         "messages": [
@@ -77,26 +178,156 @@ async def query_model(
         "max_tokens": max_tokens,
         "temperature": temperature
     }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+def usage_fields(usage: Dict) -> Dict:
+    """Token counts for a result from an OpenRouter `usage` object, keeping the prompt/completion split"""
+    fields = {"tokens": usage.get("total_tokens", 0)}
+    if "prompt_tokens" in usage and "completion_tokens" in usage:
+        fields["prompt_tokens"] = usage["prompt_tokens"]
+        fields["completion_tokens"] = usage["completion_tokens"]
+    return fields
+
+def circuit_open_result(model_id: str) -> Dict:
+    """Fast-fail result for a model whose circuit breaker is open"""
+    return {
+        "model": model_id,
+        "response": "Error: circuit open - provider is failing, call skipped",
+        "tokens": 0,
+        "success": False,
+        "circuit_open": True
+    }
+
+def deadline_exceeded_result(model_id: str) -> Dict:
+    """Result for a call skipped or cut short by the request deadline"""
+    return {
+        "model": model_id,
+        "response": "Error: request deadline exceeded",
+        "tokens": 0,
+        "success": False
+    }
+
+def timeout_result(model_id: str, breaker) -> Dict:
+    """
+    Result for a call that hit a timeout
     
+    Only upstream timeouts count against the model; a call cut short by
+    the request deadline just returns its breaker probe slot.
+    """
+    if remaining_seconds() == 0:
+        pipeline_metrics.record_upstream(model_id, "deadline")
+        if breaker is not None:
+            breaker.release()
+        return deadline_exceeded_result(model_id)
+    pipeline_metrics.record_upstream(model_id, "timeout")
+    model_health.record_failure(model_id)
+    if breaker is not None:
+        breaker.record_failure()
+    return {
+        "model": model_id,
+        "response": "Error: upstream timeout",
+        "tokens": 0,
+        "success": False
+    }
+
+def retry_delay_after_429(model_id: str, response: aiohttp.ClientResponse, attempt: int) -> Optional[float]:
+    """Backoff before retrying a 429, or None if retries or the request deadline are exhausted"""
+    if attempt >= RATE_LIMIT_MAX_RETRIES:
+        return None
+    delay = rate_limiter.on_rate_limited(model_id, response.headers.get("Retry-After"), attempt)
+    remaining = remaining_seconds()
+    if remaining is not None and delay >= remaining:
+        return None
+    return delay
+
+def is_provider_failure(status: int) -> bool:
+    """Upstream statuses that count against a model's circuit breaker"""
+    return status >= 500 or status == 429
+
+async def query_model_once(
+    session: aiohttp.ClientSession,
+    model_id: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: float
+) -> Dict:
+    """Send one request to a model via OpenRouter and record its latency and health"""
+    if remaining_seconds() == 0:
+        pipeline_metrics.record_upstream(model_id, "deadline")
+        return deadline_exceeded_result(model_id)
+    breaker = circuit_breakers.get(model_id) if circuit_breakers.enabled else None
+    if breaker is not None and not breaker.allow():
+        pipeline_metrics.record_upstream(model_id, "circuit_open")
+        return circuit_open_result(model_id)
+    
+    client = current_client.get()
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    # Everything after breaker.allow() is inside the try, so a half-open probe slot is always returned
     try:
-        async with session.post(OPENROUTER_BASE_URL, json=payload, headers=headers) as response:
-            if response.status == 200:
-                data = await response.json()
-                return {
-                    "model": model_id,
-                    "response": data["choices"][0]["message"]["content"],
-                    "tokens": data["usage"]["total_tokens"],
-                    "success": True
-                }
-            else:
-                error_text = await response.text()
-                return {
-                    "model": model_id,
-                    "response": f"Error: {response.status} - {error_text}",
-                    "tokens": 0,
-                    "success": False
-                }
+        headers = build_headers()
+        payload = build_payload(model_id, prompt, max_tokens, temperature)
+        estimated_tokens = estimate_tokens(prompt, max_tokens)
+        while True:
+            await asyncio.wait_for(
+                rate_limiter.acquire(model_id, estimated_tokens, client), remaining_seconds()
+            )
+            started = loop.time()
+            timeout = upstream_timeout(model_id, remaining_seconds())
+            async with session.post(
+                OPENROUTER_BASE_URL, json=payload, headers=headers, timeout=timeout,
+                trace_request_ctx=pipeline_metrics.trace_ctx(model_id)
+            ) as response:
+                ttfb = loop.time() - started
+                if response.status == 200:
+                    data = fast_json.loads(await response.read())
+                    elapsed = loop.time() - started
+                    latency_tracker.record(model_id, elapsed)
+                    model_health.record_success(model_id, elapsed)
+                    if breaker is not None:
+                        breaker.record_success()
+                    usage = usage_fields(data["usage"])
+                    rate_limiter.settle(model_id, estimated_tokens, usage["tokens"])
+                    pipeline_metrics.record_upstream(model_id, "200", ttfb, elapsed, usage)
+                    return {
+                        "model": model_id,
+                        "response": data["choices"][0]["message"]["content"],
+                        **usage,
+                        "success": True
+                    }
+                rate_limiter.settle(model_id, estimated_tokens, 0)
+                pipeline_metrics.record_upstream(model_id, str(response.status), ttfb, loop.time() - started)
+                delay = retry_delay_after_429(model_id, response, attempt) if response.status == 429 else None
+                if delay is None:
+                    error_text = await response.text()
+                    model_health.record_failure(model_id)
+                    if breaker is not None:
+                        if is_provider_failure(response.status):
+                            breaker.record_failure()
+                        else:
+                            breaker.record_success()
+                    return {
+                        "model": model_id,
+                        "response": f"Error: {response.status} - {error_text}",
+                        "tokens": 0,
+                        "success": False
+                    }
+                attempt += 1
+            # Rate limited upstream: back off (jittered, or per Retry-After) and retry
+            await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        if breaker is not None:
+            breaker.release()
+        raise
+    except asyncio.TimeoutError:
+        return timeout_result(model_id, breaker)
     except Exception as e:
+        model_health.record_failure(model_id)
+        pipeline_metrics.record_upstream(model_id, "error")
+        if breaker is not None:
+            breaker.record_failure()
         return {
             "model": model_id,
             "response": f"Error: {str(e)}",
@@ -104,20 +335,517 @@ async def query_model(
             "success": False
         }
 
-async def query_multiple_models(
-    models: List[Dict],
+async def query_model_hedged(
+    session: aiohttp.ClientSession,
+    model_id: str,
     prompt: str,
     max_tokens: int,
     temperature: float
+) -> Dict:
+    """
+    Query a single model via OpenRouter, hedging slow calls
+    
+    If the call is still running after the model's observed p95 latency,
+    a duplicate request is sent (subject to the hedge budget) and whichever
+    succeeds first is used; the other is cancelled. The winning result
+    carries `hedge_usage`, the estimated usage of the discarded attempt,
+    so the duplicate is costed and counted in the usage ledger.
+    """
+    hedge_budget.on_request()
+    hedge_after = None
+    if HEDGE_ENABLED:
+        hedge_after = latency_tracker.percentile(model_id, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+    if hedge_after is None:
+        return await query_model_once(session, model_id, prompt, max_tokens, temperature)
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    primary = asyncio.create_task(
+        query_model_once(session, model_id, prompt, max_tokens, temperature)
+    )
+    attempts = {primary}
+    try:
+        done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+        if done or not hedge_budget.try_acquire():
+            return await primary
+        
+        hedge = asyncio.create_task(
+            query_model_once(session, model_id, prompt, max_tokens, temperature)
+        )
+        attempts.add(hedge)
+        pending = set(attempts)
+        result = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result["success"]:
+                    loser = hedge if task is primary else primary
+                    if loser is primary and not primary.done():
+                        # The cancelled primary took at least this long; leaving it out of the
+                        # window would pull the p95 (and so the hedge trigger) ever lower
+                        latency_tracker.record(model_id, loop.time() - started)
+                    return with_hedge_usage(result, loser)
+        # Both attempts failed; report the last error
+        return result
+    finally:
+        for task in attempts:
+            if not task.done():
+                task.cancel()
+
+def with_hedge_usage(result: Dict, loser: asyncio.Task) -> Dict:
+    """
+    Attach the usage of a hedged call's discarded attempt to the winning result
+    
+    An attempt that finished is charged its reported usage. One still in
+    flight has already been accepted upstream and is usually billed in
+    full, so it is charged as a duplicate of the winner.
+    """
+    if loser.done():
+        if loser.cancelled() or not loser.result()["success"]:
+            return result
+        usage = loser.result()
+    else:
+        usage = result
+    hedge_usage = {field: usage[field] for field in ("tokens", "prompt_tokens", "completion_tokens") if field in usage}
+    return {**result, "hedge_usage": hedge_usage}
+
+async def query_model(
+    session: aiohttp.ClientSession,
+    model_id: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    use_cache: bool = True
+) -> Dict:
+    """
+    Query a single model via OpenRouter, serving exact repeats from the response cache
+    
+    Identical concurrent calls share one upstream request. The shared
+    request ignores any one caller's deadline; each caller stops waiting
+    at its own. It is rate limited as the client that started it. Results carry `cached: True/False` when the cache was
+    consulted and `coalesced: True` when they were served by another
+    caller's in-flight request.
+    """
+    if not use_cache:
+        return await query_model_hedged(session, model_id, prompt, max_tokens, temperature)
+    
+    key = make_cache_key(model_id, prompt, max_tokens, temperature)
+    if response_cache.enabled:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return {**cached, "success": True, "cached": True}
+    
+    client = current_client.get()
+    
+    async def fetch() -> Dict:
+        # Runs in a fresh context (see SingleFlight): keep the caller's identity for fair queueing
+        current_client.set(client)
+        result = await query_model_hedged(session, model_id, prompt, max_tokens, temperature)
+        if result["success"] and response_cache.enabled:
+            await response_cache.set(key, result)
+        return result
+    
+    if SINGLEFLIGHT_ENABLED:
+        try:
+            result, shared = await model_calls.do(key, fetch, remaining_seconds())
+        except asyncio.TimeoutError:
+            pipeline_metrics.record_upstream(model_id, "deadline")
+            return deadline_exceeded_result(model_id)
+    else:
+        result, shared = await fetch(), False
+    
+    result = dict(result)
+    if response_cache.enabled:
+        result["cached"] = False
+    if shared:
+        result["coalesced"] = True
+    return result
+
+async def query_multiple_models(
+    models: List[ModelRecord],
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    policy: str = "all",
+    min_responses: Optional[int] = None,
+    deadline_ms: Optional[int] = None,
+    use_cache: bool = True,
+    on_result: Optional[Callable[[Dict], None]] = None,
+    scheduler: Optional[BatchScheduler] = None
 ) -> List[Dict]:
-    """Query multiple models in parallel"""
-    async with aiohttp.ClientSession() as session:
-        tasks = [
-            query_model(session, model["id"], prompt, max_tokens, temperature)
-            for model in models
-        ]
+    """
+    Query multiple models in parallel over the shared pooled session
+    
+    With the `first_k` or `deadline_ms` policy, returns as soon as
+    `min_responses` models have succeeded or the deadline passes, and
+    cancels the remaining in-flight calls. Cancelled models are reported
+    as failed results so they still appear in the compiled document.
+    
+    `on_result`, if given, is called with each model's result as it
+    lands (cancelled models last), for incremental compilation.
+    `scheduler`, if given, bounds each call (used by /query/batch).
+    
+    Returns:
+        One result dict per model, in the order of `models`
+    """
+    session = await get_session()
+    
+    async def run(model_id: str) -> Dict:
+        call = lambda: query_model(session, model_id, prompt, max_tokens, temperature, use_cache)
+        result = await (scheduler.call(model_id, call) if scheduler is not None else call())
+        if on_result is not None:
+            on_result(result)
+        return result
+    
+    if policy == "all" and deadline_ms is None:
+        tasks = [run(model.id) for model in models]
         results = await asyncio.gather(*tasks)
         return results
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_ms / 1000 if deadline_ms is not None else None
+    tasks = {asyncio.create_task(run(model.id)): model.id for model in models}
+    results_by_model: Dict[str, Dict] = {}
+    pending = set(tasks)
+    successes = 0
+    reason = None
+    
+    try:
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                reason = f"deadline of {deadline_ms} ms exceeded"
+                break
+            for task in done:
+                result = task.result()
+                results_by_model[tasks[task]] = result
+                successes += result["success"]
+            if policy == "first_k" and min_responses is not None and successes >= min_responses:
+                reason = f"quorum of {min_responses} responses reached"
+                break
+    except asyncio.CancelledError:
+        # The caller went away: nothing will use the remaining calls
+        for task in pending:
+            task.cancel()
+        raise
+    
+    # Stop spending tokens on calls whose results will not be used
+    for task in pending:
+        task.cancel()
+        results_by_model[tasks[task]] = {
+            "model": tasks[task],
+            "response": f"Cancelled: {reason}",
+            "tokens": 0,
+            "success": False
+        }
+        if on_result is not None:
+            on_result(results_by_model[tasks[task]])
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    return [results_by_model[model.id] for model in models]
+
+def validate_response_mode(request: QueryRequest) -> None:
+    """Reject an unknown response_mode with a 400"""
+    if (request.response_mode or "full") not in RESPONSE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown response_mode: {request.response_mode}. Use one of {list(RESPONSE_MODES)}"
+        )
+
+def validate_completion_policy(request: QueryRequest) -> None:
+    """Reject inconsistent completion policy options with a 400"""
+    policy = request.completion_policy or "all"
+    if policy not in COMPLETION_POLICIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown completion_policy: {policy}. Use one of {list(COMPLETION_POLICIES)}"
+        )
+    if policy == "first_k" and not request.min_responses:
+        raise HTTPException(status_code=400, detail="min_responses is required for completion_policy 'first_k'")
+    if policy == "deadline_ms" and not request.deadline_ms and remaining_seconds() is None:
+        raise HTTPException(
+            status_code=400,
+            detail="deadline_ms (or an X-Deadline-Ms header) is required for completion_policy 'deadline_ms'"
+        )
+    if request.min_responses is not None and request.min_responses < 1:
+        raise HTTPException(status_code=400, detail="min_responses must be at least 1")
+    if request.deadline_ms is not None and request.deadline_ms <= 0:
+        raise HTTPException(status_code=400, detail="deadline_ms must be positive")
+
+async def query_model_stream(
+    session: aiohttp.ClientSession,
+    model_id: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    queue: asyncio.Queue
+) -> Dict:
+    """
+    Query a single model with `stream: true`
+
+    Each content delta is pushed onto `queue` as (model_id, delta) as soon
+    as it arrives. Returns the same result dict as query_model once the
+    upstream stream ends.
+    """
+    if remaining_seconds() == 0:
+        pipeline_metrics.record_upstream(model_id, "deadline")
+        return deadline_exceeded_result(model_id)
+    breaker = circuit_breakers.get(model_id) if circuit_breakers.enabled else None
+    if breaker is not None and not breaker.allow():
+        pipeline_metrics.record_upstream(model_id, "circuit_open")
+        return circuit_open_result(model_id)
+    
+    client = current_client.get()
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    # Everything after breaker.allow() is inside the try, so a half-open probe slot is always returned
+    try:
+        headers = build_headers()
+        payload = build_payload(model_id, prompt, max_tokens, temperature, stream=True)
+        estimated_tokens = estimate_tokens(prompt, max_tokens)
+        while True:
+            await asyncio.wait_for(
+                rate_limiter.acquire(model_id, estimated_tokens, client), remaining_seconds()
+            )
+            started = loop.time()
+            timeout = upstream_timeout(model_id, remaining_seconds())
+            response = await session.post(
+                OPENROUTER_BASE_URL, json=payload, headers=headers, timeout=timeout,
+                trace_request_ctx=pipeline_metrics.trace_ctx(model_id)
+            )
+            ttfb = loop.time() - started
+            if response.status == 200:
+                break
+            async with response:
+                rate_limiter.settle(model_id, estimated_tokens, 0)
+                pipeline_metrics.record_upstream(model_id, str(response.status), ttfb, loop.time() - started)
+                delay = retry_delay_after_429(model_id, response, attempt) if response.status == 429 else None
+                if delay is None:
+                    error_text = await response.text()
+                    model_health.record_failure(model_id)
+                    if breaker is not None:
+                        if is_provider_failure(response.status):
+                            breaker.record_failure()
+                        else:
+                            breaker.record_success()
+                    return {
+                        "model": model_id,
+                        "response": f"Error: {response.status} - {error_text}",
+                        "tokens": 0,
+                        "success": False
+                    }
+                attempt += 1
+            # Nothing has been streamed yet, so a 429 can simply be retried
+            await asyncio.sleep(delay)
+        
+        async with response:
+            parts = []
+            usage = usage_fields({})
+            async for chunk in iter_stream_chunks(response):
+                delta = chunk_delta(chunk)
+                if delta:
+                    parts.append(delta)
+                    await queue.put((model_id, delta))
+                if chunk.get("usage"):
+                    usage = usage_fields(chunk["usage"])
+            elapsed = loop.time() - started
+            model_health.record_success(model_id, elapsed)
+            if breaker is not None:
+                breaker.record_success()
+            rate_limiter.settle(model_id, estimated_tokens, usage["tokens"])
+            pipeline_metrics.record_upstream(model_id, "200", ttfb, elapsed, usage)
+            return {
+                "model": model_id,
+                "response": "".join(parts),
+                **usage,
+                "success": True
+            }
+    except asyncio.CancelledError:
+        if breaker is not None:
+            breaker.release()
+        raise
+    except asyncio.TimeoutError:
+        return timeout_result(model_id, breaker)
+    except Exception as e:
+        model_health.record_failure(model_id)
+        pipeline_metrics.record_upstream(model_id, "error")
+        if breaker is not None:
+            breaker.record_failure()
+        return {
+            "model": model_id,
+            "response": f"Error: {str(e)}",
+            "tokens": 0,
+            "success": False
+        }
+
+def resolve_task_type(request: QueryRequest) -> str:
+    """Use the request's task type, or classify the prompt (timed for /metrics)"""
+    if request.task_type:
+        return request.task_type
+    classifier = get_classifier()
+    started = time.perf_counter()
+    task_type = classifier.classify(request.prompt)
+    pipeline_metrics.observe_task_detection(classifier.name, time.perf_counter() - started)
+    return task_type
+
+def select_models(request: QueryRequest, task_type: str) -> Tuple[List[ModelRecord], Optional[Dict]]:
+    """
+    Choose the models to query for a request
+    
+    Static routing takes the registry's top 5 (or `max_models`). Adaptive
+    routing (explicit, or implied by any cost/latency constraint) ranks
+    candidates by live latency, error rate and price and returns an
+    explanation.
+    """
+    constrained = any(
+        v is not None for v in (request.max_cost_usd, request.max_latency_ms, request.min_models)
+    )
+    mode = request.routing_mode or ("adaptive" if constrained else "static")
+    if mode not in ROUTING_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown routing_mode: {mode}. Use one of {list(ROUTING_MODES)}"
+        )
+    if mode == "static" and constrained:
+        raise HTTPException(
+            status_code=400,
+            detail="max_cost_usd, max_latency_ms and min_models require routing_mode 'adaptive'"
+        )
+    
+    if request.max_models is not None and request.max_models < 1:
+        raise HTTPException(status_code=400, detail="max_models must be at least 1")
+    limit = request.max_models or 5
+    
+    if mode == "static":
+        top_models, routing = get_top_model_records(task_type, limit=limit), None
+    else:
+        top_models, routing = rank_models(
+            task_type,
+            limit=limit,
+            prompt_tokens=len(request.prompt) // 4,
+            max_tokens=completion_budget(request.max_tokens),
+            max_cost_usd=request.max_cost_usd,
+            max_latency_ms=request.max_latency_ms,
+            min_models=request.min_models
+        )
+    
+    if not top_models:
+        raise HTTPException(status_code=400, detail=f"No models found for task type: {task_type}")
+    
+    top_models, substitutions = apply_failover(task_type, top_models)
+    if substitutions:
+        routing = routing or {"mode": mode}
+        routing["failover"] = substitutions
+    pipeline_metrics.record_routing(mode, task_type, substitutions)
+    return top_models, routing
+
+def apply_failover(task_type: str, models: List[ModelRecord]) -> Tuple[List[ModelRecord], List[Dict]]:
+    """
+    Replace models whose circuit is open with the next-best available models
+    
+    Models with no available substitute are kept; their calls fail fast.
+    
+    Returns:
+        (models to query, list of {"replaced", "with"} substitutions)
+    """
+    if not any(circuit_breakers.is_open(model.id) for model in models):
+        return models, []
+    
+    chosen = {model.id for model in models}
+    spares = iter([
+        model for model in get_failover_models(task_type, exclude=chosen)
+        if not circuit_breakers.is_open(model.id)
+    ])
+    selected, substitutions = [], []
+    for model in models:
+        if circuit_breakers.is_open(model.id):
+            substitute = next(spares, None)
+            if substitute is not None:
+                substitutions.append({"replaced": model.id, "with": substitute.id})
+                selected.append(substitute)
+                continue
+        selected.append(model)
+    return selected, substitutions
+
+async def run_synthesis(prompt: str, successful: List[Dict]) -> Optional[Dict]:
+    """Model-based synthesis through the regular model call path (None when skipped)"""
+    if not synthesis_stage.enabled:
+        return None
+    session = await get_session()
+    
+    async def call(model_id: str, synthesis_prompt: str, max_tokens: int, temperature: float) -> Dict:
+        return await query_model(session, model_id, synthesis_prompt, max_tokens, temperature)
+    
+    return await synthesis_stage.run(prompt, successful, call)
+
+async def compile_results(request: QueryRequest, task_type: str, results: List[Dict]) -> Dict:
+    """Compile model results for a request, with model-based synthesis when configured"""
+    started = time.perf_counter()
+    compiled = await compile_responses_async(
+        prompt=request.prompt,
+        task_type=task_type,
+        results=results,
+        include_synthesis=request.include_synthesis,
+        include_document=request.response_mode != "responses",
+        synthesizer=run_synthesis if synthesis_stage.enabled else None
+    )
+    pipeline_metrics.observe_compile(time.perf_counter() - started)
+    return compiled
+
+def record_usage(task_type: str, results: List[Dict], compiled: Optional[Dict] = None) -> None:
+    """Add a request's billed calls (including synthesis) to the caller's usage ledger"""
+    synthesis_call = compiled.get("synthesis_call") if compiled else None
+    if synthesis_call is not None:
+        results = results + [synthesis_call]
+    usage_ledger.record(current_client.get(), task_type, results)
+
+def make_query_response(**fields) -> QueryResponse:
+    """
+    Construct a QueryResponse
+
+    On the fast JSON path validation is skipped: every field is built by
+    this module from already-typed values, so re-checking them only costs
+    CPU on multi-kilobyte answers.
+    """
+    if fast_json_active:
+        return QueryResponse.model_construct(**fields)
+    return QueryResponse(**fields)
+
+def query_json(response: QueryResponse):
+    """Return value for /query: the model itself, or a pre-rendered orjson body on the fast path"""
+    if fast_json_active:
+        return FastJSONResponse(dict(response))
+    return response
+
+def build_query_response(
+    request: QueryRequest,
+    task_type: str,
+    results: List[Dict],
+    compiled: Dict,
+    routing: Optional[Dict] = None
+) -> QueryResponse:
+    """Assemble the API response from model results and compiled output"""
+    mode = request.response_mode or "full"
+    return make_query_response(
+        prompt=request.prompt,
+        task_type=task_type,
+        models_used=[r["model"] for r in results if r["success"]],
+        responses={r["model"]: r["response"] for r in results} if mode != "document" else None,
+        synthesis=compiled["synthesis"],
+        synthesis_model=compiled["synthesis_call"]["model"] if compiled.get("synthesis_call") else None,
+        unified_document=compiled["document"],
+        timestamp=datetime.now().isoformat(),
+        total_tokens=sum(r["tokens"] for r in results),
+        estimated_cost=compiled["estimated_cost"],
+        cache_hits=sum(1 for r in results if r.get("cached") is True),
+        cache_misses=sum(1 for r in results if r.get("cached") is False),
+        routing=routing
+    )
 
 @app.get("/")
 async def root():
@@ -126,78 +854,554 @@ async def root():
         "status": "online",
         "api": "Universal OZ Multi-Model API",
         "version": "1.0.0",
-        "endpoints": ["/query", "/query-with-type", "/models", "/task-types"]
+        "endpoints": ["/query", "/query/stream", "/query/document", "/query/batch", "/query-with-type", "/jobs", "/models", "/task-types", "/usage", "/stats", "/metrics"]
     }
 
+def request_priority(http_request: Request, requested: Optional[str] = None) -> str:
+    """Admission class for a caller: its key's tier, lowered by X-Priority or `requested`"""
+    return admission_controller.priority_for(
+        http_request.headers.get("x-api-key"), requested or http_request.headers.get(PRIORITY_HEADER)
+    )
+
+def server_busy(e: AdmissionRejected, priority: str) -> HTTPException:
+    """503 for a request shed by admission control"""
+    return HTTPException(
+        status_code=503,
+        detail=f"Server busy ({e.reason}) for priority class '{priority}'",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+async def admit_stream(priority: str) -> Optional[AdmissionTicket]:
+    """Take an admission slot for a streamed response, or raise a 503"""
+    try:
+        return await admission_controller.admit(priority, remaining_seconds())
+    except AdmissionRejected as e:
+        raise server_busy(e, priority)
+
+def admitted_streaming_response(ticket: Optional[AdmissionTicket], body, **kwargs) -> StreamingResponse:
+    """
+    StreamingResponse that holds `ticket` until the body is exhausted
+    
+    The background task covers a client that disconnects before the
+    body is first iterated.
+    """
+    return StreamingResponse(
+        hold_while_streaming(ticket, body),
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+        **kwargs
+    )
+
 @app.post("/query", response_model=QueryResponse)
-async def query(request: QueryRequest):
+async def query(request: QueryRequest, http_request: Request):
     """
     Main endpoint: Send prompt, get responses from top 5 models
     
     Auto-detects task type and routes to best models
     """
+    validate_completion_policy(request)
+    # Time spent queued for admission counts toward the request deadline
+    tighten_deadline(request.deadline_ms)
+    priority = request_priority(http_request)
+    try:
+        async with admission_controller.admitted(priority, remaining_seconds()):
+            # A client that hangs up should not keep its upstream calls running
+            return query_json(await cancel_on_disconnect(http_request, run_query(request)))
+    except AdmissionRejected as e:
+        raise server_busy(e, priority)
+
+async def run_query(request: QueryRequest) -> QueryResponse:
+    """Route, fan out and compile one query (the body of /query)"""
+    validate_completion_policy(request)
+    validate_response_mode(request)
+    tighten_deadline(request.deadline_ms)
+    
     # Detect task type if not provided
-    task_type = request.task_type or detect_task_type(request.prompt)
+    task_type = resolve_task_type(request)
     
     # Get top 5 models for this task type
-    top_models = get_top_models(task_type, limit=5)
+    top_models, routing = select_models(request, task_type)
     
-    if not top_models:
-        raise HTTPException(status_code=400, detail=f"No models found for task type: {task_type}")
+    # Serve near-duplicate prompts from the semantic cache
+    use_cache = request.use_cache is not False
+    use_semantic = use_cache and semantic_cache.enabled
+    # The selected model set stands in for every routing input (mode, constraints, failover)
+    semantic_key = (
+        task_type, tuple(model.id for model in top_models),
+        request.max_tokens, request.temperature, request.include_synthesis, request.response_mode
+    )
+    if use_semantic:
+        match = semantic_cache.lookup(semantic_key, request.prompt)
+        if match is not None:
+            payload, cached_prompt, similarity = match
+            payload.update(
+                prompt=request.prompt,
+                timestamp=datetime.now().isoformat(),
+                estimated_cost=0.0,
+                cache_hits=len(payload["models_used"]),
+                cache_misses=0,
+                semantic_match={"prompt": cached_prompt, "similarity": round(similarity, 4)}
+            )
+            record_usage(task_type, [])
+            return make_query_response(**payload)
     
     # Query all models in parallel
     results = await query_multiple_models(
         top_models,
         request.prompt,
         request.max_tokens,
-        request.temperature
+        request.temperature,
+        policy=request.completion_policy or "all",
+        min_responses=request.min_responses,
+        deadline_ms=remaining_ms(),
+        use_cache=use_cache
     )
     
     # Compile responses
-    compiled = compile_responses(
-        prompt=request.prompt,
-        task_type=task_type,
-        results=results,
-        include_synthesis=request.include_synthesis
+    compiled = await compile_results(request, task_type, results)
+    
+    record_usage(task_type, results, compiled)
+    response = build_query_response(request, task_type, results, compiled, routing)
+    # Only complete answers are worth reusing for other prompts
+    if use_semantic and all(r["success"] for r in results):
+        semantic_cache.store(semantic_key, request.prompt, response.model_dump())
+    return response
+
+async def run_job(
+    request_data: Dict,
+    finished: Dict[str, Dict],
+    on_plan: Callable[[str, List[str]], None],
+    on_result: Callable[[Dict], None]
+) -> Dict:
+    """
+    Route, fan out and compile one stored job (run by the job workers)
+    
+    Args:
+        request_data: The submitted QueryRequest fields
+        finished: Model results saved by an earlier, interrupted attempt
+        on_plan: Called with the task type and selected model ids
+        on_result: Called with each model's result as it lands
+    
+    Returns:
+        The QueryResponse as a dict
+    """
+    request = QueryRequest(**request_data)
+    tighten_deadline(request.deadline_ms)
+    # A durable job waits for a slot instead of being shed; it only fails if its own deadline passes
+    try:
+        async with admission_controller.admitted(BACKGROUND_CLASS, remaining_seconds(), shed=False):
+            return await run_admitted_job(request, finished, on_plan, on_result)
+    except AdmissionRejected as e:
+        raise server_busy(e, BACKGROUND_CLASS)
+
+async def run_admitted_job(
+    request: QueryRequest,
+    finished: Dict[str, Dict],
+    on_plan: Callable[[str, List[str]], None],
+    on_result: Callable[[Dict], None]
+) -> Dict:
+    """The body of run_job, once it holds an admission slot"""
+    task_type = resolve_task_type(request)
+    top_models, routing = select_models(request, task_type)
+    on_plan(task_type, [model.id for model in top_models])
+    
+    # Successful results from before a restart are not queried again
+    reused = {
+        model.id: finished[model.id]
+        for model in top_models if finished.get(model.id, {}).get("success")
+    }
+    new_results = await query_multiple_models(
+        [model for model in top_models if model.id not in reused],
+        request.prompt,
+        request.max_tokens,
+        request.temperature,
+        policy=request.completion_policy or "all",
+        min_responses=request.min_responses,
+        deadline_ms=remaining_ms(),
+        use_cache=request.use_cache is not False,
+        on_result=on_result
     )
+    by_model = {**reused, **{r["model"]: r for r in new_results}}
+    results = [by_model[model.id] for model in top_models]
     
-    return QueryResponse(
-        prompt=request.prompt,
-        task_type=task_type,
-        models_used=[r["model"] for r in results if r["success"]],
-        responses={r["model"]: r["response"] for r in results},
-        synthesis=compiled["synthesis"],
-        unified_document=compiled["document"],
-        timestamp=datetime.now().isoformat(),
-        total_tokens=sum(r["tokens"] for r in results),
-        estimated_cost=compiled["estimated_cost"]
+    compiled = await compile_results(request, task_type, results)
+    record_usage(task_type, new_results, compiled)
+    return build_query_response(request, task_type, results, compiled, routing).model_dump()
+
+@app.post("/jobs", response_model=JobSubmitted, status_code=202)
+async def submit_job(request: QueryRequest):
+    """
+    Queue a query as a background job and return its id immediately
+    
+    Poll GET /jobs/{job_id} for per-model progress and the result.
+    """
+    validate_completion_policy(request)
+    validate_response_mode(request)
+    # The job runs after this request ends, so carry an X-Deadline-Ms budget over
+    header_ms = remaining_ms()
+    if header_ms is not None and (request.deadline_ms is None or header_ms < request.deadline_ms):
+        request.deadline_ms = max(header_ms, 1)
+    job_id = await job_manager.submit(request.model_dump(exclude_none=True), current_client.get())
+    return JobSubmitted(job_id=job_id, status="queued", poll_url=f"/jobs/{job_id}")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, since: Optional[int] = None):
+    """
+    Job status, per-model progress and (once finished) the QueryResponse
+    
+    With `wait`, long-polls up to that many seconds (capped by
+    JOBS_MAX_WAIT_SECONDS) for the job to finish, or, with `since`, for
+    its version to move past `since`.
+    """
+    if wait < 0:
+        raise HTTPException(status_code=400, detail="wait must not be negative")
+    job = await job_manager.get(job_id, since=since, wait=wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest, http_request: Request):
+    """
+    Streaming endpoint: Server-Sent Events with each model's tokens as they arrive
+    
+    Emits `start`, then interleaved `token` events tagged by model id,
+    a `model_done` event per model, and finally `done` carrying the full
+    QueryResponse (including the compiled unified document).
+    """
+    validate_response_mode(request)
+    task_type = resolve_task_type(request)
+    top_models, routing = select_models(request, task_type)
+    # Model calls end at the deadline, so the stream still closes with `done`
+    tighten_deadline(request.deadline_ms)
+    # The admission slot is held until the stream ends
+    ticket = await admit_stream(request_priority(http_request))
+    
+    async def event_stream():
+        session = await get_session()
+        queue: asyncio.Queue = asyncio.Queue()
+        results_by_model: Dict[str, Dict] = {}
+        
+        async def run_model(model_id: str):
+            try:
+                results_by_model[model_id] = await query_model_stream(
+                    session, model_id, request.prompt,
+                    request.max_tokens, request.temperature, queue
+                )
+            except Exception as e:
+                results_by_model[model_id] = {
+                    "model": model_id,
+                    "response": f"Error: {str(e)}",
+                    "tokens": 0,
+                    "success": False
+                }
+            finally:
+                # A None delta marks this model's stream as finished, however it ended
+                queue.put_nowait((model_id, None))
+        
+        tasks = [asyncio.create_task(run_model(model.id)) for model in top_models]
+        
+        try:
+            yield format_sse("start", {
+                "task_type": task_type,
+                "models": [model.id for model in top_models],
+                "routing": routing
+            })
+            
+            remaining = len(tasks)
+            while remaining:
+                model_id, delta = await queue.get()
+                if delta is not None:
+                    yield format_sse("token", {"model": model_id, "delta": delta})
+                    continue
+                remaining -= 1
+                result = results_by_model[model_id]
+                yield format_sse("model_done", {
+                    "model": model_id,
+                    "success": result["success"],
+                    "tokens": result["tokens"]
+                })
+            
+            results = [results_by_model[model.id] for model in top_models]
+            compiled = await compile_results(request, task_type, results)
+            record_usage(task_type, results, compiled)
+            response = build_query_response(request, task_type, results, compiled, routing)
+            yield format_sse("done", response.model_dump())
+        finally:
+            # Client disconnected or stream finished: stop any upstream calls
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    return admitted_streaming_response(
+        ticket,
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.post("/query/document")
+async def query_document(request: QueryRequest, http_request: Request):
+    """
+    Document endpoint: stream the unified markdown document as it is compiled
+    
+    The header is sent immediately and each model's section is written
+    as its result lands, so neither the full document nor a second copy
+    of the answers is held in memory. Completion policies and deadlines
+    apply as for /query.
+    """
+    validate_completion_policy(request)
+    tighten_deadline(request.deadline_ms)
+    task_type = resolve_task_type(request)
+    top_models, routing = select_models(request, task_type)
+    ticket = await admit_stream(request_priority(http_request))
+    
+    async def document_stream():
+        queue: asyncio.Queue = asyncio.Queue()
+        fanout = asyncio.create_task(query_multiple_models(
+            top_models,
+            request.prompt,
+            request.max_tokens,
+            request.temperature,
+            policy=request.completion_policy or "all",
+            min_responses=request.min_responses,
+            deadline_ms=remaining_ms(),
+            use_cache=request.use_cache is not False,
+            on_result=queue.put_nowait
+        ))
+        builder = DocumentBuilder(request.prompt, task_type, len(top_models))
+        try:
+            yield builder.header()
+            for _ in top_models:
+                section = builder.add_result(await queue.get())
+                if section:
+                    yield section
+            await fanout
+            synthesis_call = None
+            if request.include_synthesis and len(builder.successful) >= 2:
+                synthesis_call = await run_synthesis(request.prompt, builder.successful)
+            synthesis = builder.resolve_synthesis(synthesis_call, request.include_synthesis)
+            record_usage(task_type, builder.results, {"synthesis_call": synthesis_call})
+            yield builder.footer(synthesis)
+        finally:
+            # Client disconnected: stop any upstream calls
+            if not fanout.done():
+                fanout.cancel()
+    
+    return admitted_streaming_response(
+        ticket,
+        document_stream(),
+        media_type="text/markdown; charset=utf-8",
+        headers={"X-Task-Type": task_type, "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def query_batch(http_request: Request):
+    """
+    Batch endpoint: run many prompts with shared scheduling
+    
+    Accepts a JSON array of QueryRequest objects (or {"requests": [...]}),
+    or an NDJSON upload with Content-Type application/x-ndjson. All
+    prompt x model calls share one worker-wide concurrency limit with
+    per-model caps. Each item's completion policy applies as for /query.
+    Results stream back as NDJSON lines, in completion order, each
+    tagged with the `index` of its request.
+    """
+    try:
+        items = parse_batch_body(
+            await http_request.body(),
+            http_request.headers.get("content-type", "")
+        )
+        requests = [QueryRequest.model_validate(item) for item in items]
+    except BatchParseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    
+    # Detect task types for all prompts in one pass (off the event loop for large batches)
+    undetected = [i for i, r in enumerate(requests) if not r.task_type]
+    classifier = get_classifier()
+    prompts = [requests[i].prompt for i in undetected]
+    started = time.perf_counter()
+    if len(prompts) >= BATCH_CLASSIFY_THREAD_MIN:
+        detected = await asyncio.to_thread(classifier.classify_batch, prompts)
+    else:
+        detected = classifier.classify_batch(prompts)
+    if detected:
+        # Batch classification is recorded as the mean time per prompt
+        pipeline_metrics.observe_task_detection(
+            f"{classifier.name}_batch", (time.perf_counter() - started) / len(detected)
+        )
+    task_types = [r.task_type for r in requests]
+    for i, task_type in zip(undetected, detected):
+        task_types[i] = task_type
+    
+    # Every item is admitted on its own, in the batch class at most; the gate keeps
+    # one batch from filling the class queue with items that could not run yet anyway
+    priority = request_priority(http_request, BACKGROUND_CLASS)
+    gate = asyncio.Semaphore(max(1, admission_controller.max_concurrent))
+    
+    async def run_one(index: int, request: QueryRequest, task_type: str) -> Dict:
+        # Each item runs in its own task, so its deadline stays local to it
+        tighten_deadline(request.deadline_ms)
+        try:
+            validate_response_mode(request)
+            validate_completion_policy(request)
+            top_models, routing = select_models(request, task_type)
+        except HTTPException as e:
+            return {"index": index, "error": e.detail}
+        if not admission_controller.enabled:
+            return await run_item(index, request, task_type, top_models, routing)
+        async with gate:
+            try:
+                async with admission_controller.admitted(priority, remaining_seconds()):
+                    return await run_item(index, request, task_type, top_models, routing)
+            except AdmissionRejected as e:
+                return {"index": index, "error": server_busy(e, priority).detail}
+    
+    async def run_item(
+        index: int, request: QueryRequest, task_type: str, top_models: List[ModelRecord], routing: Optional[Dict]
+    ) -> Dict:
+        results = await query_multiple_models(
+            top_models,
+            request.prompt,
+            request.max_tokens,
+            request.temperature,
+            policy=request.completion_policy or "all",
+            min_responses=request.min_responses,
+            deadline_ms=remaining_ms(),
+            use_cache=request.use_cache is not False,
+            scheduler=batch_scheduler
+        )
+        compiled = await compile_results(request, task_type, results)
+        record_usage(task_type, results, compiled)
+        response = build_query_response(request, task_type, results, compiled, routing)
+        return {"index": index, **response.model_dump()}
+    
+    async def ndjson_stream():
+        tasks = [
+            asyncio.create_task(run_one(i, request, task_types[i]))
+            for i, request in enumerate(requests)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                yield fast_json.dumps(line) + "\n"
+        finally:
+            # Client disconnected: drop queued and in-flight calls
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
 @app.post("/query-with-type", response_model=QueryResponse)
-async def query_with_type(request: QueryRequest):
+async def query_with_type(request: QueryRequest, http_request: Request):
     """
     Query with explicit task type (skips auto-detection)
     """
     if not request.task_type:
         raise HTTPException(status_code=400, detail="task_type is required for this endpoint")
     
-    return await query(request)
+    return await query(request, http_request)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against `etag`
+    
+    Compressed responses carry the weak form W/"..." of the same tag, and a
+    client may send back a list of tags or `*`.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+def cached_json_response(request: Request, body: bytes, etag: str) -> Response:
+    """Serve a pre-serialized JSON body, answering 304 when the client's ETag matches"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/models")
-async def get_models():
+async def get_models(request: Request):
     """List all available models organized by task type"""
-    from .model_router import MODEL_REGISTRY
-    return MODEL_REGISTRY
+    registry = get_registry()
+    return cached_json_response(request, registry.models_json, registry.models_etag)
 
 @app.get("/task-types")
-async def get_task_types():
+async def get_task_types(request: Request):
     """List all supported task types"""
-    from .model_router import MODEL_REGISTRY
+    registry = get_registry()
+    return cached_json_response(request, registry.task_types_json, registry.task_types_etag)
+
+@app.get("/usage")
+async def get_usage():
+    """
+    Token and cost totals for the caller (X-API-Key, or client address), by task type
+    
+    Costs use each model's registry prices and the prompt/completion
+    split reported by OpenRouter.
+    """
+    return usage_ledger.usage(current_client.get())
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this worker (404 when METRICS_ENABLED is false)"""
+    if not pipeline_metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(
+        content=pipeline_metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/stats")
+async def get_stats():
+    """Runtime statistics for this worker"""
     return {
-        "task_types": list(MODEL_REGISTRY.keys()),
-        "description": "Use these task types with /query-with-type endpoint"
+        "classifier": get_classifier().name,
+        "registry": registry_stats(),
+        "pool": get_pool_stats(),
+        "latency": latency_tracker.snapshot(),
+        "health": model_health.snapshot(),
+        "circuits": circuit_breakers.stats(),
+        "hedging": hedge_budget.stats(),
+        "cache": response_cache.stats(),
+        "singleflight": model_calls.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "batch": batch_scheduler.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "usage_ledger": usage_ledger.stats(),
+        "synthesis": synthesis_stage.stats(),
+        "jobs": job_manager.stats(),
+        "admission": admission_controller.stats(),
+        "compression": response_compressor.stats()
     }
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from .model_stats import LATENCY_WINDOW
+    from .shared_state import multi_worker_state
+    
+    parser = argparse.ArgumentParser(description="Universal OZ API server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+        help="Worker processes; more than one shares cache, model stats and rate limits"
+    )
+    args = parser.parse_args()
+    
+    if args.workers > 1:
+        # Workers import api.main afresh and attach to the segment named in the environment
+        with multi_worker_state(LATENCY_WINDOW):
+            uvicorn.run("api.main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
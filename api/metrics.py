@@ -0,0 +1,355 @@
+"""
+Metrics
+Low-overhead Prometheus counters and histograms for the query pipeline
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+# Instrumentation switch (override via environment)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Seconds between event-loop lag probes
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+
+# Default bucket bounds in seconds
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Request paths reported individually; anything else is "other"
+METRICS_PATHS = frozenset({
+    "/", "/query", "/query/stream", "/query/document", "/query/batch", "/query-with-type",
+    "/models", "/task-types", "/usage", "/stats", "/metrics",
+})
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {_format_number(value)}")
+        return lines
+
+
+class Gauge:
+    """Current value keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, labels: Tuple[str, ...], value: float) -> None:
+        self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram keyed by a tuple of label values
+
+    Each label set holds one preallocated list of per-bucket counts plus
+    sum and count, so observe() is a bisect and three additions.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = UPSTREAM_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., +Inf count, sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _label_text(self.labelnames, labels, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _label_text(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {series[-1]}")
+            label_text = _label_text(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(series[-2])}")
+            lines.append(f"{self.name}_count{label_text} {series[-1]}")
+        return lines
+
+
+class PipelineMetrics:
+    """
+    Every metric the API exports, with typed recording helpers
+
+    All helpers return immediately when metrics are disabled, so call
+    sites need no checks of their own.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.task_detection = Histogram(
+            "uoz_task_detection_seconds", "Time spent classifying prompts into task types",
+            ("engine",), FAST_BUCKETS
+        )
+        self.routing_decisions = Counter(
+            "uoz_routing_decisions_total", "Model selections by routing mode and task type",
+            ("mode", "task_type")
+        )
+        self.failovers = Counter(
+            "uoz_failovers_total", "Models replaced because their circuit was open", ("model",)
+        )
+        self.upstream_connect = Histogram(
+            "uoz_upstream_connect_seconds", "Time to open a new upstream connection", ("model",)
+        )
+        self.upstream_ttfb = Histogram(
+            "uoz_upstream_ttfb_seconds", "Time from sending an upstream request to its response headers",
+            ("model",)
+        )
+        self.upstream_duration = Histogram(
+            "uoz_upstream_duration_seconds", "Total upstream call time including the body", ("model",)
+        )
+        self.upstream_responses = Counter(
+            "uoz_upstream_responses_total", "Upstream call outcomes by HTTP status or error kind",
+            ("model", "code")
+        )
+        self.upstream_tokens = Counter(
+            "uoz_upstream_tokens_total", "Tokens reported by upstream usage", ("model", "kind")
+        )
+        self.compile_time = Histogram(
+            "uoz_compile_seconds", "Time to compile results into the response (including model synthesis)",
+            (), UPSTREAM_BUCKETS
+        )
+        self.http_requests = Counter(
+            "uoz_http_requests_total", "HTTP requests by path and status", ("path", "status")
+        )
+        self.http_duration = Histogram(
+            "uoz_http_request_duration_seconds", "HTTP request time until the last body byte", ("path",)
+        )
+        self.response_size = Histogram(
+            "uoz_http_response_bytes", "HTTP response body size", ("path",), SIZE_BUCKETS
+        )
+        self.loop_lag = Histogram(
+            "uoz_event_loop_lag_seconds", "Event loop scheduling delay measured by a periodic probe",
+            (), FAST_BUCKETS
+        )
+        self.admission_queued = Gauge(
+            "uoz_admission_queue_depth", "Requests waiting for admission by priority class", ("priority",)
+        )
+        self.admission_in_flight = Gauge(
+            "uoz_admission_in_flight", "Admitted requests running by priority class", ("priority",)
+        )
+        self.admission_wait = Histogram(
+            "uoz_admission_wait_seconds", "Time admitted requests spent queued", ("priority",)
+        )
+        self.admission_shed = Counter(
+            "uoz_admission_shed_total", "Requests rejected with 503 by priority class and reason",
+            ("priority", "reason")
+        )
+        self.rate_limit_queued = Gauge(
+            "uoz_rate_limit_queue_depth", "Upstream calls waiting for the client-side rate limiter"
+        )
+        self.rate_limit_wait = Histogram(
+            "uoz_rate_limit_wait_seconds", "Time queued upstream calls waited for the rate limiter"
+        )
+        self._trace_ctx: Dict[str, Dict[str, str]] = {}
+
+    def observe_task_detection(self, engine: str, seconds: float) -> None:
+        if self.enabled:
+            self.task_detection.observe((engine,), seconds)
+
+    def record_routing(self, mode: str, task_type: str, failover: List[Dict]) -> None:
+        if not self.enabled:
+            return
+        self.routing_decisions.inc((mode, task_type))
+        for substitution in failover:
+            self.failovers.inc((substitution["replaced"],))
+
+    def record_upstream(
+        self,
+        model_id: str,
+        code: str,
+        ttfb: Optional[float] = None,
+        total: Optional[float] = None,
+        usage: Optional[Dict] = None,
+    ) -> None:
+        """Record one upstream call: outcome code, timings and token usage"""
+        if not self.enabled:
+            return
+        labels = (model_id,)
+        self.upstream_responses.inc((model_id, code))
+        if ttfb is not None:
+            self.upstream_ttfb.observe(labels, ttfb)
+        if total is not None:
+            self.upstream_duration.observe(labels, total)
+        if usage:
+            if "prompt_tokens" in usage:
+                self.upstream_tokens.inc((model_id, "prompt"), usage["prompt_tokens"])
+                self.upstream_tokens.inc((model_id, "completion"), usage["completion_tokens"])
+            else:
+                self.upstream_tokens.inc((model_id, "total"), usage["tokens"])
+
+    def observe_compile(self, seconds: float) -> None:
+        if self.enabled:
+            self.compile_time.observe((), seconds)
+
+    def record_admission(self, priority: str, queued: int, in_flight: int) -> None:
+        if self.enabled:
+            self.admission_queued.set((priority,), queued)
+            self.admission_in_flight.set((priority,), in_flight)
+
+    def observe_admission_wait(self, priority: str, seconds: float) -> None:
+        if self.enabled:
+            self.admission_wait.observe((priority,), seconds)
+
+    def record_shed(self, priority: str, reason: str) -> None:
+        if self.enabled:
+            self.admission_shed.inc((priority, reason))
+
+    def record_rate_limit_queue(self, queued: int) -> None:
+        if self.enabled:
+            self.rate_limit_queued.set((), queued)
+
+    def observe_rate_limit_wait(self, seconds: float) -> None:
+        if self.enabled:
+            self.rate_limit_wait.observe((), seconds)
+
+    def trace_ctx(self, model_id: str) -> Dict[str, str]:
+        """Cached per-model trace_request_ctx for aiohttp connection tracing"""
+        ctx = self._trace_ctx.get(model_id)
+        if ctx is None:
+            ctx = self._trace_ctx[model_id] = {"model": model_id}
+        return ctx
+
+    def trace_configs(self) -> List[aiohttp.TraceConfig]:
+        """aiohttp trace hooks timing new upstream connections (empty when disabled)"""
+        if not self.enabled:
+            return []
+
+        async def on_connect_start(session, ctx, params):
+            ctx.connect_started = time.perf_counter()
+
+        async def on_connect_end(session, ctx, params):
+            started = getattr(ctx, "connect_started", None)
+            request_ctx = ctx.trace_request_ctx or {}
+            if started is not None:
+                self.upstream_connect.observe(
+                    (request_ctx.get("model", "unknown"),), time.perf_counter() - started
+                )
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_start.append(on_connect_start)
+        trace.on_connection_create_end.append(on_connect_end)
+        return [trace]
+
+    async def watch_loop_lag(self, interval: float = METRICS_LOOP_LAG_INTERVAL) -> None:
+        """Sleep `interval` repeatedly and record how late each wake-up is"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe((), max(0.0, loop.time() - started - interval))
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric"""
+        lines: List[str] = []
+        for metric in (
+            self.task_detection, self.routing_decisions, self.failovers,
+            self.upstream_connect, self.upstream_ttfb, self.upstream_duration,
+            self.upstream_responses, self.upstream_tokens, self.compile_time,
+            self.http_requests, self.http_duration, self.response_size, self.loop_lag,
+            self.admission_queued, self.admission_in_flight, self.admission_wait, self.admission_shed,
+            self.rate_limit_queued, self.rate_limit_wait,
+        ):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request count, duration and response size
+
+    Wraps `send` to add up body bytes; paths outside METRICS_PATHS share
+    one "other" label so path cardinality stays bounded.
+    """
+
+    def __init__(self, app, metrics: Optional["PipelineMetrics"] = None):
+        self.app = app
+        self.metrics = metrics or pipeline_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"] if scope["path"] in METRICS_PATHS else "other"
+        started = time.perf_counter()
+        state = [0, "500"]  # body bytes, status
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state[1] = str(message["status"])
+            elif message["type"] == "http.response.body":
+                state[0] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            labels = (path,)
+            self.metrics.http_requests.inc((path, state[1]))
+            self.metrics.http_duration.observe(labels, time.perf_counter() - started)
+            self.metrics.response_size.observe(labels, state[0])
+
+
+# Worker-wide instance
+pipeline_metrics = PipelineMetrics()
@@ -3,7 +3,13 @@ Model Router
 Maps task types to top 5 models with pricing and specialization info
 """
 
-from typing import List, Dict
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .model_stats import latency_tracker, model_health
 
 # Model registry organized by task type
 # Top 5 models for each task, ordered by quality/suitability
@@ -339,6 +345,180 @@ MODEL_REGISTRY = {
     ]
 }
 
+class ModelRecord(NamedTuple):
+    """
+    Immutable model entry for one task type
+    
+    `cost_per_m` is the blended USD price per million tokens; the optional
+    prompt/completion prices override it for each side of the usage split.
+    """
+    id: str
+    name: str
+    cost_per_m: float
+    specialization: str
+    prompt_cost_per_m: Optional[float] = None
+    completion_cost_per_m: Optional[float] = None
+
+    @property
+    def prompt_price(self) -> float:
+        """USD per million prompt tokens"""
+        return self.cost_per_m if self.prompt_cost_per_m is None else self.prompt_cost_per_m
+
+    @property
+    def completion_price(self) -> float:
+        """USD per million completion tokens"""
+        return self.cost_per_m if self.completion_cost_per_m is None else self.completion_cost_per_m
+
+    def to_dict(self) -> Dict:
+        data = self._asdict()
+        # Optional prices are only listed when the registry sets them
+        for field in ("prompt_cost_per_m", "completion_cost_per_m"):
+            if data[field] is None:
+                del data[field]
+        return data
+
+# Registry fields every model entry must provide
+REQUIRED_MODEL_FIELDS = tuple(f for f in ModelRecord._fields if f not in ModelRecord._field_defaults)
+
+class ModelRegistry:
+    """
+    Compiled, read-only view of a model registry dict
+    
+    Built once per (re)load with an id -> record index, task -> ordered
+    tuple index, a reverse index of task types per model id, and the
+    pre-serialized JSON bodies (with ETags) served by /models and /task-types.
+    """
+    
+    def __init__(self, source: Dict[str, List[Dict]], origin: str = "builtin"):
+        by_task: Dict[str, Tuple[ModelRecord, ...]] = {}
+        by_id: Dict[str, ModelRecord] = {}
+        task_types_by_model: Dict[str, List[str]] = {}
+        
+        for task_type, models in source.items():
+            if not isinstance(models, list):
+                raise ValueError(f"Task type {task_type!r} must map to a list of models")
+            records = []
+            for model in models:
+                missing = [f for f in REQUIRED_MODEL_FIELDS if f not in model]
+                if missing:
+                    raise ValueError(f"Model in {task_type!r} is missing fields: {missing}")
+                record = ModelRecord(
+                    id=str(model["id"]),
+                    name=str(model["name"]),
+                    cost_per_m=float(model["cost_per_m"]),
+                    specialization=str(model["specialization"]),
+                    prompt_cost_per_m=_optional_price(model, "prompt_cost_per_m"),
+                    completion_cost_per_m=_optional_price(model, "completion_cost_per_m")
+                )
+                records.append(record)
+                # First occurrence wins, matching task-type order
+                by_id.setdefault(record.id, record)
+                task_types_by_model.setdefault(record.id, []).append(task_type)
+            by_task[task_type] = tuple(records)
+        
+        self.origin = origin
+        self.by_task = by_task
+        self.by_id = by_id
+        self.task_types_by_model = {k: tuple(v) for k, v in task_types_by_model.items()}
+        self.task_types = tuple(by_task)
+        
+        self.models_json = json.dumps(
+            {task: [r.to_dict() for r in records] for task, records in by_task.items()}
+        ).encode("utf-8")
+        self.models_etag = _etag(self.models_json)
+        self.task_types_json = json.dumps({
+            "task_types": list(self.task_types),
+            "description": "Use these task types with /query-with-type endpoint"
+        }).encode("utf-8")
+        self.task_types_etag = _etag(self.task_types_json)
+
+def _optional_price(model: Dict, field: str) -> Optional[float]:
+    value = model.get(field)
+    return None if value is None else float(value)
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+def load_registry_file(path: str) -> ModelRegistry:
+    """
+    Build a registry from a JSON or YAML file with the MODEL_REGISTRY layout
+    
+    YAML requires PyYAML.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        import yaml
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Model registry file must contain a mapping of task type -> models")
+    return ModelRegistry(data, origin=path)
+
+# Registry file to hot-reload from (optional; the built-in MODEL_REGISTRY otherwise)
+MODEL_REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", "")
+MODEL_REGISTRY_RELOAD_INTERVAL = float(os.getenv("MODEL_REGISTRY_RELOAD_INTERVAL", "5"))
+
+_registry = ModelRegistry(MODEL_REGISTRY)
+_reload_state = {"mtime": None, "reloads": 0, "last_error": None}
+
+def get_registry() -> ModelRegistry:
+    """Current compiled registry (swapped atomically on reload)"""
+    return _registry
+
+def set_registry(registry: ModelRegistry) -> None:
+    """Install a new compiled registry"""
+    global _registry
+    _registry = registry
+
+async def reload_registry_if_changed(path: str = MODEL_REGISTRY_PATH) -> bool:
+    """
+    Reload the registry file if its mtime changed
+    
+    Parsing and compiling run in a worker thread; requests keep using the
+    previous registry until the new one is swapped in. A broken file is
+    reported in registry_stats() and the previous registry stays active.
+    
+    Returns:
+        True if a new registry was installed
+    """
+    if not path:
+        return False
+    try:
+        mtime = os.stat(path).st_mtime
+        if mtime == _reload_state["mtime"]:
+            return False
+        registry = await asyncio.to_thread(load_registry_file, path)
+    except Exception as e:
+        _reload_state["last_error"] = f"{type(e).__name__}: {e}"
+        return False
+    _reload_state["mtime"] = mtime
+    _reload_state["reloads"] += 1
+    _reload_state["last_error"] = None
+    set_registry(registry)
+    return True
+
+async def watch_registry_file(
+    path: str = MODEL_REGISTRY_PATH,
+    interval: float = MODEL_REGISTRY_RELOAD_INTERVAL
+) -> None:
+    """Poll the registry file and hot-reload it on change (runs until cancelled)"""
+    while True:
+        await reload_registry_if_changed(path)
+        await asyncio.sleep(interval)
+
+def registry_stats() -> Dict:
+    """Registry reload state for /stats"""
+    registry = get_registry()
+    return {
+        "origin": registry.origin,
+        "task_types": len(registry.task_types),
+        "models": len(registry.by_id),
+        "reloads": _reload_state["reloads"],
+        "last_error": _reload_state["last_error"],
+    }
+
 def get_top_models(task_type: str, limit: int = 5) -> List[Dict]:
     """
     Get top N models for a given task type
@@ -350,20 +530,187 @@ def get_top_models(task_type: str, limit: int = 5) -> List[Dict]:
     Returns:
         List of model dictionaries with id, name, cost, specialization
     """
-    models = MODEL_REGISTRY.get(task_type, [])
-    return models[:limit]
+    return [record.to_dict() for record in get_top_model_records(task_type, limit)]
+
+def get_top_model_records(task_type: str, limit: int = 5) -> List[ModelRecord]:
+    """
+    Get top N models for a given task type as immutable records
+    
+    The hot-path form of get_top_models: no per-call dict copies.
+    
+    Args:
+        task_type: The task category
+        limit: Number of models to return (default 5)
+    
+    Returns:
+        List of model records with id, name, cost, specialization
+    """
+    return list(get_registry().by_task.get(task_type, ())[:limit])
+
+# Adaptive routing weights (lower total score ranks first)
+ROUTING_WEIGHT_QUALITY = float(os.getenv("ROUTING_WEIGHT_QUALITY", "1.0"))
+ROUTING_WEIGHT_LATENCY = float(os.getenv("ROUTING_WEIGHT_LATENCY", "1.0"))
+ROUTING_WEIGHT_ERRORS = float(os.getenv("ROUTING_WEIGHT_ERRORS", "2.0"))
+ROUTING_WEIGHT_COST = float(os.getenv("ROUTING_WEIGHT_COST", "1.0"))
+
+ROUTING_MODES = ("static", "adaptive")
+
+def estimate_call_cost(record: ModelRecord, prompt_tokens: int, max_tokens: int) -> float:
+    """Upper-bound USD cost of one call (prompt plus a full completion)"""
+    return (record.prompt_price * prompt_tokens + record.completion_price * max_tokens) / 1_000_000
+
+def rank_models(
+    task_type: str,
+    limit: int = 5,
+    prompt_tokens: int = 0,
+    max_tokens: int = 2000,
+    max_cost_usd: Optional[float] = None,
+    max_latency_ms: Optional[float] = None,
+    min_models: Optional[int] = None
+) -> Tuple[List[ModelRecord], Dict]:
+    """
+    Rank a task's candidate models by live latency, error rate and price
+    
+    Each candidate gets a weighted score from its registry position
+    (quality prior), observed p95 latency, EWMA error rate and estimated
+    call cost, each normalized to 0-1 across the candidates. Models are
+    taken in score order, skipping those whose p95 exceeds
+    `max_latency_ms` or whose cost would exceed `max_cost_usd`. If fewer
+    than `min_models` remain, the best skipped models are added back.
+    
+    Returns:
+        (selected records, explanation dict for the response)
+    """
+    candidates = get_registry().by_task.get(task_type, ())
+    if not candidates:
+        return [], {"mode": "adaptive", "candidates": []}
+    
+    rows = []
+    for position, record in enumerate(candidates):
+        p95 = latency_tracker.percentile(record.id, 0.95)
+        p50 = latency_tracker.percentile(record.id, 0.50)
+        if p95 is None:
+            p95 = p50 = model_health.latency(record.id)
+        rows.append({
+            "record": record,
+            "position": position,
+            "p50": p50,
+            "p95": p95,
+            "error_rate": model_health.error_rate(record.id),
+            "cost": estimate_call_cost(record, prompt_tokens, max_tokens),
+        })
+    
+    known_p95 = [r["p95"] for r in rows if r["p95"] is not None]
+    worst_p95 = max(known_p95) if known_p95 else 0.0
+    worst_cost = max(r["cost"] for r in rows)
+    last_position = max(len(rows) - 1, 1)
+    for row in rows:
+        if row["p95"] is None or worst_p95 == 0:
+            latency_term = 0.5  # no data yet: neutral
+        else:
+            latency_term = row["p95"] / worst_p95
+        cost_term = row["cost"] / worst_cost if worst_cost else 0.0
+        row["score"] = (
+            ROUTING_WEIGHT_QUALITY * row["position"] / last_position
+            + ROUTING_WEIGHT_LATENCY * latency_term
+            + ROUTING_WEIGHT_ERRORS * row["error_rate"]
+            + ROUTING_WEIGHT_COST * cost_term
+        )
+    rows.sort(key=lambda r: r["score"])
+    
+    selected, skipped = [], []
+    spent = 0.0
+    for row in rows:
+        if len(selected) >= limit:
+            row["reason"] = "below the top-ranked models"
+            skipped.append(row)
+        elif max_latency_ms is not None and row["p95"] is not None and row["p95"] * 1000 > max_latency_ms:
+            row["reason"] = "p95 latency above max_latency_ms"
+            skipped.append(row)
+        elif max_cost_usd is not None and spent + row["cost"] > max_cost_usd:
+            row["reason"] = "would exceed max_cost_usd"
+            skipped.append(row)
+        else:
+            row["reason"] = "ranked"
+            selected.append(row)
+            spent += row["cost"]
+    
+    # Relax constraints to honor min_models, best skipped first
+    needed = min(min_models or 0, limit) - len(selected)
+    for row in skipped[:max(needed, 0)]:
+        row["reason"] = "added to satisfy min_models"
+        selected.append(row)
+        spent += row["cost"]
+    
+    chosen = {id(row) for row in selected}
+    explanation = {
+        "mode": "adaptive",
+        "constraints": {
+            "max_cost_usd": max_cost_usd,
+            "max_latency_ms": max_latency_ms,
+            "min_models": min_models,
+        },
+        "estimated_cost_usd": round(spent, 6),
+        "candidates": [
+            {
+                "id": row["record"].id,
+                "selected": id(row) in chosen,
+                "reason": row["reason"],
+                "score": round(row["score"], 4),
+                "p50_ms": round(row["p50"] * 1000, 1) if row["p50"] is not None else None,
+                "p95_ms": round(row["p95"] * 1000, 1) if row["p95"] is not None else None,
+                "error_rate": round(row["error_rate"], 4),
+                "estimated_cost_usd": round(row["cost"], 6),
+            }
+            for row in rows
+        ],
+    }
+    return [row["record"] for row in selected], explanation
+
+def get_failover_models(task_type: str, exclude: Optional[set] = None) -> List[ModelRecord]:
+    """
+    Ordered substitutes for a task's models
+    
+    First the task's own models (in registry order), then generalist
+    models from other task types, most widely used first, so a task can
+    still reach five models when some of its own are unavailable.
+    """
+    registry = get_registry()
+    exclude = set(exclude or ())
+    substitutes = []
+    for record in registry.by_task.get(task_type, ()):
+        if record.id not in exclude:
+            substitutes.append(record)
+            exclude.add(record.id)
+    generalists = sorted(
+        (record for record in registry.by_id.values() if record.id not in exclude),
+        key=lambda record: -len(registry.task_types_by_model[record.id])
+    )
+    substitutes.extend(generalists)
+    return substitutes
 
 def get_all_task_types() -> List[str]:
     """Get list of all supported task types"""
-    return list(MODEL_REGISTRY.keys())
+    return list(get_registry().task_types)
+
+# Blended USD per million tokens for models missing from the registry
+DEFAULT_COST_PER_M = float(os.getenv("DEFAULT_COST_PER_M", "3.0"))
+
+def get_model_prices(model_id: str) -> Tuple[float, float]:
+    """USD per million (prompt, completion) tokens for a model"""
+    record = get_registry().by_id.get(model_id)
+    if record is None:
+        return DEFAULT_COST_PER_M, DEFAULT_COST_PER_M
+    return record.prompt_price, record.completion_price
 
-def get_model_info(model_id: str) -> Dict:
+def get_model_info(model_id: str) -> Optional[Dict]:
     """Get info for a specific model across all task types"""
-    for task_type, models in MODEL_REGISTRY.items():
-        for model in models:
-            if model["id"] == model_id:
-                return {
-                    **model,
-                    "task_type": task_type
-                }
-    return None
+    registry = get_registry()
+    record = registry.by_id.get(model_id)
+    if record is None:
+        return None
+    return {
+        **record.to_dict(),
+        "task_type": registry.task_types_by_model[model_id][0],
+        "task_types": list(registry.task_types_by_model[model_id])
+    }
@@ -0,0 +1,253 @@
+"""
+Model Statistics
+Rolling per-model latency tracking, EWMA health stats and the hedged-request budget
+"""
+
+import math
+import os
+from collections import deque
+from typing import Deque, Dict, Optional, Sequence
+
+from .shared_state import SharedSegment, shared_segment
+
+# Number of recent latency samples kept per model
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "200"))
+
+# Hedging configuration
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Hedges allowed per primary request; capped at 1.0 so spend never exceeds 2x
+HEDGE_BUDGET_RATIO = min(float(os.getenv("HEDGE_BUDGET_RATIO", "0.1")), 1.0)
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "5"))
+
+# Smoothing factor for per-model EWMA latency and error rate
+MODEL_STATS_EWMA_ALPHA = float(os.getenv("MODEL_STATS_EWMA_ALPHA", "0.2"))
+
+
+class LatencyTracker:
+    """Rolling window of recent successful-call latencies per model id"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model_id: str, seconds: float) -> None:
+        """Record one observed latency in seconds"""
+        samples = self._samples.get(model_id)
+        if samples is None:
+            samples = self._samples[model_id] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def _window(self, model_id: str) -> Optional[Sequence[float]]:
+        return self._samples.get(model_id)
+
+    def _model_ids(self):
+        return list(self._samples)
+
+    def count(self, model_id: str) -> int:
+        """Number of samples currently held for a model"""
+        samples = self._window(model_id)
+        return len(samples) if samples else 0
+
+    def percentile(self, model_id: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Get the q-th quantile (0-1) of recent latencies for a model
+
+        Returns None until at least `min_samples` samples have been seen.
+        """
+        samples = self._window(model_id)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(int(q * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-model p50/p95/p99 latency summary in milliseconds"""
+        summary = {}
+        for model_id in self._model_ids():
+            samples = self._window(model_id)
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            last = len(ordered) - 1
+            summary[model_id] = {
+                "samples": len(ordered),
+                "p50_ms": round(ordered[min(int(0.50 * len(ordered)), last)] * 1000, 1),
+                "p95_ms": round(ordered[min(int(0.95 * len(ordered)), last)] * 1000, 1),
+                "p99_ms": round(ordered[min(int(0.99 * len(ordered)), last)] * 1000, 1),
+            }
+        return summary
+
+
+class ModelHealth:
+    """Exponentially weighted latency and error rate per model id"""
+
+    def __init__(self, alpha: float = MODEL_STATS_EWMA_ALPHA):
+        self.alpha = alpha
+        # model_id -> [ewma_latency_seconds or None, ewma_error_rate, calls]
+        self._stats: Dict[str, list] = {}
+
+    def _entry(self, model_id: str) -> list:
+        entry = self._stats.get(model_id)
+        if entry is None:
+            entry = self._stats[model_id] = [None, 0.0, 0]
+        return entry
+
+    def record_success(self, model_id: str, seconds: float) -> None:
+        entry = self._entry(model_id)
+        entry[0] = seconds if entry[0] is None else entry[0] + self.alpha * (seconds - entry[0])
+        entry[1] += self.alpha * (0.0 - entry[1])
+        entry[2] += 1
+
+    def record_failure(self, model_id: str) -> None:
+        entry = self._entry(model_id)
+        entry[1] += self.alpha * (1.0 - entry[1])
+        entry[2] += 1
+
+    def latency(self, model_id: str) -> Optional[float]:
+        """EWMA latency in seconds, or None before the first success"""
+        entry = self._stats.get(model_id)
+        return entry[0] if entry else None
+
+    def error_rate(self, model_id: str) -> float:
+        """EWMA error rate (0-1); 0 for unseen models"""
+        entry = self._stats.get(model_id)
+        return entry[1] if entry else 0.0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-model EWMA summary for /stats"""
+        return {
+            model_id: {
+                "ewma_latency_ms": round(latency * 1000, 1) if latency is not None else None,
+                "error_rate": round(error_rate, 4),
+                "calls": calls,
+            }
+            for model_id, (latency, error_rate, calls) in self._stats.items()
+        }
+
+
+class SharedLatencyTracker(LatencyTracker):
+    """LatencyTracker whose sample windows live in the multi-worker shared segment"""
+
+    def __init__(self, segment: SharedSegment):
+        super().__init__(segment.window)
+        self.segment = segment
+
+    def record(self, model_id: str, seconds: float) -> None:
+        offset = self.segment.slot(model_id)
+        if offset is not None:
+            self.segment.add_sample(offset, seconds)
+
+    def _window(self, model_id: str) -> Optional[Sequence[float]]:
+        offset = self.segment.slot(model_id)
+        return self.segment.samples(offset) if offset is not None else None
+
+    def _model_ids(self):
+        return self.segment.model_ids()
+
+
+class SharedModelHealth(ModelHealth):
+    """ModelHealth whose EWMA entries live in the multi-worker shared segment"""
+
+    def __init__(self, segment: SharedSegment, alpha: float = MODEL_STATS_EWMA_ALPHA):
+        super().__init__(alpha)
+        self.segment = segment
+
+    def _record(self, model_id: str, seconds: Optional[float]) -> None:
+        segment = self.segment
+        offset = segment.slot(model_id)
+        if offset is None:
+            return
+        with segment.lock():
+            if seconds is not None:
+                latency = segment.read(offset, "ewma_latency")
+                segment.write(
+                    offset, "ewma_latency",
+                    seconds if math.isnan(latency) else latency + self.alpha * (seconds - latency)
+                )
+            error_rate = segment.read(offset, "error_rate")
+            failed = 1.0 if seconds is None else 0.0
+            segment.write(offset, "error_rate", error_rate + self.alpha * (failed - error_rate))
+            segment.write(offset, "calls", segment.read(offset, "calls") + 1)
+
+    def record_success(self, model_id: str, seconds: float) -> None:
+        self._record(model_id, seconds)
+
+    def record_failure(self, model_id: str) -> None:
+        self._record(model_id, None)
+
+    def _entry(self, model_id: str) -> list:
+        offset = self.segment.slot(model_id)
+        if offset is None:
+            return [None, 0.0, 0]
+        latency = self.segment.read(offset, "ewma_latency")
+        return [
+            None if math.isnan(latency) else latency,
+            self.segment.read(offset, "error_rate"),
+            int(self.segment.read(offset, "calls")),
+        ]
+
+    def latency(self, model_id: str) -> Optional[float]:
+        return self._entry(model_id)[0]
+
+    def error_rate(self, model_id: str) -> float:
+        return self._entry(model_id)[1]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        self._stats = {model_id: self._entry(model_id) for model_id in self.segment.model_ids()}
+        return super().snapshot()
+
+
+class HedgeBudget:
+    """
+    Token-bucket budget for hedged requests
+
+    Every primary request earns `ratio` credits (up to `burst`) and every
+    hedge spends one, so hedges stay at roughly `ratio` of traffic.
+    """
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._credits = burst
+        self.requests = 0
+        self.hedges = 0
+        self.denied = 0
+
+    def on_request(self) -> None:
+        """Credit the budget for one primary request"""
+        self.requests += 1
+        self._credits = min(self.burst, self._credits + self.ratio)
+
+    def try_acquire(self) -> bool:
+        """Spend one credit on a hedge if available"""
+        if self._credits >= 1.0:
+            self._credits -= 1.0
+            self.hedges += 1
+            return True
+        self.denied += 1
+        return False
+
+    def stats(self) -> Dict:
+        """Hedge counters for /stats"""
+        return {
+            "enabled": HEDGE_ENABLED,
+            "percentile": HEDGE_PERCENTILE,
+            "budget_ratio": self.ratio,
+            "credits": round(self._credits, 3),
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "denied": self.denied,
+        }
+
+
+# Worker-wide instances (shared across processes in multi-worker mode)
+if shared_segment is not None:
+    latency_tracker: LatencyTracker = SharedLatencyTracker(shared_segment)
+    model_health: ModelHealth = SharedModelHealth(shared_segment)
+else:
+    latency_tracker = LatencyTracker()
+    model_health = ModelHealth()
+hedge_budget = HedgeBudget()
@@ -0,0 +1,412 @@
+"""
+Rate Limiter
+Client-side token-bucket scheduling of OpenRouter calls with fair queueing
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from typing import Deque, Dict, Iterator, Optional
+
+from .metrics import pipeline_metrics
+from .shared_state import SharedSegment, shared_segment
+
+# Limits (0 disables a limit; override via environment)
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_TOKENS_PER_MIN = float(os.getenv("RATE_LIMIT_TOKENS_PER_MIN", "0"))
+RATE_LIMIT_MODEL_RPS = float(os.getenv("RATE_LIMIT_MODEL_RPS", "0"))
+RATE_LIMIT_MODEL_TOKENS_PER_MIN = float(os.getenv("RATE_LIMIT_MODEL_TOKENS_PER_MIN", "0"))
+# Burst size for request buckets, in seconds of traffic
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "1"))
+# Completion tokens assumed for calls that leave max_tokens unset (the model's own default applies upstream)
+RATE_LIMIT_DEFAULT_MAX_TOKENS = int(os.getenv("RATE_LIMIT_DEFAULT_MAX_TOKENS", "2000"))
+
+# 429 handling
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "0.5"))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "30"))
+
+
+def completion_budget(max_tokens: Optional[int]) -> int:
+    """Completion tokens to budget for a call; an unset max_tokens counts as RATE_LIMIT_DEFAULT_MAX_TOKENS"""
+    return RATE_LIMIT_DEFAULT_MAX_TOKENS if max_tokens is None else max_tokens
+
+
+def estimate_tokens(prompt: str, max_tokens: Optional[int]) -> int:
+    """Upper-bound token estimate for a call (~4 characters per prompt token)"""
+    return len(prompt) // 4 + completion_budget(max_tokens)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (oversized amounts wait for a full bucket)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose level lives in the multi-worker shared segment, so
+    all workers draw on one budget
+
+    `offset` selects a model slot; without it the bucket uses the
+    segment-wide `<prefix>_tokens` / `<prefix>_updated` header fields.
+    Callers hold the segment lock around check-and-consume.
+    """
+
+    def __init__(self, rate: float, capacity: float, segment: SharedSegment, prefix: str, offset: Optional[int] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.segment = segment
+        self._offset = offset
+        self._tokens_field = f"{prefix}_tokens"
+        self._updated_field = f"{prefix}_updated"
+        with segment.lock():
+            # The first worker to use the bucket fills it
+            if not self._read(self._updated_field):
+                self.tokens = capacity
+                self.updated = time.monotonic()
+
+    def _read(self, field: str) -> float:
+        if self._offset is None:
+            return self.segment.get(field)
+        return self.segment.read(self._offset, field)
+
+    def _write(self, field: str, value: float) -> None:
+        if self._offset is None:
+            self.segment.set(field, value)
+        else:
+            self.segment.write(self._offset, field, value)
+
+    @property
+    def tokens(self) -> float:
+        return self._read(self._tokens_field)
+
+    @tokens.setter
+    def tokens(self, value: float) -> None:
+        self._write(self._tokens_field, value)
+
+    @property
+    def updated(self) -> float:
+        return self._read(self._updated_field)
+
+    @updated.setter
+    def updated(self, value: float) -> None:
+        self._write(self._updated_field, value)
+
+
+class SharedBlocks:
+    """Dict-like view of per-model Retry-After blocks in the shared segment"""
+
+    def __init__(self, segment: SharedSegment):
+        self.segment = segment
+
+    def __bool__(self) -> bool:
+        return self.segment.get("latest_block") > time.monotonic()
+
+    def __iter__(self) -> Iterator[str]:
+        now = time.monotonic()
+        for model_id in self.segment.model_ids():
+            if self.get(model_id, 0.0) > now:
+                yield model_id
+
+    def get(self, model_id: str, default: Optional[float] = None) -> Optional[float]:
+        offset = self.segment.slot(model_id)
+        until = self.segment.read(offset, "blocked_until") if offset is not None else 0.0
+        return until if until > 0 else default
+
+    def __setitem__(self, model_id: str, until: float) -> None:
+        offset = self.segment.slot(model_id)
+        if offset is None:
+            return
+        with self.segment.lock():
+            self.segment.write(offset, "blocked_until", until)
+            if until > self.segment.get("latest_block"):
+                self.segment.set("latest_block", until)
+
+    def __delitem__(self, model_id: str) -> None:
+        offset = self.segment.slot(model_id)
+        if offset is not None:
+            self.segment.write(offset, "blocked_until", 0.0)
+
+
+class _Waiter:
+    __slots__ = ("model_id", "tokens", "future", "enqueued_at")
+
+    def __init__(self, model_id: str, tokens: int, future: asyncio.Future):
+        self.model_id = model_id
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class RateLimiter:
+    """
+    Global and per-model request/sec and tokens/min limits
+
+    Calls that cannot start immediately wait in a per-client queue. A
+    dispatcher grants them round-robin across clients, taking the first
+    client whose head call fits the buckets, so one client's burst (or
+    one throttled model) cannot starve the others. Upstream Retry-After
+    values block the affected model for everyone.
+    """
+
+    def __init__(
+        self,
+        rps: float = RATE_LIMIT_RPS,
+        tokens_per_min: float = RATE_LIMIT_TOKENS_PER_MIN,
+        model_rps: float = RATE_LIMIT_MODEL_RPS,
+        model_tokens_per_min: float = RATE_LIMIT_MODEL_TOKENS_PER_MIN,
+        segment: Optional[SharedSegment] = shared_segment,
+    ):
+        self.rps = rps
+        self.tokens_per_min = tokens_per_min
+        self.model_rps = model_rps
+        self.model_tokens_per_min = model_tokens_per_min
+        self.enabled = any(limit > 0 for limit in (rps, tokens_per_min, model_rps, model_tokens_per_min))
+        # In multi-worker mode buckets and Retry-After blocks are shared by every worker
+        self.segment = segment
+        self._shared_lock = segment.lock if segment is not None else nullcontext
+
+        self.global_requests = self._bucket(rps, max(rps * RATE_LIMIT_BURST_SECONDS, 1), "global_requests")
+        self.global_tokens = self._bucket(tokens_per_min / 60, tokens_per_min, "global_tokens")
+        self._model_requests: Dict[str, TokenBucket] = {}
+        self._model_tokens: Dict[str, TokenBucket] = {}
+        self._blocked_until = SharedBlocks(segment) if segment is not None else {}
+
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._waiting = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.granted = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+
+    def _bucket(
+        self, per_second: float, capacity: float, prefix: str, model_id: Optional[str] = None
+    ) -> Optional[TokenBucket]:
+        if per_second <= 0:
+            return None
+        if self.segment is None:
+            return TokenBucket(per_second, capacity)
+        offset = self.segment.slot(model_id) if model_id is not None else None
+        if model_id is not None and offset is None:
+            # Shared segment full: fall back to a per-worker bucket
+            return TokenBucket(per_second, capacity)
+        return SharedTokenBucket(per_second, capacity, self.segment, prefix, offset)
+
+    def _buckets(self, model_id: str):
+        if self.model_rps > 0 and model_id not in self._model_requests:
+            self._model_requests[model_id] = self._bucket(
+                self.model_rps, max(self.model_rps * RATE_LIMIT_BURST_SECONDS, 1), "requests", model_id
+            )
+        if self.model_tokens_per_min > 0 and model_id not in self._model_tokens:
+            self._model_tokens[model_id] = self._bucket(
+                self.model_tokens_per_min / 60, self.model_tokens_per_min, "tokens", model_id
+            )
+        return (
+            (self.global_requests, 1),
+            (self._model_requests.get(model_id), 1),
+            (self.global_tokens, None),
+            (self._model_tokens.get(model_id), None),
+        )
+
+    def _wait_for(self, model_id: str, tokens: int, now: float) -> float:
+        wait = 0.0
+        blocked_until = self._blocked_until.get(model_id)
+        if blocked_until is not None:
+            if blocked_until > now:
+                wait = blocked_until - now
+            else:
+                del self._blocked_until[model_id]
+        for bucket, amount in self._buckets(model_id):
+            if bucket is not None:
+                wait = max(wait, bucket.wait_time(tokens if amount is None else amount, now))
+        return wait
+
+    def _consume(self, model_id: str, tokens: int) -> None:
+        for bucket, amount in self._buckets(model_id):
+            if bucket is not None:
+                bucket.consume(tokens if amount is None else amount)
+
+    async def acquire(self, model_id: str, tokens: int, client: str) -> None:
+        """Wait until a call to `model_id` estimated at `tokens` may start"""
+        if not self.enabled and not self._blocked_until:
+            return
+        if not self._waiting:
+            with self._shared_lock():
+                ready = self._wait_for(model_id, tokens, time.monotonic()) <= 0
+                if ready:
+                    self._consume(model_id, tokens)
+            if ready:
+                self.granted += 1
+                return
+
+        self._ensure_dispatcher()
+        waiter = _Waiter(model_id, tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(client, deque()).append(waiter)
+        self._waiting += 1
+        self.queued += 1
+        pipeline_metrics.record_rate_limit_queue(self._waiting)
+        self._wakeup.set()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not waiter.future.done():
+                waiter.future.cancel()
+            raise
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done() \
+                or self._dispatcher.get_loop() is not asyncio.get_running_loop():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            next_wait = RATE_LIMIT_BACKOFF_MAX
+            granted_client = None
+            for client, queue in list(self._queues.items()):
+                # Drop waiters whose callers went away
+                while queue and queue[0].future.done():
+                    queue.popleft()
+                    self._waiting -= 1
+                    pipeline_metrics.record_rate_limit_queue(self._waiting)
+                if not queue:
+                    del self._queues[client]
+                    continue
+                waiter = queue[0]
+                with self._shared_lock():
+                    wait = self._wait_for(waiter.model_id, waiter.tokens, now)
+                    if wait <= 0:
+                        self._consume(waiter.model_id, waiter.tokens)
+                if wait > 0:
+                    next_wait = min(next_wait, wait)
+                    continue
+                queue.popleft()
+                self._waiting -= 1
+                waited = now - waiter.enqueued_at
+                self.granted += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                pipeline_metrics.record_rate_limit_queue(self._waiting)
+                pipeline_metrics.observe_rate_limit_wait(waited)
+                waiter.future.set_result(None)
+                granted_client = client
+                break
+
+            if granted_client is not None:
+                # Round-robin: the served client goes to the back of the line
+                if self._queues[granted_client]:
+                    self._queues.move_to_end(granted_client)
+                else:
+                    del self._queues[granted_client]
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def settle(self, model_id: str, estimated: int, actual: int) -> None:
+        """Refund the unused part of a call's token estimate"""
+        unused = estimated - actual
+        if unused <= 0:
+            return
+        with self._shared_lock():
+            for bucket in (self.global_tokens, self._model_tokens.get(model_id)):
+                if bucket is not None:
+                    bucket.refund(unused)
+
+    def on_rate_limited(self, model_id: str, retry_after: Optional[str], attempt: int) -> float:
+        """
+        Record an upstream 429 and return how long to back off before retrying
+
+        A Retry-After header (seconds) blocks the model for every caller;
+        otherwise exponential backoff with full jitter is used.
+        """
+        self.retries += 1
+        delay = None
+        if retry_after:
+            try:
+                delay = min(float(retry_after), RATE_LIMIT_BACKOFF_MAX)
+            except ValueError:
+                delay = None
+        if delay is not None:
+            self._blocked_until[model_id] = max(
+                self._blocked_until.get(model_id, 0.0), time.monotonic() + delay
+            )
+            return delay
+        return random.uniform(0, min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt))
+
+    async def close(self) -> None:
+        """Stop the dispatcher and fail any queued calls"""
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._dispatcher.cancel()
+        self._dispatcher = None
+        for queue in self._queues.values():
+            for waiter in queue:
+                if not waiter.future.done():
+                    waiter.future.cancel()
+        self._queues.clear()
+        self._waiting = 0
+        pipeline_metrics.record_rate_limit_queue(0)
+
+    def stats(self) -> Dict:
+        """Queue depth, wait time and 429 retry counters for /stats"""
+        return {
+            "enabled": self.enabled,
+            "limits": {
+                "rps": self.rps,
+                "tokens_per_min": self.tokens_per_min,
+                "model_rps": self.model_rps,
+                "model_tokens_per_min": self.model_tokens_per_min,
+            },
+            "shared": self.segment is not None,
+            "blocked_models": sorted(self._blocked_until),
+            "queue_depth": self._waiting,
+            "queued_clients": len(self._queues),
+            "granted": self.granted,
+            "queued": self.queued,
+            "avg_wait_ms": round(self.total_wait / self.queued * 1000, 1) if self.queued else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "retries": self.retries,
+        }
+
+
+# Worker-wide instance
+rate_limiter = RateLimiter()
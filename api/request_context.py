@@ -0,0 +1,115 @@
+"""
+Request Context
+Per-request values that follow the fan-out tasks via contextvars
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+# Identity used for fair queueing and accounting (API key or client address)
+current_client: ContextVar[str] = ContextVar("current_client", default="anonymous")
+
+# Absolute time.monotonic() deadline for the current request, if any
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# Header carrying the client's time budget in milliseconds
+DEADLINE_HEADER = b"x-deadline-ms"
+
+
+def client_id_from_scope(scope: dict) -> str:
+    """Identify the caller by X-API-Key, falling back to the client address"""
+    for name, value in scope.get("headers", ()):
+        if name == b"x-api-key" and value:
+            return value.decode("latin-1")
+    client = scope.get("client")
+    if client:
+        return client[0]
+    return "anonymous"
+
+
+def tighten_deadline(deadline_ms: Optional[float]) -> None:
+    """Shorten the current request deadline to `deadline_ms` from now (never extends it)"""
+    if deadline_ms is None:
+        return
+    deadline = time.monotonic() + deadline_ms / 1000
+    current = request_deadline.get()
+    if current is None or deadline < current:
+        request_deadline.set(deadline)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left before the request deadline (never negative), or None without one"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def remaining_ms() -> Optional[int]:
+    """remaining_seconds() in whole milliseconds"""
+    remaining = remaining_seconds()
+    return None if remaining is None else int(remaining * 1000)
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable):
+    """
+    Await `work`, cancelling it if the client disconnects first
+
+    Must be called after the request body has been read, so the only
+    message left to receive is http.disconnect.
+    """
+    work = asyncio.ensure_future(work)
+
+    async def wait_for_disconnect() -> None:
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.create_task(wait_for_disconnect())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if work.done():
+            return work.result()
+        raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        for task in (work, watcher):
+            if not task.done():
+                task.cancel()
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware that binds current_client and the X-Deadline-Ms
+    deadline for each HTTP request
+
+    Tasks created while handling the request (model fan-out, streaming
+    generators) copy the context, so they see the same values.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            current_client.set(client_id_from_scope(scope))
+            request_deadline.set(None)
+            for name, value in scope.get("headers", ()):
+                if name != DEADLINE_HEADER:
+                    continue
+                try:
+                    deadline_ms = float(value)
+                except ValueError:
+                    deadline_ms = 0
+                if not deadline_ms > 0:
+                    response = JSONResponse(
+                        {"detail": "X-Deadline-Ms must be a positive number of milliseconds"},
+                        status_code=400
+                    )
+                    await response(scope, receive, send)
+                    return
+                tighten_deadline(deadline_ms)
+        await self.app(scope, receive, send)
@@ -0,0 +1,193 @@
+"""
+Response Cache
+Exact-match cache of model responses keyed on (model, prompt, max_tokens, temperature)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Cache configuration (override via environment)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+# Optional on-disk tier that survives restarts; empty disables it
+RESPONSE_CACHE_SQLITE_PATH = os.getenv("RESPONSE_CACHE_SQLITE_PATH", "")
+RESPONSE_CACHE_DISK_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+# Fields of a model result that are stored in the cache
+CACHED_FIELDS = ("model", "response", "tokens")
+
+
+def make_cache_key(model_id: str, prompt: str, max_tokens: int, temperature: float) -> str:
+    """Stable hash of the parameters that determine a model response"""
+    raw = json.dumps([model_id, prompt, max_tokens, temperature], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SQLiteTier:
+    """Blocking SQLite store; call through asyncio.to_thread"""
+
+    def __init__(self, path: str, max_entries: int = RESPONSE_CACHE_DISK_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Tuple[Dict, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Dict, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._writes += 1
+            # Prune periodically rather than on every write
+            if self._writes % 100 == 0:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self) -> None:
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._conn.execute(
+            "DELETE FROM responses WHERE rowid IN ("
+            " SELECT rowid FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Two-tier exact-match cache for successful model results
+
+    The in-process tier is an LRU bounded by entry count, total bytes and
+    TTL. The optional SQLite tier is consulted on memory misses and
+    promotes hits back into memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        sqlite_path: str = RESPONSE_CACHE_SQLITE_PATH,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        # key -> (value, size_bytes, expires_at wall-clock)
+        self._entries: "OrderedDict[str, Tuple[Dict, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._disk: Optional[SQLiteTier] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_tier(self) -> Optional[SQLiteTier]:
+        if self._disk is None and self.sqlite_path:
+            self._disk = SQLiteTier(self.sqlite_path)
+        return self._disk
+
+    def _store(self, key: str, value: Dict, expires_at: float) -> None:
+        size = len(value["response"].encode("utf-8")) + len(key) + 64
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Look up a cached result; returns a fresh copy or None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, size, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(value)
+            del self._entries[key]
+            self._bytes -= size
+
+        disk = self._disk_tier()
+        if disk is not None:
+            found = await asyncio.to_thread(disk.get, key)
+            if found is not None:
+                value, expires_at = found
+                self._store(key, value, expires_at)
+                self.hits += 1
+                self.disk_hits += 1
+                return dict(value)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, result: Dict) -> None:
+        """Cache a successful model result"""
+        value = {field: result[field] for field in CACHED_FIELDS}
+        expires_at = time.time() + self.ttl_seconds
+        self._store(key, value, expires_at)
+        disk = self._disk_tier()
+        if disk is not None:
+            await asyncio.to_thread(disk.set, key, value, expires_at)
+
+    def close(self) -> None:
+        """Close the on-disk tier, if open"""
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def stats(self) -> Dict:
+        """Cache counters for /stats"""
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_tier": bool(self.sqlite_path),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Worker-wide instance
+response_cache = ResponseCache()
@@ -3,14 +3,130 @@ Response Compiler
 Compiles multiple model responses into unified markdown document
 """
 
-from typing import List, Dict, Optional
+import asyncio
+from typing import Awaitable, Callable, List, Dict, Optional
 from datetime import datetime
 
+from .model_router import get_model_prices
+
+class DocumentBuilder:
+    """
+    Incremental builder for the unified markdown document
+    
+    Each model's section is rendered as its result lands, so a caller can
+    write sections straight into a streaming response body instead of
+    holding the whole document. Successful sections are numbered in the
+    order they are added; failures are listed together at the end.
+    """
+    
+    def __init__(self, prompt: str, task_type: str, models_queried: int):
+        self.prompt = prompt
+        self.task_type = task_type
+        self.models_queried = models_queried
+        self.results: List[Dict] = []
+        self.successful: List[Dict] = []
+        self.failed: List[Dict] = []
+        # Billed calls made while compiling (e.g. model-based synthesis)
+        self.overhead: List[Dict] = []
+        self._count_in_header = False
+    
+    def header(self, successful: Optional[int] = None) -> str:
+        """
+        Render the document header
+        
+        Pass `successful` when every result is already known; otherwise
+        the count is reported in the cost summary instead.
+        """
+        parts = []
+        parts.append(f"# Multi-Model Response\n")
+        parts.append(f"**Prompt:** {self.prompt}\n")
+        parts.append(f"**Task Type:** {self.task_type}\n")
+        parts.append(f"**Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        parts.append(f"**Models Queried:** {self.models_queried}\n")
+        if successful is not None:
+            parts.append(f"**Successful:** {successful}\n")
+            self._count_in_header = True
+        parts.append(f"\n---\n\n")
+        return "".join(parts)
+    
+    def add_result(self, result: Dict) -> str:
+        """Record one model result and render its section (empty for failures)"""
+        self.results.append(result)
+        if not result["success"]:
+            self.failed.append(result)
+            return ""
+        self.successful.append(result)
+        model_name = result["model"].split("/")[-1].replace("-", " ").title()
+        parts = []
+        parts.append(f"## Response {len(self.successful)}: {model_name}\n\n")
+        parts.append(f"**Model ID:** `{result['model']}`\n")
+        parts.append(f"**Tokens Used:** {result['tokens']}\n\n")
+        parts.append(f"{result['response']}\n\n")
+        parts.append(f"---\n\n")
+        return "".join(parts)
+    
+    def footer(self, synthesis: Optional[str] = None) -> str:
+        """Render the failed list, optional synthesis and the cost summary"""
+        parts = []
+        
+        # Failed responses (if any)
+        if self.failed:
+            parts.append(f"## ⚠️ Failed Responses\n\n")
+            for result in self.failed:
+                parts.append(f"- **{result['model']}:** {result['response']}\n")
+            parts.append(f"\n---\n\n")
+        
+        # Synthesis (optional)
+        if synthesis is not None:
+            parts.append(f"## 📊 Synthesis\n\n")
+            parts.append(f"{synthesis}\n\n")
+            parts.append(f"---\n\n")
+        
+        # Cost summary
+        total_tokens = sum(r["tokens"] for r in self.results + self.overhead)
+        reused_tokens = sum(r["tokens"] for r in self.results + self.overhead if is_reused(r))
+        
+        parts.append(f"## 💰 Cost Summary\n\n")
+        if not self._count_in_header:
+            parts.append(f"**Successful:** {len(self.successful)}\n")
+        parts.append(f"**Total Tokens:** {total_tokens:,}\n")
+        if reused_tokens:
+            parts.append(f"**Reused Tokens:** {reused_tokens:,} (cached or shared, not billed)\n")
+        parts.append(f"**Estimated Cost:** ${self.estimated_cost():.4f}\n")
+        return "".join(parts)
+    
+    def synthesis(self, include_synthesis: bool = True) -> Optional[str]:
+        """Synthesis over the successful results, when there are at least two"""
+        if include_synthesis and len(self.successful) >= 2:
+            return generate_synthesis(self.prompt, self.successful)
+        return None
+    
+    def resolve_synthesis(self, synthesis_call: Optional[Dict], include_synthesis: bool = True) -> Optional[str]:
+        """
+        Pick the synthesis text, counting the synthesis call's cost
+        
+        Uses the model's answer when the call succeeded, otherwise the
+        rule-based synthesis.
+        """
+        if synthesis_call is not None:
+            self.add_overhead(synthesis_call)
+            if synthesis_call["success"]:
+                return synthesis_call["response"]
+        return self.synthesis(include_synthesis)
+    
+    def add_overhead(self, result: Dict) -> None:
+        """Count a compile-time call (such as synthesis) in tokens and cost"""
+        self.overhead.append(result)
+    
+    def estimated_cost(self) -> float:
+        return calculate_cost(self.results + self.overhead)
+
 def compile_responses(
     prompt: str,
     task_type: str,
     results: List[Dict],
-    include_synthesis: bool = True
+    include_synthesis: bool = True,
+    include_document: bool = True
 ) -> Dict:
     """
     Compile multiple model responses into unified document
@@ -20,73 +136,87 @@ def compile_responses(
         task_type: Detected task type
         results: List of model response dicts
         include_synthesis: Whether to generate synthesis
+        include_document: Whether to render the markdown document
     
     Returns:
-        Dict with 'document', 'synthesis', 'estimated_cost'
+        Dict with 'document' (None when not rendered), 'synthesis', 'estimated_cost'
     """
-    # Filter successful responses
+    builder = DocumentBuilder(prompt, task_type, len(results))
+    doc_parts = []
+    if include_document:
+        doc_parts.append(builder.header(successful=sum(1 for r in results if r["success"])))
+    for result in results:
+        section = builder.add_result(result)
+        if include_document:
+            doc_parts.append(section)
+    
+    synthesis = builder.synthesis(include_synthesis)
+    if include_document:
+        doc_parts.append(builder.footer(synthesis))
+    
+    return {
+        "document": "".join(doc_parts) if include_document else None,
+        "synthesis": synthesis,
+        "estimated_cost": builder.estimated_cost()
+    }
+
+async def compile_responses_async(
+    prompt: str,
+    task_type: str,
+    results: List[Dict],
+    include_synthesis: bool = True,
+    include_document: bool = True,
+    synthesizer: Optional[Callable[[str, List[Dict]], Awaitable[Optional[Dict]]]] = None
+) -> Dict:
+    """
+    Compile responses with model-based synthesis
+    
+    `synthesizer(prompt, successful_results)` is started first and runs
+    while the document body is assembled. It returns the synthesis call's
+    result dict, or None when skipped; on a skip or failure the
+    rule-based synthesis is used instead.
+    
+    Returns:
+        compile_responses' dict plus 'synthesis_call' (result dict or None)
+    """
+    builder = DocumentBuilder(prompt, task_type, len(results))
     successful = [r for r in results if r["success"]]
-    failed = [r for r in results if not r["success"]]
+    pending = None
+    if include_synthesis and synthesizer is not None and len(successful) >= 2:
+        pending = asyncio.create_task(synthesizer(prompt, successful))
+        # Let the synthesis call get going before assembling the document
+        await asyncio.sleep(0)
     
-    # Build markdown document
     doc_parts = []
+    try:
+        if include_document:
+            doc_parts.append(builder.header(successful=len(successful)))
+        for result in results:
+            section = builder.add_result(result)
+            if include_document:
+                doc_parts.append(section)
+        synthesis_call = await pending if pending is not None else None
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
     
-    # Header
-    doc_parts.append(f"# Multi-Model Response\n")
-    doc_parts.append(f"**Prompt:** {prompt}\n")
-    doc_parts.append(f"**Task Type:** {task_type}\n")
-    doc_parts.append(f"**Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-    doc_parts.append(f"**Models Queried:** {len(results)}\n")
-    doc_parts.append(f"**Successful:** {len(successful)}\n")
-    doc_parts.append(f"\n---\n\n")
-    
-    # Individual responses
-    for i, result in enumerate(successful, 1):
-        model_name = result["model"].split("/")[-1].replace("-", " ").title()
-        doc_parts.append(f"## Response {i}: {model_name}\n\n")
-        doc_parts.append(f"**Model ID:** `{result['model']}`\n")
-        doc_parts.append(f"**Tokens Used:** {result['tokens']}\n\n")
-        doc_parts.append(f"{result['response']}\n\n")
-        doc_parts.append(f"---\n\n")
-    
-    # Failed responses (if any)
-    if failed:
-        doc_parts.append(f"## ⚠️ Failed Responses\n\n")
-        for result in failed:
-            doc_parts.append(f"- **{result['model']}:** {result['response']}\n")
-        doc_parts.append(f"\n---\n\n")
-    
-    # Synthesis (optional)
-    synthesis = None
-    if include_synthesis and len(successful) >= 2:
-        synthesis = generate_synthesis(prompt, successful)
-        doc_parts.append(f"## 📊 Synthesis\n\n")
-        doc_parts.append(f"{synthesis}\n\n")
-        doc_parts.append(f"---\n\n")
-    
-    # Cost summary
-    total_tokens = sum(r["tokens"] for r in results)
-    estimated_cost = calculate_cost(results)
-    
-    doc_parts.append(f"## 💰 Cost Summary\n\n")
-    doc_parts.append(f"**Total Tokens:** {total_tokens:,}\n")
-    doc_parts.append(f"**Estimated Cost:** ${estimated_cost:.4f}\n")
-    
-    # Combine all parts
-    document = "".join(doc_parts)
+    synthesis = builder.resolve_synthesis(synthesis_call, include_synthesis)
+    if include_document:
+        doc_parts.append(builder.footer(synthesis))
     
     return {
-        "document": document,
+        "document": "".join(doc_parts) if include_document else None,
         "synthesis": synthesis,
-        "estimated_cost": estimated_cost
+        "estimated_cost": builder.estimated_cost(),
+        "synthesis_call": synthesis_call
     }
 
 def generate_synthesis(prompt: str, results: List[Dict]) -> str:
     """
     Generate synthesis comparing all responses
     
-    This is a simple rule-based synthesis. For better results,
-    you could send all responses to a synthesis model.
+    This is the rule-based synthesis, used when no synthesis model is
+    configured or the model-based stage is skipped.
     """
     synthesis_parts = []
     
@@ -119,14 +249,40 @@ def generate_synthesis(prompt: str, results: List[Dict]) -> str:
     
     return "".join(synthesis_parts)
 
+def is_reused(result: Dict) -> bool:
+    """Whether a result was served without a billed upstream call"""
+    return bool(result.get("cached") or result.get("coalesced"))
+
+def call_cost(result: Dict) -> float:
+    """
+    USD cost of one model call from its usage and the registry prices
+    
+    Uses the prompt/completion split OpenRouter reports in `usage`; a
+    result without the split is billed at the mean of the two prices.
+    A hedged call also pays for its discarded attempt (`hedge_usage`).
+    Reused results cost nothing.
+    """
+    if is_reused(result) or not result["tokens"]:
+        return 0.0
+    cost = _usage_cost(result["model"], result)
+    if "hedge_usage" in result:
+        cost += _usage_cost(result["model"], result["hedge_usage"])
+    return cost
+
+def _usage_cost(model_id: str, result: Dict) -> float:
+    prompt_price, completion_price = get_model_prices(model_id)
+    prompt_tokens = result.get("prompt_tokens")
+    completion_tokens = result.get("completion_tokens")
+    if prompt_tokens is None or completion_tokens is None:
+        return result["tokens"] * (prompt_price + completion_price) / 2 / 1_000_000
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
 def calculate_cost(results: List[Dict]) -> float:
     """
-    Calculate estimated cost based on tokens used
+    Calculate the cost of a fan-out from each model's usage and price
     
-    This is a rough estimate. Actual costs vary by model.
-    Average cost: ~$3/M tokens
+    Responses served from the cache or shared with another in-flight
+    request are free.
     """
-    total_tokens = sum(r["tokens"] for r in results)
-    # Rough average: $3 per million tokens
-    cost_per_token = 3.0 / 1_000_000
-    return total_tokens * cost_per_token
+    # Start from 0.0 so an empty fan-out is still a float (the fast JSON path does not coerce it)
+    return sum((call_cost(r) for r in results), 0.0)
@@ -0,0 +1,164 @@
+"""
+Semantic Cache
+Serves compiled results for near-duplicate prompts using hashed n-gram embeddings
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from .text_features import HashedNgramVectorizer
+
+# Semantic cache configuration (override via environment)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "1000"))
+# Partitions kept at once; the least recently used one is dropped whole beyond this
+SEMANTIC_CACHE_MAX_PARTITIONS = int(os.getenv("SEMANTIC_CACHE_MAX_PARTITIONS", "32"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "4096"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+
+
+class _Partition:
+    """Vector index for one partition key, grown on demand up to `capacity` entries"""
+
+    INITIAL_ROWS = 16
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        rows = min(capacity, self.INITIAL_ROWS)
+        self.vectors = np.zeros((rows, dim), dtype=np.float32)
+        self.payloads: List[Optional[Dict]] = []
+        self.prompts: List[str] = []
+        self.expires_at = np.zeros(rows, dtype=np.float64)
+        self.last_used = np.zeros(rows, dtype=np.float64)
+        self.size = 0
+
+    def _grow(self) -> None:
+        extra = min(self.capacity, len(self.vectors) * 2) - len(self.vectors)
+        self.vectors = np.vstack([self.vectors, np.zeros((extra, self.vectors.shape[1]), dtype=np.float32)])
+        self.expires_at = np.concatenate([self.expires_at, np.zeros(extra)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(extra)])
+
+    def search(self, vec: "np.ndarray", now: float) -> Tuple[int, float]:
+        if self.size == 0:
+            return -1, 0.0
+        scores = self.vectors[:self.size] @ vec
+        # Expired slots can never match
+        scores[self.expires_at[:self.size] <= now] = -1.0
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+    def slot_for_insert(self) -> int:
+        if self.size < self.capacity:
+            if self.size == len(self.vectors):
+                self._grow()
+            self.payloads.append(None)
+            self.prompts.append("")
+            self.size += 1
+            return self.size - 1
+        # Full: evict the least recently used slot
+        return int(np.argmin(self.last_used))
+
+
+class SemanticCache:
+    """
+    Similarity-thresholded cache of compiled /query results
+
+    Partitioned by a caller-supplied key (in /query: the selected model
+    ids plus the generation and response parameters) so a hit never
+    crosses model sets or generation settings. Each partition holds at
+    most `capacity` entries with LRU eviction, and at most
+    `max_partitions` partitions are kept, the least recently used being
+    dropped whole, so client-chosen parameters cannot grow memory
+    without bound.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = SEMANTIC_CACHE_ENABLED,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        capacity: int = SEMANTIC_CACHE_CAPACITY,
+        dim: int = SEMANTIC_CACHE_DIM,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS,
+        max_partitions: int = SEMANTIC_CACHE_MAX_PARTITIONS,
+    ):
+        self.available = np is not None
+        self.enabled = enabled and self.available
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.max_partitions = max_partitions
+        self.vectorizer = HashedNgramVectorizer(dim) if self.available else None
+        self._partitions: "OrderedDict[Tuple, _Partition]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.partitions_evicted = 0
+
+    def lookup(self, partition_key: Tuple, prompt: str) -> Optional[Tuple[Dict, str, float]]:
+        """
+        Find a cached result for a similar prompt
+
+        Returns:
+            (payload, cached_prompt, similarity) or None
+        """
+        partition = self._partitions.get(partition_key)
+        if partition is None:
+            self.misses += 1
+            return None
+        self._partitions.move_to_end(partition_key)
+        now = time.time()
+        index, score = partition.search(self.vectorizer.transform(prompt), now)
+        if index < 0 or score < self.threshold:
+            self.misses += 1
+            return None
+        partition.last_used[index] = now
+        self.hits += 1
+        return dict(partition.payloads[index]), partition.prompts[index], score
+
+    def store(self, partition_key: Tuple, prompt: str, payload: Dict) -> None:
+        """Add a compiled result, evicting the least recently used entry if full"""
+        partition = self._partitions.get(partition_key)
+        if partition is None:
+            if len(self._partitions) >= self.max_partitions:
+                self._partitions.popitem(last=False)
+                self.partitions_evicted += 1
+            partition = self._partitions[partition_key] = _Partition(
+                self.capacity, self.vectorizer.dim
+            )
+        self._partitions.move_to_end(partition_key)
+        vec = self.vectorizer.transform(prompt)
+        now = time.time()
+        index, score = partition.search(vec, now)
+        if index < 0 or score < 0.999:
+            index = partition.slot_for_insert()
+        partition.vectors[index] = vec
+        partition.payloads[index] = payload
+        partition.prompts[index] = prompt
+        partition.expires_at[index] = now + self.ttl_seconds
+        partition.last_used[index] = now
+
+    def stats(self) -> Dict:
+        """Semantic cache counters for /stats"""
+        return {
+            "enabled": self.enabled,
+            "available": self.available,
+            "threshold": self.threshold,
+            "capacity_per_partition": self.capacity,
+            "partitions": len(self._partitions),
+            "max_partitions": self.max_partitions,
+            "partitions_evicted": self.partitions_evicted,
+            "entries": sum(p.size for p in self._partitions.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Worker-wide instance
+semantic_cache = SemanticCache()
@@ -0,0 +1,216 @@
+"""
+Shared State
+Memory-mapped per-model statistics and rate-limit buckets shared by multi-worker processes
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Set by the multi-worker launcher; workers attach to the file it names
+SHARED_STATE_ENV = "SHARED_STATE_PATH"
+# Model ids that can hold shared state
+SHARED_STATE_MAX_MODELS = int(os.getenv("SHARED_STATE_MAX_MODELS", "256"))
+
+_DOUBLE = struct.Struct("d")
+_MAGIC = 0x554F5A53  # "UOZS"
+_NAME_BYTES = 128
+
+# Segment-wide fields (8-byte doubles after the magic/max_models/window header)
+HEADER_FIELDS = (
+    "slots_used",
+    "global_requests_tokens", "global_requests_updated",
+    "global_tokens_tokens", "global_tokens_updated",
+    "latest_block",
+    "jobs_recovered",
+)
+# Per-model fields, followed by the latency sample ring
+SLOT_FIELDS = (
+    "ewma_latency", "error_rate", "calls",
+    "requests_tokens", "requests_updated",
+    "tokens_tokens", "tokens_updated",
+    "blocked_until",
+    "latency_head", "latency_count",
+)
+_HEADER_PREFIX = struct.Struct("qqq")  # magic, max_models, window
+
+
+class SharedSegment:
+    """
+    Fixed-layout state in a memory-mapped file, guarded by flock
+
+    The file holds a small header and one slot per model id (assigned on
+    first use, never freed). Values are 8-byte doubles read and written in
+    place; callers that read-modify-write hold `lock()`, which is
+    re-entrant within a process and exclusive across processes.
+    """
+
+    def __init__(self, path: str, window: int = 0, max_models: int = SHARED_STATE_MAX_MODELS, create: bool = False):
+        if fcntl is None:
+            raise RuntimeError("Multi-worker shared state requires a POSIX system (fcntl)")
+        self.path = path
+        flags = os.O_RDWR | (os.O_CREAT if create else 0)
+        self._fd = os.open(path, flags, 0o600)
+        if create:
+            self.window = window
+            self.max_models = max_models
+            os.ftruncate(self._fd, self._size())
+        self._map = mmap.mmap(self._fd, 0)
+        if create:
+            _HEADER_PREFIX.pack_into(self._map, 0, _MAGIC, max_models, window)
+        else:
+            magic, self.max_models, self.window = _HEADER_PREFIX.unpack_from(self._map, 0)
+            if magic != _MAGIC:
+                raise RuntimeError(f"{path} is not a shared state file")
+        self._header = {name: _HEADER_PREFIX.size + 8 * i for i, name in enumerate(HEADER_FIELDS)}
+        self._slots_offset = _HEADER_PREFIX.size + 8 * len(HEADER_FIELDS)
+        self._fields = {name: _NAME_BYTES + 8 * i for i, name in enumerate(SLOT_FIELDS)}
+        self._samples_offset = _NAME_BYTES + 8 * len(SLOT_FIELDS)
+        self._slot_size = self._samples_offset + 8 * self.window
+        self._slot_ids: Dict[str, int] = {}
+        self._lock_depth = 0
+
+    def _size(self) -> int:
+        slot_size = _NAME_BYTES + 8 * (len(SLOT_FIELDS) + self.window)
+        return _HEADER_PREFIX.size + 8 * len(HEADER_FIELDS) + self.max_models * slot_size
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Exclusive lock across worker processes (re-entrant within one)"""
+        if self._lock_depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # Header fields
+
+    def get(self, field: str) -> float:
+        return _DOUBLE.unpack_from(self._map, self._header[field])[0]
+
+    def set(self, field: str, value: float) -> None:
+        _DOUBLE.pack_into(self._map, self._header[field], value)
+
+    def claim_once(self, field: str) -> bool:
+        """True for exactly one caller across all workers (flips a header flag)"""
+        with self.lock():
+            if self.get(field):
+                return False
+            self.set(field, 1.0)
+            return True
+
+    # Model slots
+
+    def slot(self, model_id: str) -> Optional[int]:
+        """Byte offset of a model's slot, assigning one if needed (None when full)"""
+        offset = self._slot_ids.get(model_id)
+        if offset is not None:
+            return offset
+        with self.lock():
+            self._scan_slots()
+            offset = self._slot_ids.get(model_id)
+            if offset is None:
+                used = int(self.get("slots_used"))
+                if used >= self.max_models:
+                    return None
+                offset = self._slots_offset + used * self._slot_size
+                name = model_id.encode("utf-8")[:_NAME_BYTES]
+                self._map[offset:offset + _NAME_BYTES] = name.ljust(_NAME_BYTES, b"\0")
+                _DOUBLE.pack_into(self._map, offset + self._fields["ewma_latency"], float("nan"))
+                self.set("slots_used", used + 1)
+                self._slot_ids[model_id] = offset
+        return offset
+
+    def _scan_slots(self) -> None:
+        """Pick up slots assigned by other workers"""
+        for index in range(len(self._slot_ids), int(self.get("slots_used"))):
+            offset = self._slots_offset + index * self._slot_size
+            name = bytes(self._map[offset:offset + _NAME_BYTES]).rstrip(b"\0").decode("utf-8", "replace")
+            self._slot_ids[name] = offset
+
+    def model_ids(self) -> List[str]:
+        """Every model id with a slot, in any worker"""
+        with self.lock():
+            self._scan_slots()
+        return list(self._slot_ids)
+
+    def read(self, offset: int, field: str) -> float:
+        return _DOUBLE.unpack_from(self._map, offset + self._fields[field])[0]
+
+    def write(self, offset: int, field: str, value: float) -> None:
+        _DOUBLE.pack_into(self._map, offset + self._fields[field], value)
+
+    def add_sample(self, offset: int, value: float) -> None:
+        """Append to a model's latency ring (oldest sample overwritten when full)"""
+        with self.lock():
+            head = int(self.read(offset, "latency_head"))
+            _DOUBLE.pack_into(self._map, offset + self._samples_offset + 8 * head, value)
+            self.write(offset, "latency_head", (head + 1) % self.window)
+            self.write(offset, "latency_count", min(self.read(offset, "latency_count") + 1, self.window))
+
+    def samples(self, offset: int) -> List[float]:
+        """A model's latency ring contents (unordered)"""
+        with self.lock():
+            count = int(self.read(offset, "latency_count"))
+            return list(struct.unpack_from(f"{count}d", self._map, offset + self._samples_offset))
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+def default_state_path() -> str:
+    """Per-launch state file, in /dev/shm when available so it never touches disk"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"universal_oz-{os.getpid()}.state")
+
+
+@contextmanager
+def multi_worker_state(window: int) -> Iterator[str]:
+    """
+    Create the shared segment for a multi-worker launch and publish its
+    path to the worker processes through the environment
+
+    Unless RESPONSE_CACHE_SQLITE_PATH is set, the response cache's SQLite
+    tier is pointed at a per-launch file so workers share cache entries.
+    Both files are removed on exit.
+    """
+    path = default_state_path()
+    segment = SharedSegment(path, window=window, create=True)
+    os.environ[SHARED_STATE_ENV] = path
+    created = [path]
+    if not os.getenv("RESPONSE_CACHE_SQLITE_PATH"):
+        cache_path = path[:-len(".state")] + "-cache.db"
+        os.environ["RESPONSE_CACHE_SQLITE_PATH"] = cache_path
+        created += [cache_path, cache_path + "-wal", cache_path + "-shm"]
+    try:
+        yield path
+    finally:
+        segment.close()
+        for file in created:
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+
+
+def attach_from_env() -> Optional[SharedSegment]:
+    """Attach to the launcher's segment in a worker process (None in single-process mode)"""
+    path = os.getenv(SHARED_STATE_ENV)
+    return SharedSegment(path) if path else None
+
+
+# Worker-wide segment (None unless started by the multi-worker launcher)
+shared_segment = attach_from_env()
@@ -0,0 +1,101 @@
+"""
+Single-Flight
+Coalesces identical in-flight upstream calls onto one shared task
+"""
+
+import asyncio
+import contextvars
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Share one in-flight task between concurrent callers with the same key
+
+    The shared task is shielded from individual waiters being cancelled;
+    it is only cancelled when every waiter has gone away. It runs in an
+    empty context, so it never inherits the first caller's request
+    deadline; each caller bounds its own wait with `timeout` instead.
+    A factory that needs other per-request values (such as the client
+    identity) sets them itself.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(
+        self, key: str, factory: Callable[[], Awaitable[Any]], timeout: Optional[float] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Run `factory()` once per key across concurrent callers
+
+        Args:
+            key: Coalescing key
+            factory: Creates the shared awaitable
+            timeout: Seconds this caller will wait; asyncio.TimeoutError
+                is raised after that while the shared call carries on for
+                the other waiters
+
+        Returns:
+            (result, shared) where shared is True if this caller joined
+            a call started by someone else
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(contextvars.Context().run(asyncio.ensure_future, factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self.leaders += 1
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), timeout), shared
+        except asyncio.TimeoutError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if call.task.cancelled() and current is not None and not current.cancelling():
+                # Joined a call that its last waiter abandoned; start afresh
+                self._forget(key, call)
+                return await self.do(key, factory, timeout)
+            # Last waiter leaving: nobody needs the upstream result any more
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict:
+        """Coalescing counters for /stats"""
+        return {
+            "enabled": SINGLEFLIGHT_ENABLED,
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared,
+        }
+
+
+# Worker-wide instance for per-model upstream calls
+model_calls = SingleFlight()
@@ -0,0 +1,55 @@
+"""
+Streaming Helpers
+Parses OpenRouter token streams and formats Server-Sent Events
+"""
+
+from typing import AsyncIterator, Dict
+
+import aiohttp
+
+from . import fast_json
+
+
+def format_sse(event: str, data: Dict) -> str:
+    """
+    Format a single Server-Sent Event frame
+
+    Args:
+        event: SSE event name
+        data: JSON-serializable payload
+
+    Returns:
+        Encoded frame terminated by a blank line
+    """
+    return f"event: {event}\ndata: {fast_json.dumps(data)}\n\n"
+
+
+async def iter_stream_chunks(response: aiohttp.ClientResponse) -> AsyncIterator[Dict]:
+    """
+    Yield parsed JSON chunks from an OpenRouter `stream: true` response
+
+    Skips SSE comments (OpenRouter sends keep-alive `: OPENROUTER PROCESSING`
+    lines) and stops at the `[DONE]` sentinel.
+    """
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").strip()
+        if not line or line.startswith(":"):
+            continue
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            yield fast_json.loads(data)
+        except ValueError:
+            continue
+
+
+def chunk_delta(chunk: Dict) -> str:
+    """Extract the content delta from a streamed completion chunk"""
+    choices = chunk.get("choices") or []
+    if not choices:
+        return ""
+    delta = choices[0].get("delta") or {}
+    return delta.get("content") or ""
@@ -0,0 +1,210 @@
+"""
+Synthesis
+Model-based synthesis of multiple responses with MinHash near-duplicate sentence removal
+"""
+
+import asyncio
+import os
+import random
+import re
+import zlib
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .request_context import remaining_seconds
+
+# Synthesis model (empty keeps the rule-based synthesis; override via environment)
+SYNTHESIS_MODEL = os.getenv("SYNTHESIS_MODEL", "")
+SYNTHESIS_MAX_TOKENS = int(os.getenv("SYNTHESIS_MAX_TOKENS", "800"))
+SYNTHESIS_TEMPERATURE = float(os.getenv("SYNTHESIS_TEMPERATURE", "0.3"))
+# Skip the model call when less than this much of the request deadline is left
+SYNTHESIS_MIN_REMAINING_MS = float(os.getenv("SYNTHESIS_MIN_REMAINING_MS", "2000"))
+# Cap on the answer text sent to the synthesis model
+SYNTHESIS_MAX_INPUT_CHARS = int(os.getenv("SYNTHESIS_MAX_INPUT_CHARS", "24000"))
+
+# Near-duplicate detection
+SYNTHESIS_DEDUP_THRESHOLD = float(os.getenv("SYNTHESIS_DEDUP_THRESHOLD", "0.7"))
+SYNTHESIS_SHINGLE_SIZE = int(os.getenv("SYNTHESIS_SHINGLE_SIZE", "3"))
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD_RE = re.compile(r"\w+")
+# Mersenne prime modulus for the universal hash family
+_PRIME = (1 << 61) - 1
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences (and lines, so lists and code keep their shape)"""
+    return [s.strip() for s in _SENTENCE_RE.split(text) if s.strip()]
+
+
+class MinHashDeduplicator:
+    """
+    Removes sentences that near-duplicate one already kept
+
+    Each sentence becomes a set of word shingles, summarized by a MinHash
+    signature of `num_perm` hash minima. Signatures are split into
+    `bands` LSH bands, so only sentences sharing a band are compared; a
+    candidate is a duplicate when the estimated Jaccard similarity (the
+    fraction of equal minima) reaches `threshold`.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SYNTHESIS_DEDUP_THRESHOLD,
+        shingle_size: int = SYNTHESIS_SHINGLE_SIZE,
+        num_perm: int = 16,
+        bands: int = 8,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = random.Random(seed)
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, sentence: str) -> Optional[Tuple[int, ...]]:
+        """MinHash signature of a sentence's word shingles (None if it has no words)"""
+        words = _WORD_RE.findall(sentence.lower())
+        if not words:
+            return None
+        k = min(self.shingle_size, len(words))
+        hashes = [
+            zlib.crc32(" ".join(words[i:i + k]).encode("utf-8"))
+            for i in range(len(words) - k + 1)
+        ]
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self.perms)
+
+    def dedupe(self, texts: List[str]) -> Tuple[List[str], int, int]:
+        """
+        Drop repeated sentences across texts, keeping first occurrences
+
+        Returns:
+            (compressed texts, sentences seen, sentences kept)
+        """
+        buckets: Dict[Tuple[int, Tuple[int, ...]], List[Tuple[int, ...]]] = {}
+        compressed = []
+        seen = kept = 0
+        for text in texts:
+            kept_sentences = []
+            for sentence in split_sentences(text):
+                seen += 1
+                signature = self.signature(sentence)
+                if signature is None:
+                    continue
+                bands = [
+                    (band, signature[band * self.rows:(band + 1) * self.rows])
+                    for band in range(self.bands)
+                ]
+                if self._has_duplicate(signature, bands, buckets):
+                    continue
+                for key in bands:
+                    buckets.setdefault(key, []).append(signature)
+                kept_sentences.append(sentence)
+                kept += 1
+            compressed.append("\n".join(kept_sentences))
+        return compressed, seen, kept
+
+    def _has_duplicate(self, signature, bands, buckets) -> bool:
+        needed = self.threshold * len(signature)
+        for key in bands:
+            for other in buckets.get(key, ()):
+                if sum(x == y for x, y in zip(signature, other)) >= needed:
+                    return True
+        return False
+
+
+def build_synthesis_prompt(prompt: str, models: List[str], texts: List[str]) -> str:
+    """Prompt asking the synthesis model to compare and combine the answers"""
+    parts = [
+        "Several AI models answered the same prompt. Sentences repeated across "
+        "answers appear only under the first model that gave them.\n\n",
+        f"Prompt: {prompt}\n\n",
+    ]
+    budget = SYNTHESIS_MAX_INPUT_CHARS
+    for model_id, text in zip(models, texts):
+        if budget <= 0:
+            break
+        text = text[:budget]
+        budget -= len(text)
+        parts.append(f"### {model_id}\n{text}\n\n")
+    parts.append(
+        "Write a concise synthesis: where the answers agree, where they differ, "
+        "and a recommended combined answer."
+    )
+    return "".join(parts)
+
+
+class SynthesisStage:
+    """
+    Calls a cheap model to synthesize the successful responses
+
+    Input is compressed with MinHashDeduplicator (in a worker thread) so
+    the synthesis prompt stays small. The stage is skipped, and callers
+    fall back to the rule-based synthesis, when no model is configured or
+    the request deadline is too close.
+    """
+
+    def __init__(self, model: str = SYNTHESIS_MODEL):
+        self.model = model
+        self.enabled = bool(model)
+        self.deduplicator = MinHashDeduplicator()
+        self.calls = 0
+        self.failures = 0
+        self.skipped_deadline = 0
+        self.sentences_seen = 0
+        self.sentences_kept = 0
+
+    async def run(
+        self,
+        prompt: str,
+        results: List[Dict],
+        call: Callable[[str, str, int, float], Awaitable[Dict]],
+    ) -> Optional[Dict]:
+        """
+        Synthesize successful model results
+
+        Args:
+            prompt: Original user prompt
+            results: Successful model result dicts
+            call: Coroutine function (model_id, prompt, max_tokens, temperature) -> result dict
+
+        Returns:
+            The synthesis call's result dict, or None when skipped
+        """
+        if not self.enabled:
+            return None
+        remaining = remaining_seconds()
+        if remaining is not None and remaining * 1000 < SYNTHESIS_MIN_REMAINING_MS:
+            self.skipped_deadline += 1
+            return None
+
+        texts, seen, kept = await asyncio.to_thread(
+            self.deduplicator.dedupe, [r["response"] for r in results]
+        )
+        self.sentences_seen += seen
+        self.sentences_kept += kept
+        synthesis_prompt = build_synthesis_prompt(prompt, [r["model"] for r in results], texts)
+
+        self.calls += 1
+        result = await call(self.model, synthesis_prompt, SYNTHESIS_MAX_TOKENS, SYNTHESIS_TEMPERATURE)
+        if not result["success"]:
+            self.failures += 1
+        return result
+
+    def stats(self) -> Dict:
+        """Synthesis counters for /stats"""
+        return {
+            "enabled": self.enabled,
+            "model": self.model or None,
+            "calls": self.calls,
+            "failures": self.failures,
+            "skipped_deadline": self.skipped_deadline,
+            "sentences_seen": self.sentences_seen,
+            "sentences_kept": self.sentences_kept,
+        }
+
+
+# Worker-wide instance
+synthesis_stage = SynthesisStage()
@@ -0,0 +1,243 @@
+"""
+Task Classifier
+Pluggable task-type classification engines (keyword scoring or hashed linear model)
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from .task_detector import TASK_KEYWORDS, detect_task_type, detect_task_types, get_task_confidence
+from .text_features import HashedNgramVectorizer
+
+# Engine selection (override via environment)
+TASK_CLASSIFIER = os.getenv("TASK_CLASSIFIER", "keyword")
+TASK_CLASSIFIER_MODEL_PATH = os.getenv("TASK_CLASSIFIER_MODEL_PATH", "")
+TASK_CLASSIFIER_DIM = int(os.getenv("TASK_CLASSIFIER_DIM", "4096"))
+# Prompts featurized per dense matrix in classify_batch (bounds memory to chunk x dim floats)
+TASK_CLASSIFIER_CHUNK_SIZE = int(os.getenv("TASK_CLASSIFIER_CHUNK_SIZE", "256"))
+
+
+class TaskClassifier:
+    """Interface for task-type classification engines"""
+
+    name = "base"
+
+    def classify(self, prompt: str) -> str:
+        """Return the best task type for a prompt"""
+        raise NotImplementedError
+
+    def confidences(self, prompt: str) -> Dict[str, float]:
+        """Return task_type: confidence (0-1) for every task type"""
+        raise NotImplementedError
+
+    def classify_batch(self, prompts: List[str]) -> List[str]:
+        """Classify many prompts at once; engines may override with a faster path"""
+        return [self.classify(prompt) for prompt in prompts]
+
+
+class KeywordClassifier(TaskClassifier):
+    """Default engine: keyword scoring from task_detector"""
+
+    name = "keyword"
+
+    def classify(self, prompt: str) -> str:
+        return detect_task_type(prompt)
+
+    def confidences(self, prompt: str) -> Dict[str, float]:
+        return get_task_confidence(prompt)
+
+    def classify_batch(self, prompts: List[str]) -> List[str]:
+        return detect_task_types(prompts)
+
+
+class HashedLinearClassifier(TaskClassifier):
+    """
+    Softmax-linear model over hashed n-gram features (NumPy, CPU-only)
+
+    Scores all task types with one matrix multiply per prompt, or per
+    chunk of `chunk_size` prompts in classify_batch, so a large batch
+    never materializes more than chunk_size x dim features at once.
+    """
+
+    name = "linear"
+
+    def __init__(
+        self,
+        weights: "np.ndarray",
+        bias: "np.ndarray",
+        labels: List[str],
+        dim: int = TASK_CLASSIFIER_DIM,
+        chunk_size: int = TASK_CLASSIFIER_CHUNK_SIZE,
+    ):
+        if np is None:
+            raise RuntimeError("The linear task classifier requires numpy")
+        if chunk_size < 1:
+            raise RuntimeError(f"TASK_CLASSIFIER_CHUNK_SIZE must be at least 1, got {chunk_size}")
+        self.chunk_size = chunk_size
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.labels = list(labels)
+        # Question words are informative for task type, so keep every token
+        self.vectorizer = HashedNgramVectorizer(dim, stopwords=frozenset())
+
+    def _probabilities(self, features: "np.ndarray") -> "np.ndarray":
+        logits = features @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def classify(self, prompt: str) -> str:
+        return self.classify_batch([prompt])[0]
+
+    def confidences(self, prompt: str) -> Dict[str, float]:
+        probs = self._probabilities(self.vectorizer.transform_batch([prompt]))[0]
+        return {label: float(p) for label, p in zip(self.labels, probs)}
+
+    def classify_batch(self, prompts: List[str]) -> List[str]:
+        labels = []
+        for start in range(0, len(prompts), self.chunk_size):
+            features = self.vectorizer.transform_batch(prompts[start:start + self.chunk_size])
+            logits = features @ self.weights + self.bias
+            labels.extend(self.labels[i] for i in logits.argmax(axis=1))
+        return labels
+
+    @classmethod
+    def train(
+        cls,
+        prompts: List[str],
+        labels: List[str],
+        dim: int = TASK_CLASSIFIER_DIM,
+        epochs: int = 20,
+        learning_rate: float = 4.0,
+        l2: float = 1e-4,
+        batch_size: int = 256,
+        seed: int = 0,
+    ) -> "HashedLinearClassifier":
+        """
+        Fit multinomial logistic regression with mini-batch gradient descent
+
+        Args:
+            prompts: Training prompts
+            labels: Task type per prompt (must be known task types)
+            dim: Hashed feature dimension
+
+        Returns:
+            Trained classifier
+        """
+        if np is None:
+            raise RuntimeError("The linear task classifier requires numpy")
+        task_types = list(TASK_KEYWORDS.keys())
+        unknown = sorted(set(labels) - set(task_types))
+        if unknown:
+            raise ValueError(f"Unknown task types in training data: {unknown}")
+
+        vectorizer = HashedNgramVectorizer(dim, stopwords=frozenset())
+        y = np.array([task_types.index(label) for label in labels])
+        weights = np.zeros((dim, len(task_types)), dtype=np.float32)
+        bias = np.zeros(len(task_types), dtype=np.float32)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(prompts))
+            for start in range(0, len(order), batch_size):
+                rows = order[start:start + batch_size]
+                features = vectorizer.transform_batch([prompts[i] for i in rows])
+                logits = features @ weights + bias
+                logits -= logits.max(axis=1, keepdims=True)
+                probs = np.exp(logits)
+                probs /= probs.sum(axis=1, keepdims=True)
+                probs[np.arange(len(rows)), y[rows]] -= 1.0
+                grad_w = features.T @ probs / len(rows) + l2 * weights
+                grad_b = probs.mean(axis=0)
+                weights -= learning_rate * grad_w
+                bias -= learning_rate * grad_b
+
+        return cls(weights, bias, task_types, dim)
+
+    @classmethod
+    def train_from_jsonl(cls, path: str, **kwargs) -> "HashedLinearClassifier":
+        """Train from a JSONL file of {"prompt": ..., "task_type": ...} records"""
+        prompts, labels = load_labeled_jsonl(path)
+        return cls.train(prompts, labels, **kwargs)
+
+    def save(self, path: str) -> None:
+        """Save weights to a .npz file"""
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            labels=np.array(self.labels),
+            dim=np.array(self.vectorizer.dim),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "HashedLinearClassifier":
+        """Load weights saved by save()"""
+        if np is None:
+            raise RuntimeError("The linear task classifier requires numpy")
+        data = np.load(path)
+        return cls(data["weights"], data["bias"], [str(l) for l in data["labels"]], int(data["dim"]))
+
+
+def load_labeled_jsonl(path: str) -> Tuple[List[str], List[str]]:
+    """Read (prompts, task_types) from a labeled JSONL file"""
+    prompts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompts.append(record["prompt"])
+            labels.append(record["task_type"])
+    return prompts, labels
+
+
+_classifier: Optional[TaskClassifier] = None
+
+
+def build_classifier(engine: str = TASK_CLASSIFIER, model_path: str = TASK_CLASSIFIER_MODEL_PATH) -> TaskClassifier:
+    """
+    Create the configured classification engine
+
+    The linear engine loads a .npz model, or trains from a .jsonl file.
+    """
+    if engine == "keyword":
+        return KeywordClassifier()
+    if engine == "linear":
+        if not model_path:
+            raise RuntimeError("TASK_CLASSIFIER_MODEL_PATH is required for the linear task classifier")
+        if model_path.endswith(".jsonl"):
+            return HashedLinearClassifier.train_from_jsonl(model_path)
+        return HashedLinearClassifier.load(model_path)
+    raise RuntimeError(f"Unknown TASK_CLASSIFIER engine: {engine}")
+
+
+def get_classifier() -> TaskClassifier:
+    """Get the worker-wide classifier, building it on first use"""
+    global _classifier
+    if _classifier is None:
+        _classifier = build_classifier()
+    return _classifier
+
+
+def set_classifier(classifier: TaskClassifier) -> None:
+    """Replace the worker-wide classifier"""
+    global _classifier
+    _classifier = classifier
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m api.task_classifier <labeled.jsonl> <model.npz>")
+        sys.exit(1)
+    model = HashedLinearClassifier.train_from_jsonl(sys.argv[1])
+    model.save(sys.argv[2])
+    print(f"Saved {model.name} classifier with {len(model.labels)} task types to {sys.argv[2]}")
@@ -3,7 +3,7 @@ Task Type Detection
 Analyzes prompts to determine the best task category
 """
 
-import re
+from collections import deque
 from typing import Dict, List
 
 # Keywords for each task type
@@ -59,27 +59,114 @@ TASK_KEYWORDS = {
     ]
 }
 
-def detect_task_type(prompt: str) -> str:
+def _is_word(ch: str) -> bool:
+    """Match the regex \\w class for a single character"""
+    return ch.isalnum() or ch == "_"
+
+class KeywordAutomaton:
     """
-    Detect task type based on prompt keywords
+    Aho-Corasick automaton over every keyword, compiled to a DFA
     
-    Returns the task type with highest keyword match count
+    One linear pass over the prompt finds all keyword occurrences and
+    whether any occurrence is a whole-word match, using the same
+    word-boundary rules as the regex `\\b` anchor.
     """
-    prompt_lower = prompt.lower()
     
-    # Count keyword matches for each task type
-    scores: Dict[str, int] = {}
+    def __init__(self, keywords: List[str]):
+        self.keywords = keywords
+        self.lengths = [len(k) for k in keywords]
+        self.first_is_word = [_is_word(k[0]) for k in keywords]
+        self.last_is_word = [_is_word(k[-1]) for k in keywords]
+        
+        # Trie
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][ch] = nxt
+                state = nxt
+            outputs[state].append(index)
+        
+        # Failure links in BFS order, folded into a full transition table
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            # Inherit transitions from the failure state, then overlay own edges
+            delta[state] = {**delta[fail[state]], **goto[state]} if state else delta[state]
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0) if state else 0
+                queue.append(nxt)
+        
+        self.delta = delta
+        self.outputs = [tuple(o) for o in outputs]
+    
+    def scan(self, text: str) -> Dict[int, bool]:
+        """
+        Find keywords in text
+        
+        Returns:
+            Dict of keyword index -> True if some occurrence is a whole-word match
+        """
+        found: Dict[int, bool] = {}
+        delta = self.delta
+        outputs = self.outputs
+        state = 0
+        end = len(text)
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if not outputs[state]:
+                continue
+            for index in outputs[state]:
+                if found.get(index):
+                    continue
+                start = i - self.lengths[index] + 1
+                before = _is_word(text[start - 1]) if start > 0 else False
+                after = _is_word(text[i + 1]) if i + 1 < end else False
+                found[index] = (
+                    before != self.first_is_word[index]
+                    and after != self.last_is_word[index]
+                )
+        return found
+
+# Built once at import: every distinct keyword across all task types
+_KEYWORD_LIST = list(dict.fromkeys(k for keywords in TASK_KEYWORDS.values() for k in keywords))
+_KEYWORD_INDEX = {keyword: i for i, keyword in enumerate(_KEYWORD_LIST)}
+_AUTOMATON = KeywordAutomaton(_KEYWORD_LIST)
+
+def score_task_types(prompt: str) -> Dict[str, int]:
+    """
+    Keyword match score for every task type in one pass over the prompt
     
+    Each keyword found in the prompt adds 2 if it appears as a whole word,
+    otherwise 1 (e.g. "test" inside "testing").
+    """
+    found = _AUTOMATON.scan(prompt.lower())
+    scores: Dict[str, int] = {}
     for task_type, keywords in TASK_KEYWORDS.items():
         score = 0
         for keyword in keywords:
-            if keyword in prompt_lower:
-                # Exact word match gets higher score
-                if re.search(r'\b' + re.escape(keyword) + r'\b', prompt_lower):
-                    score += 2
-                else:
-                    score += 1
+            whole_word = found.get(_KEYWORD_INDEX[keyword])
+            if whole_word is not None:
+                score += 2 if whole_word else 1
         scores[task_type] = score
+    return scores
+
+def detect_task_type(prompt: str) -> str:
+    """
+    Detect task type based on prompt keywords
+    
+    Returns the task type with highest keyword match count
+    """
+    scores = score_task_types(prompt)
     
     # Get task type with highest score
     if max(scores.values()) == 0:
@@ -95,18 +182,7 @@ def get_task_confidence(prompt: str) -> Dict[str, float]:
     
     Returns dict of task_type: confidence (0-1)
     """
-    prompt_lower = prompt.lower()
-    scores: Dict[str, int] = {}
-    
-    for task_type, keywords in TASK_KEYWORDS.items():
-        score = 0
-        for keyword in keywords:
-            if keyword in prompt_lower:
-                if re.search(r'\b' + re.escape(keyword) + r'\b', prompt_lower):
-                    score += 2
-                else:
-                    score += 1
-        scores[task_type] = score
+    scores = score_task_types(prompt)
     
     # Normalize to 0-1
     total = sum(scores.values())
@@ -115,3 +191,11 @@ def get_task_confidence(prompt: str) -> Dict[str, float]:
     
     confidences = {task: score / total for task, score in scores.items()}
     return confidences
+
+def detect_task_types(prompts: List[str]) -> List[str]:
+    """
+    Detect task types for many prompts at once (used by batch jobs)
+    
+    Returns one task type per prompt, in order
+    """
+    return [detect_task_type(prompt) for prompt in prompts]
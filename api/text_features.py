@@ -0,0 +1,73 @@
+"""
+Text Features
+Hashed n-gram embeddings shared by the semantic cache and the task classifier
+"""
+
+import re
+import zlib
+from typing import List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+# Words that carry little meaning for matching paraphrased prompts
+STOPWORDS = frozenset([
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "for", "in", "on",
+    "to", "and", "or", "what", "how", "does", "do", "me", "please", "can", "you",
+    "explain", "describe", "tell", "about", "i", "my", "it", "this", "that",
+])
+
+_WORD_RE = re.compile(r"[a-z0-9+#]+")
+
+
+class HashedNgramVectorizer:
+    """
+    Stateless text embedding via the hashing trick
+
+    Features are word unigrams, word bigrams and character trigrams of each
+    word, hashed with CRC32 (stable across processes) into `dim` signed
+    buckets and L2-normalized, so a dot product is cosine similarity.
+    """
+
+    def __init__(self, dim: int = 4096, stopwords: frozenset = STOPWORDS):
+        self.dim = dim
+        self.stopwords = stopwords
+
+    def features(self, text: str) -> List[str]:
+        words = [w for w in _WORD_RE.findall(text.lower()) if w not in self.stopwords]
+        feats = [f"w:{w}" for w in words]
+        feats.extend(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            feats.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return feats
+
+    def hashed(self, text: str) -> Tuple[List[int], List[float]]:
+        """Sparse (bucket, sign) pairs for the text's features"""
+        indices, signs = [], []
+        for feat in self.features(text):
+            h = zlib.crc32(feat.encode("utf-8"))
+            indices.append(h % self.dim)
+            signs.append(1.0 if (h >> 31) & 1 else -1.0)
+        return indices, signs
+
+    def transform(self, text: str) -> "np.ndarray":
+        vec = np.zeros(self.dim, dtype=np.float32)
+        indices, signs = self.hashed(text)
+        np.add.at(vec, indices, signs)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+    def transform_batch(self, texts: List[str]) -> "np.ndarray":
+        """Embed many texts into one (len(texts), dim) matrix"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            indices, signs = self.hashed(text)
+            np.add.at(matrix[row], indices, signs)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
@@ -0,0 +1,110 @@
+"""
+Usage Ledger
+In-memory token and cost totals per API key and task type
+"""
+
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .response_compiler import call_cost, is_reused
+
+# (client, task type) entries kept before the least recently used one is dropped;
+# clients are identified by an unauthenticated X-API-Key or address, so the ledger must be bounded
+USAGE_LEDGER_MAX_ENTRIES = int(os.getenv("USAGE_LEDGER_MAX_ENTRIES", "10000"))
+
+# Counter layout of each ledger entry
+LEDGER_FIELDS = (
+    "requests", "calls", "reused_calls",
+    "prompt_tokens", "completion_tokens", "total_tokens", "cost_usd"
+)
+
+
+class UsageLedger:
+    """
+    Running totals keyed by (client, task_type)
+
+    Each entry is a flat list of counters updated in place, so recording
+    a request costs one dict lookup and a few additions. Only billed
+    upstream calls add tokens and cost (including the discarded attempt
+    of a hedged call); cached or coalesced results are counted as reused.
+    At most `max_entries` entries are kept; the least recently updated
+    one is dropped to make room.
+    """
+
+    def __init__(self, max_entries: int = USAGE_LEDGER_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self.since = datetime.now().isoformat()
+        self.evicted = 0
+
+    def record(self, client: str, task_type: str, results: List[Dict]) -> None:
+        """Add one request's model results to the ledger"""
+        key = (client, task_type)
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            entry = self._entries[key] = _empty()
+        else:
+            self._entries.move_to_end(key)
+        entry[0] += 1
+        for result in results:
+            if not result["success"]:
+                continue
+            if is_reused(result):
+                entry[2] += 1
+                continue
+            entry[1] += 1
+            for usage in (result, result.get("hedge_usage")):
+                if usage:
+                    entry[3] += usage.get("prompt_tokens", 0)
+                    entry[4] += usage.get("completion_tokens", 0)
+                    entry[5] += usage.get("tokens", 0)
+            entry[6] += call_cost(result)
+
+    def usage(self, client: Optional[str] = None) -> Dict:
+        """
+        Totals by task type, for one client or across all clients
+
+        Returns:
+            Dict with `by_task_type`, overall `total` and the ledger start time
+        """
+        by_task: Dict[str, list] = {}
+        for (entry_client, task_type), entry in self._entries.items():
+            if client is not None and entry_client != client:
+                continue
+            totals = by_task.setdefault(task_type, _empty())
+            for i, value in enumerate(entry):
+                totals[i] += value
+        grand_total = [sum(column) for column in zip(*by_task.values())] or _empty()
+        return {
+            "since": self.since,
+            "by_task_type": {task_type: _as_dict(totals) for task_type, totals in by_task.items()},
+            "total": _as_dict(grand_total),
+        }
+
+    def stats(self) -> Dict:
+        """Ledger size for /stats"""
+        return {
+            "clients": len({client for client, _ in self._entries}),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evicted": self.evicted,
+        }
+
+
+def _empty() -> list:
+    return [0, 0, 0, 0, 0, 0, 0.0]
+
+
+def _as_dict(counters: list) -> Dict:
+    data = dict(zip(LEDGER_FIELDS, counters))
+    data["cost_usd"] = round(data["cost_usd"], 6)
+    return data
+
+
+# Worker-wide instance
+usage_ledger = UsageLedger()
@@ -0,0 +1,3 @@
+"""
+Universal OZ offline benchmarks
+"""
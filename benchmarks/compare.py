@@ -0,0 +1,58 @@
+"""
+Benchmark Compare
+Side-by-side deltas between two benchmark result files
+"""
+
+import json
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+
+def load(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def metric_rows(report: Dict) -> Iterator[Tuple[str, float]]:
+    """Flatten a report into (metric name, value) pairs worth comparing"""
+    for name, result in report.get("micro", {}).items():
+        for stat in ("p50", "p99"):
+            yield f"micro.{name}.{stat}_ns", result["ns_per_call"][stat]
+    for level in report.get("query", {}).get("levels", []):
+        prefix = f"query.c{level['concurrency']}"
+        yield f"{prefix}.throughput_rps", level["throughput_rps"]
+        yield f"{prefix}.p50_ms", level["latency_ms"]["p50"]
+        yield f"{prefix}.p99_ms", level["latency_ms"]["p99"]
+        yield f"{prefix}.errors", level["errors"]
+
+
+def change(old: float, new: float) -> Optional[float]:
+    """Relative change in percent (None when the baseline is zero)"""
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline: Dict, current: Dict) -> str:
+    """Table of every metric present in both reports"""
+    old_values = dict(metric_rows(baseline))
+    lines = [
+        f"baseline {baseline['meta']['git_commit']} ({baseline['meta']['timestamp']})"
+        f"  vs  current {current['meta']['git_commit']} ({current['meta']['timestamp']})",
+        f"{'metric':<52} {'baseline':>14} {'current':>14} {'change':>9}",
+    ]
+    for name, new in metric_rows(current):
+        if name not in old_values:
+            continue
+        old = old_values[name]
+        delta = change(old, new)
+        delta_text = "n/a" if delta is None else f"{delta:+.1f}%"
+        lines.append(f"{name:<52} {old:>14.2f} {new:>14.2f} {delta_text:>9}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m benchmarks.compare <baseline.json> <current.json>")
+        sys.exit(1)
+    print(compare(load(sys.argv[1]), load(sys.argv[2])))
@@ -0,0 +1,202 @@
+"""
+Mock OpenRouter
+Local stand-in for the OpenRouter chat-completions API with configurable latency, errors and tokens
+"""
+
+import asyncio
+import json
+import math
+import random
+from typing import Dict, Optional
+
+from aiohttp import web
+
+# z-score of the 99th percentile of a standard normal distribution
+_Z99 = 2.3263
+
+# Profile used for any model without its own entry
+DEFAULT_PROFILE = {
+    # fixed: {"ms"}; uniform: {"min_ms", "max_ms"}; lognormal: {"median_ms", "p99_ms"}
+    "latency": {"distribution": "lognormal", "median_ms": 800, "p99_ms": 4000},
+    # Fraction of calls answered with `error_status`
+    "error_rate": 0.0,
+    "error_status": 500,
+    # Fraction of calls answered with 429 and a Retry-After header
+    "rate_limit_rate": 0.0,
+    "retry_after": 1,
+    # Prompt tokens default to an estimate from the prompt length
+    "prompt_tokens": None,
+    "completion_tokens": 300,
+    # Share of the sampled latency spent before the first streamed token
+    "first_token_ratio": 0.3,
+    "stream_chunks": 30,
+}
+
+_FILLER = (
+    "The model considers the question carefully and explains each step with "
+    "concrete examples, trade-offs and a short recommendation at the end."
+).split()
+
+
+def sample_latency(latency: Dict, rng: random.Random) -> float:
+    """Draw one latency in seconds from a latency profile"""
+    distribution = latency.get("distribution", "fixed")
+    if distribution == "fixed":
+        ms = latency["ms"]
+    elif distribution == "uniform":
+        ms = rng.uniform(latency["min_ms"], latency["max_ms"])
+    elif distribution == "lognormal":
+        median = latency["median_ms"]
+        sigma = math.log(latency["p99_ms"] / median) / _Z99
+        ms = rng.lognormvariate(math.log(median), sigma)
+    else:
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+    return ms / 1000
+
+
+class MockOpenRouter:
+    """
+    Serves /api/v1/chat/completions from per-model profiles
+
+    Each profile is DEFAULT_PROFILE updated with the config's "default"
+    section and then the model's own entry. Latencies are multiplied by
+    `time_scale`, so a full profile can be replayed quickly.
+    """
+
+    def __init__(self, config: Optional[Dict] = None, time_scale: float = 1.0, seed: Optional[int] = None):
+        config = config or {}
+        self.defaults = {**DEFAULT_PROFILE, **config.get("default", {})}
+        self.models = config.get("models", {})
+        self.time_scale = time_scale
+        self.rng = random.Random(config.get("seed") if seed is None else seed)
+        self._profiles: Dict[str, Dict] = {}
+        self._texts: Dict[int, str] = {}
+        # model -> [calls, errors, rate_limited, streamed]
+        self.counts: Dict[str, list] = {}
+
+    def profile(self, model_id: str) -> Dict:
+        profile = self._profiles.get(model_id)
+        if profile is None:
+            profile = self._profiles[model_id] = {**self.defaults, **self.models.get(model_id, {})}
+        return profile
+
+    def completion_text(self, tokens: int) -> str:
+        """Filler text of roughly `tokens` tokens (about 0.75 words per token)"""
+        text = self._texts.get(tokens)
+        if text is None:
+            words = max(1, tokens * 3 // 4)
+            text = self._texts[tokens] = " ".join(_FILLER[i % len(_FILLER)] for i in range(words))
+        return text
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model_id = body["model"]
+        profile = self.profile(model_id)
+        counts = self.counts.setdefault(model_id, [0, 0, 0, 0])
+        counts[0] += 1
+        latency = sample_latency(profile["latency"], self.rng) * self.time_scale
+
+        roll = self.rng.random()
+        if roll < profile["rate_limit_rate"]:
+            counts[2] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit exceeded", "code": 429}},
+                status=429, headers={"Retry-After": str(profile["retry_after"])}
+            )
+        if roll < profile["rate_limit_rate"] + profile["error_rate"]:
+            counts[1] += 1
+            await asyncio.sleep(latency * profile["first_token_ratio"])
+            status = profile["error_status"]
+            return web.json_response({"error": {"message": "Mock upstream error", "code": status}}, status=status)
+
+        prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+        prompt_tokens = profile["prompt_tokens"]
+        if prompt_tokens is None:
+            prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = min(profile["completion_tokens"], body.get("max_tokens") or profile["completion_tokens"])
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        text = self.completion_text(completion_tokens)
+
+        if body.get("stream"):
+            counts[3] += 1
+            return await self.stream(request, model_id, text, usage, latency, profile)
+        await asyncio.sleep(latency)
+        return web.json_response({
+            "id": "mock-completion",
+            "model": model_id,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def stream(
+        self,
+        request: web.Request,
+        model_id: str,
+        text: str,
+        usage: Dict,
+        latency: float,
+        profile: Dict
+    ) -> web.StreamResponse:
+        """Send `text` as SSE deltas spread over `latency`, then usage and [DONE]"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = text.split(" ")
+        chunks = max(1, min(profile["stream_chunks"], len(words)))
+        per_chunk = math.ceil(len(words) / chunks)
+        first_token = latency * profile["first_token_ratio"]
+        gap = (latency - first_token) / chunks
+        await asyncio.sleep(first_token)
+        for i in range(0, len(words), per_chunk):
+            content = " ".join(words[i:i + per_chunk]) + " "
+            event = {"model": model_id, "choices": [{"index": 0, "delta": {"content": content}}]}
+            await response.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+            await asyncio.sleep(gap)
+        final = {"model": model_id, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        await response.write(b"data: " + json.dumps(final).encode() + b"\n\n")
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict:
+        """Per-model call counts since start"""
+        return {
+            model_id: {"calls": c[0], "errors": c[1], "rate_limited": c[2], "streamed": c[3]}
+            for model_id, c in self.counts.items()
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/v1/chat/completions", self.handle)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+
+def load_config(path: Optional[str]) -> Dict:
+    """Read a mock profile config (JSON), or an empty config without a path"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mock OpenRouter chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--config", help="JSON profile config (see benchmarks/mock_profiles.json)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier applied to every latency")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    mock = MockOpenRouter(load_config(args.config), time_scale=args.time_scale, seed=args.seed)
+    print(f"Mock OpenRouter on http://{args.host}:{args.port}/api/v1/chat/completions")
+    web.run_app(mock.make_app(), host=args.host, port=args.port, print=None)
@@ -0,0 +1,444 @@
+"""
+Benchmark Runner
+End-to-end /query load tests against the mock OpenRouter, plus pipeline microbenchmarks
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+DEFAULT_PROFILES = os.path.join(ROOT, "benchmarks", "mock_profiles.json")
+
+# One prompt per task type, so every routing table is exercised
+SAMPLE_PROMPTS = [
+    "Write a blog post about remote work productivity tips",
+    "Write a Python function that merges overlapping intervals and add unit tests",
+    "Analyze this quarterly sales data and find the main trends in revenue",
+    "Research the current evidence on intermittent fasting and summarize the findings",
+    "Write a short story about a lighthouse keeper who finds a message in a bottle",
+    "Create a go-to-market strategy for a B2B SaaS startup with a competitive analysis",
+    "Write API documentation for a REST endpoint that creates user accounts",
+    "Hey, how are you doing today? Let's chat about weekend plans",
+    "Review this contract clause for liability and indemnification risks",
+    "What are the common symptoms and treatment options for type 2 diabetes?",
+]
+
+# API settings for load tests: every request reaches the mock upstream
+BENCH_API_ENV = {
+    "OPENROUTER_API_KEY": "benchmark",
+    "RESPONSE_CACHE_ENABLED": "false",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "SINGLEFLIGHT_ENABLED": "false",
+}
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """q-th quantile (0-1) of an already sorted, non-empty list"""
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(samples: List[float], scale: float = 1.0) -> Dict:
+    """Mean and p50/p90/p99/max of samples, multiplied by `scale`"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "mean": round(sum(ordered) / len(ordered) * scale, 4),
+        "p50": round(percentile(ordered, 0.50) * scale, 4),
+        "p90": round(percentile(ordered, 0.90) * scale, 4),
+        "p99": round(percentile(ordered, 0.99) * scale, 4),
+        "max": round(ordered[-1] * scale, 4),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ---------------------------------------------------------------------------
+# Microbenchmarks
+# ---------------------------------------------------------------------------
+
+def time_calls(func, args_list: List[tuple], iterations: int) -> Dict:
+    """Time `iterations` calls of func, cycling through args_list (nanoseconds per call)"""
+    for args in args_list:
+        func(*args)
+    samples = []
+    clock = time.perf_counter_ns
+    for i in range(iterations):
+        args = args_list[i % len(args_list)]
+        started = clock()
+        func(*args)
+        samples.append(clock() - started)
+    return {"iterations": iterations, "ns_per_call": summarize(samples)}
+
+
+def synthetic_results(models: int, response_words: int, failures: int = 0) -> List[Dict]:
+    """Model result dicts shaped like query_model_once output"""
+    text = " ".join(f"word{i % 97}" for i in range(response_words)) + "."
+    results = []
+    for i in range(models):
+        if i < failures:
+            results.append({
+                "model": f"mock/model-{i}", "response": "Error: HTTP 500", "tokens": 0, "success": False
+            })
+            continue
+        results.append({
+            "model": f"mock/model-{i}",
+            "success": True,
+            "response": text,
+            "tokens": response_words + 40,
+            "prompt_tokens": 40,
+            "completion_tokens": response_words,
+        })
+    return results
+
+
+def query_response_fields(results: List[Dict], compiled: Dict) -> Dict:
+    """QueryResponse fields as build_query_response assembles them"""
+    return {
+        "prompt": SAMPLE_PROMPTS[1],
+        "task_type": "code_generation",
+        "models_used": [r["model"] for r in results if r["success"]],
+        "responses": {r["model"]: r["response"] for r in results},
+        "synthesis": compiled["synthesis"],
+        "unified_document": compiled["document"],
+        "timestamp": datetime.now().isoformat(),
+        "total_tokens": sum(r["tokens"] for r in results),
+        "estimated_cost": compiled["estimated_cost"],
+        "cache_hits": 0,
+        "cache_misses": len(results),
+        "routing": {"mode": "quality", "candidates": len(results)},
+    }
+
+
+def upstream_body(completion_words: int) -> bytes:
+    """Raw chat-completion body as OpenRouter returns it"""
+    text = " ".join(f"word{i % 97}" for i in range(completion_words)) + "."
+    return json.dumps({
+        "id": "gen-benchmark",
+        "model": "mock/model-0",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 40, "completion_tokens": completion_words, "total_tokens": completion_words + 40},
+    }).encode("utf-8")
+
+
+def run_serialization_benchmarks(iterations: int, models: int = 5, completion_words: int = 2000) -> Dict:
+    """
+    Default vs fast JSON path for one /query at `models` x `completion_words` tokens
+
+    The default path mirrors FastAPI's handling of a `response_model`
+    route (build, re-validate the dumped model, encode with json) and
+    aiohttp's `response.json()` (decode to str, then parse). The fast path
+    is api.fast_json's: `model_construct`, orjson-rendered response and
+    orjson parsing straight from bytes. Fast entries are skipped when
+    orjson is not installed.
+    """
+    from fastapi.responses import JSONResponse
+    from api.fast_json import FastJSONResponse, orjson
+    from api.main import QueryResponse
+    from api.response_compiler import compile_responses
+
+    results = synthetic_results(models, completion_words)
+    fields = query_response_fields(results, compile_responses(SAMPLE_PROMPTS[1], "code_generation", results))
+    body = upstream_body(completion_words)
+
+    def default_response(fields: Dict) -> bytes:
+        response = QueryResponse(**fields)
+        content = QueryResponse.model_validate(response.model_dump())
+        return JSONResponse(content.model_dump(mode="json")).body
+
+    def fast_response(fields: Dict) -> bytes:
+        return FastJSONResponse(dict(QueryResponse.model_construct(**fields))).body
+
+    report = {
+        "query_response_default": time_calls(default_response, [(fields,)], iterations),
+        "upstream_decode_default": time_calls(lambda b: json.loads(b.decode("utf-8")), [(body,)], iterations),
+    }
+    if orjson is not None:
+        report["query_response_fast"] = time_calls(fast_response, [(fields,)], iterations)
+        report["upstream_decode_fast"] = time_calls(orjson.loads, [(body,)], iterations)
+    return report
+
+
+def fast_json_saving_us(micro: Dict, models: int = 5) -> float:
+    """CPU saved per /query by the fast JSON path (one response, `models` upstream decodes), p50 in us"""
+    def p50(name: str) -> float:
+        return micro[name]["ns_per_call"]["p50"] / 1000
+    return round(
+        p50("query_response_default") - p50("query_response_fast")
+        + models * (p50("upstream_decode_default") - p50("upstream_decode_fast")),
+        2
+    )
+
+
+def run_microbenchmarks(iterations: int) -> Dict:
+    """
+    detect_task_type over the sample prompts, compile_responses over
+    synthetic results and the default vs fast JSON serialization paths
+    """
+    from api.task_detector import detect_task_type
+    from api.response_compiler import compile_responses
+
+    long_prompts = [prompt + " " + " ".join(SAMPLE_PROMPTS) * 4 for prompt in SAMPLE_PROMPTS]
+    prompt = SAMPLE_PROMPTS[1]
+    return {
+        "detect_task_type": time_calls(detect_task_type, [(p,) for p in SAMPLE_PROMPTS], iterations),
+        "detect_task_type_long": time_calls(detect_task_type, [(p,) for p in long_prompts], iterations),
+        "compile_responses": time_calls(
+            compile_responses,
+            [(prompt, "code_generation", synthetic_results(5, 400))],
+            max(1, iterations // 10)
+        ),
+        "compile_responses_with_failures": time_calls(
+            compile_responses,
+            [(prompt, "code_generation", synthetic_results(5, 400, failures=2))],
+            max(1, iterations // 10)
+        ),
+        "compile_responses_no_document": time_calls(
+            lambda *args: compile_responses(*args, include_document=False),
+            [(prompt, "code_generation", synthetic_results(5, 400))],
+            max(1, iterations // 10)
+        ),
+        **run_serialization_benchmarks(max(1, iterations // 10)),
+    }
+
+
+# ---------------------------------------------------------------------------
+# End-to-end load test
+# ---------------------------------------------------------------------------
+
+def start_process(args: List[str], env: Dict) -> subprocess.Popen:
+    """Start a Python subprocess with stderr kept in a temporary file (a pipe could fill and block it)"""
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [sys.executable, *args], cwd=ROOT, env={**os.environ, **env},
+        stdout=subprocess.DEVNULL, stderr=log
+    )
+    process.log = log
+    return process
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    process.log.close()
+
+
+def ensure_port_free(port: int) -> None:
+    """Fail before starting a server whose port is taken (load would otherwise hit the other process)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("127.0.0.1", port))
+        except OSError:
+            raise RuntimeError(f"Port {port} is already in use; pass a free --mock-port/--api-port")
+
+
+def check_exited(process: subprocess.Popen, url: str) -> None:
+    if process.poll() is not None:
+        process.log.seek(0)
+        raise RuntimeError(f"{url} exited early: {process.log.read().decode(errors='replace')}")
+
+
+async def wait_until_ready(
+    session: aiohttp.ClientSession,
+    url: str,
+    process: subprocess.Popen,
+    is_expected: Callable[[Dict], bool]
+) -> None:
+    """Poll url until it answers 200 with a payload `is_expected` accepts, from our own live process"""
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        check_exited(process, url)
+        try:
+            async with session.get(url) as response:
+                payload = await response.json() if response.status == 200 else None
+        except (aiohttp.ClientError, ValueError):
+            payload = None
+        if isinstance(payload, dict) and is_expected(payload):
+            check_exited(process, url)
+            return
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+async def load_level(
+    session: aiohttp.ClientSession,
+    url: str,
+    concurrency: int,
+    requests: int,
+    body: Dict,
+    offset: int
+) -> Dict:
+    """Send `requests` POSTs to url with `concurrency` workers and summarize them"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = [0]
+
+    async def worker() -> None:
+        while next_index[0] < requests:
+            i = next_index[0]
+            next_index[0] += 1
+            payload = dict(body, prompt=f"{SAMPLE_PROMPTS[i % len(SAMPLE_PROMPTS)]} (request {offset + i})")
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as response:
+                    await response.read()
+                    status = str(response.status)
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": requests - statuses.get("200", 0),
+        "status_counts": statuses,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3),
+        "latency_ms": summarize(latencies, 1000),
+    }
+
+
+async def run_load_test(args: argparse.Namespace) -> Dict:
+    """Start the mock and the API as subprocesses and load /query at each concurrency level"""
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    ensure_port_free(args.mock_port)
+    ensure_port_free(args.api_port)
+    mock = start_process([
+        "-m", "benchmarks.mock_openrouter", "--port", str(args.mock_port),
+        "--config", args.profiles, "--time-scale", str(args.time_scale)
+    ], {})
+    api = start_process([
+        "-m", "uvicorn", "api.main:app", "--port", str(args.api_port), "--log-level", "warning"
+    ], {**BENCH_API_ENV, "OPENROUTER_BASE_URL": f"{mock_url}/api/v1/chat/completions"})
+
+    body = {"max_models": args.max_models, "response_mode": args.response_mode}
+    levels = []
+    timeout = aiohttp.ClientTimeout(total=None)
+    connector = aiohttp.TCPConnector(limit=0)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            # The mock's /stats maps model ids to call counters; the API's has pool and admission sections
+            await wait_until_ready(
+                session, f"{mock_url}/stats", mock,
+                lambda stats: all(isinstance(v, dict) and "calls" in v for v in stats.values())
+            )
+            await wait_until_ready(session, f"{api_url}/stats", api, lambda stats: {"pool", "admission"} <= set(stats))
+            offset = 0
+            for concurrency in args.concurrency:
+                # Warm the upstream pool and latency trackers before measuring
+                await load_level(session, f"{api_url}/query", concurrency, concurrency, body, offset)
+                offset += concurrency
+                level = await load_level(session, f"{api_url}/query", concurrency, args.requests, body, offset)
+                offset += args.requests
+                print(
+                    f"  concurrency {concurrency:>4}: {level['throughput_rps']:>8.2f} req/s  "
+                    f"p50 {level['latency_ms']['p50']:>9.1f} ms  p99 {level['latency_ms']['p99']:>9.1f} ms  "
+                    f"errors {level['errors']}"
+                )
+                levels.append(level)
+            async with session.get(f"{mock_url}/stats") as response:
+                upstream = await response.json()
+    finally:
+        stop_process(api)
+        stop_process(mock)
+
+    return {
+        "endpoint": "/query",
+        "request": body,
+        "time_scale": args.time_scale,
+        "profiles": os.path.relpath(args.profiles, ROOT),
+        "levels": levels,
+        "upstream_calls": upstream,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Universal OZ offline benchmarks")
+    parser.add_argument(
+        "--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 8, 32, 64],
+        help="Comma-separated concurrency levels (default: 1,8,32,64)"
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per concurrency level")
+    parser.add_argument("--max-models", type=int, default=5, help="Models queried per request (the `max_models` field)")
+    parser.add_argument("--response-mode", default="full", choices=["full", "document", "responses"])
+    parser.add_argument("--profiles", default=DEFAULT_PROFILES, help="Mock latency/error profile JSON")
+    parser.add_argument(
+        "--time-scale", type=float, default=0.1,
+        help="Multiplier for mock latencies (default: 0.1, ten times faster than the profiles)"
+    )
+    parser.add_argument("--mock-port", type=int, default=8899)
+    parser.add_argument("--api-port", type=int, default=8011)
+    parser.add_argument("--micro-iterations", type=int, default=20000)
+    parser.add_argument("--skip-load", action="store_true", help="Only run microbenchmarks")
+    parser.add_argument("--skip-micro", action="store_true", help="Only run the /query load test")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/bench-<time>.json)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    from api import __version__
+
+    started = datetime.now()
+    report = {
+        "meta": {
+            "timestamp": started.isoformat(timespec="seconds"),
+            "version": __version__,
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+    }
+    if not args.skip_micro:
+        print("Microbenchmarks")
+        report["micro"] = run_microbenchmarks(args.micro_iterations)
+        for name, result in report["micro"].items():
+            ns = result["ns_per_call"]
+            print(f"  {name:<34} p50 {ns['p50'] / 1000:>9.2f} us  p99 {ns['p99'] / 1000:>9.2f} us")
+        if "query_response_fast" in report["micro"]:
+            saving = fast_json_saving_us(report["micro"])
+            report["fast_json_saving_us"] = saving
+            print(f"  fast JSON path saves {saving:.2f} us CPU per 5 x 2000-token /query")
+    if not args.skip_load:
+        print("Load test: POST /query")
+        report["query"] = asyncio.run(run_load_test(args))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Test configuration
+Makes the `api` package importable and keeps module-level settings offline
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+
+class FakeResponse:
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self._body = body
+        self.headers = headers or {}
+
+    async def read(self):
+        return self._body
+
+    async def text(self):
+        return self._body.decode()
+
+    @property
+    def content(self):
+        return _aiter(self._body.splitlines(keepends=True))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """
+    Stand-in for the aiohttp session posting to OpenRouter
+
+    `handler(payload)` is awaited per call and returns (status, body dict),
+    optionally after sleeping; posted payloads are kept in `calls`.
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler or self.answer
+        self.calls = []
+
+    @staticmethod
+    async def answer(payload):
+        return 200, {
+            "choices": [{"message": {"content": f"answer from {payload['model']}"}}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 7, "total_tokens": 12},
+        }
+
+    def post(self, url, json=None, **kwargs):
+        self.calls.append(json)
+        return _FakeRequest(self, json)
+
+
+class _FakeRequest:
+    def __init__(self, session, payload):
+        self.session = session
+        self.payload = payload
+
+    async def _respond(self):
+        status, body = await self.session.handler(self.payload)
+        if status == 200 and self.payload.get("stream"):
+            # Replay the answer as OpenRouter SSE: one delta per word, then usage
+            words = body["choices"][0]["message"]["content"].split(" ")
+            chunks = [{"choices": [{"delta": {"content": word + " "}}]} for word in words]
+            chunks.append({"choices": [], "usage": body["usage"]})
+            sse = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+            return FakeResponse(status, sse.encode())
+        return FakeResponse(status, json.dumps(body).encode())
+
+    def __await__(self):
+        return self._respond().__await__()
+
+    async def __aenter__(self):
+        return await self._respond()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    """Route /query upstream calls to a FakeSession, with the shared-result caches off"""
+    from api import main
+
+    session = FakeSession()
+
+    async def get_session():
+        return session
+
+    monkeypatch.setattr(main, "get_session", get_session)
+    monkeypatch.setattr(main.response_cache, "enabled", False)
+    monkeypatch.setattr(main, "SINGLEFLIGHT_ENABLED", False)
+    return session
@@ -0,0 +1,179 @@
+"""
+Admission control: guaranteed shares, priority ordering and load shedding
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from api.admission import AdmissionController, AdmissionRejected, hold_while_streaming
+
+SHARES = {"interactive": 0.6, "standard": 0.3, "batch": 0.1}
+
+
+def controller(max_concurrent, **kwargs):
+    kwargs.setdefault("shares", SHARES)
+    kwargs.setdefault("key_tiers", {})
+    return AdmissionController(max_concurrent=max_concurrent, **kwargs)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 10])
+def test_guarantees_fit_within_the_limit(limit):
+    guaranteed = controller(limit).guaranteed
+    assert sum(guaranteed.values()) <= limit
+    assert guaranteed["interactive"] >= 1
+
+
+def test_oversubscribed_shares_are_scaled_down():
+    guaranteed = controller(10, shares={"interactive": 1.0, "standard": 1.0}).guaranteed
+    assert guaranteed == {"interactive": 5, "standard": 5, "batch": 0}
+
+
+def test_batch_flood_leaves_headroom_for_interactive():
+    async def scenario():
+        admission = controller(10)
+        # One guaranteed slot, plus borrowing until half of the 9 unused higher guarantees remain
+        for _ in range(6):
+            await admission.acquire("batch")
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(admission.acquire("batch"), 0.01)
+        # Interactive requests start at once despite the flood
+        await asyncio.wait_for(admission.acquire("interactive"), 0.01)
+        return admission.stats()["classes"]
+
+    classes = asyncio.run(scenario())
+    assert classes["batch"]["in_flight"] == 6
+    assert classes["interactive"]["in_flight"] == 1
+
+
+def test_strict_reservation_keeps_guarantees_free():
+    async def scenario():
+        admission = controller(10, reserved_fraction=1.0)
+        await admission.acquire("batch")
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(admission.acquire("batch"), 0.01)
+
+    asyncio.run(scenario())
+
+
+def test_freed_slot_goes_to_highest_waiting_class():
+    async def scenario():
+        admission = controller(1)
+        await admission.acquire("standard")
+        order = []
+
+        async def waiter(priority):
+            await admission.acquire(priority)
+            order.append(priority)
+            admission.release(priority)
+
+        tasks = [asyncio.ensure_future(waiter(c)) for c in ("batch", "standard", "interactive")]
+        await asyncio.sleep(0.01)
+        assert admission.stats()["running"] == 1
+        admission.release("standard")
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "standard", "batch"]
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        admission = controller(1, queue_limits={"interactive": 1, "standard": 1, "batch": 1})
+        await admission.acquire("standard")
+        queued = asyncio.ensure_future(admission.acquire("standard"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("standard")
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        return rejected.value, admission.stats()["classes"]["standard"]
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.reason == "queue_full"
+    assert rejected.retry_after >= 1
+    assert stats["shed"] == 1
+    assert stats["queued"] == 0
+
+
+def test_projected_wait_past_deadline_is_shed():
+    async def scenario():
+        admission = controller(1)
+        admission.service_time = 10
+        await admission.acquire("interactive")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("interactive", remaining=1)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "deadline"
+    assert rejected.retry_after >= 10
+
+
+def test_streamed_ticket_released_once():
+    async def scenario():
+        admission = controller(1)
+        ticket = await admission.admit("standard")
+
+        async def body():
+            yield b"a"
+            yield b"b"
+
+        chunks = [chunk async for chunk in hold_while_streaming(ticket, body())]
+        ticket.release()
+        return chunks, admission.stats()
+
+    chunks, stats = asyncio.run(scenario())
+    assert chunks == [b"a", b"b"]
+    assert stats["running"] == 0
+    assert stats["classes"]["standard"]["in_flight"] == 0
+
+
+def test_disabled_controller_admits_everything():
+    async def scenario():
+        admission = controller(0)
+        assert await admission.admit("batch") is None
+        async with admission.admitted("batch"):
+            pass
+
+    asyncio.run(scenario())
+
+
+def test_durable_work_waits_instead_of_being_shed():
+    async def scenario():
+        admission = controller(1, queue_limits={"interactive": 1, "standard": 1, "batch": 1})
+        admission.service_time = 10
+        await admission.acquire("batch")
+        queued = asyncio.ensure_future(admission.acquire("batch"))
+        await asyncio.sleep(0)
+        # Queue full and a long projected wait, yet a job queues rather than failing
+        durable = asyncio.ensure_future(admission.acquire("batch", remaining=60, shed=False))
+        await asyncio.sleep(0)
+        assert not durable.done()
+        admission.release("batch")
+        await queued
+        admission.release("batch")
+        await asyncio.wait_for(durable, 1)
+        return admission.stats()["classes"]["batch"]
+
+    stats = asyncio.run(scenario())
+    assert stats["shed"] == 0
+    assert stats["in_flight"] == 1
+
+
+def test_collected_ticket_is_released_on_its_loop():
+    async def scenario():
+        admission = controller(1)
+        threads = []
+        release = admission.release
+        admission.release = lambda *args: threads.append(threading.get_ident()) or release(*args)
+        box = [await admission.admit("standard")]
+        # Drop the last reference on a worker thread, as a GC pass there would
+        await asyncio.to_thread(box.clear)
+        await asyncio.sleep(0)
+        return threads, admission.stats()["running"]
+
+    threads, running = asyncio.run(scenario())
+    assert threads == [threading.get_ident()]
+    assert running == 0
@@ -0,0 +1,62 @@
+"""
+/query/batch parsing and per-item options
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from api import main
+from api.batch import BatchParseError, parse_batch_body
+
+
+def post_batch(body, content_type="application/json"):
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=10) as client:
+            return await client.post("/query/batch", content=body, headers={"content-type": content_type})
+
+    return asyncio.run(scenario())
+
+
+def test_parse_ndjson_and_array_bodies():
+    assert parse_batch_body(b'{"prompt": "a"}\n\n{"prompt": "b"}\n', "application/x-ndjson") == [
+        {"prompt": "a"}, {"prompt": "b"}
+    ]
+    assert parse_batch_body(b'{"requests": [{"prompt": "a"}]}', "application/json") == [{"prompt": "a"}]
+
+
+@pytest.mark.parametrize("body", [b"\xff\xfe", b"[]", b'{"prompt": "a"}', b"not json"])
+def test_unparseable_bodies_are_rejected(body):
+    with pytest.raises(BatchParseError):
+        parse_batch_body(body, "application/json")
+
+
+def test_non_utf8_body_is_a_400():
+    response = post_batch(b"\xff\xfe")
+    assert response.status_code == 400
+    assert "UTF-8" in response.json()["detail"]
+
+
+def test_item_completion_policy_is_validated_and_honoured(fake_upstream):
+    async def answer(payload):
+        # The second model is slow; first_k=1 must not wait for it
+        if payload["model"] == fake_upstream.slow_model:
+            await asyncio.sleep(5)
+        return await fake_upstream.answer(payload)
+
+    fake_upstream.handler = answer
+    models, _ = main.select_models(main.QueryRequest(prompt="x", max_models=2), "code_generation")
+    fake_upstream.slow_model = models[1].id
+    items = [
+        {"prompt": "x", "task_type": "code_generation", "max_models": 2, "completion_policy": "first_k", "min_responses": 1},
+        {"prompt": "x", "task_type": "code_generation", "completion_policy": "bogus"},
+        {"prompt": "x", "task_type": "code_generation", "completion_policy": "first_k"},
+    ]
+    response = post_batch(json.dumps(items).encode())
+    lines = {line["index"]: line for line in map(json.loads, response.text.splitlines())}
+    assert lines[0]["models_used"] == [models[0].id]
+    assert "Unknown completion_policy" in lines[1]["error"]
+    assert "min_responses is required" in lines[2]["error"]
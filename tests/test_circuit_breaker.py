@@ -0,0 +1,48 @@
+"""
+Per-model circuit breakers
+"""
+
+from api.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, recovery_seconds=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_admits_limited_probes():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=0, half_open_max_calls=1)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    # A cancelled probe hands its slot back
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_probe_outcome_closes_or_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
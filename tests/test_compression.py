@@ -0,0 +1,138 @@
+"""
+Accept-Encoding negotiation, buffered and streaming compression, and ETags
+"""
+
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+from api.compression import CompressionMiddleware, ResponseCompressor
+from api.main import etag_matches
+
+
+def gzip_only(**kwargs):
+    return ResponseCompressor(enabled=True, encodings=["gzip"], **kwargs)
+
+
+def call(app, accept_encoding="gzip"):
+    """Run one GET through `app` and return the sent messages"""
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def buffered_app(body, status=200, headers=()):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+def headers_of(start):
+    return {k.decode(): v.decode() for k, v in start["headers"]}
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*;q=0", None),
+    ("identity", None),
+    ("br;q=1.0, gzip;q=0.5", "gzip"),
+    ("GZIP ; q=0.8", "gzip"),
+    ("gzip;q=bogus", None),
+])
+def test_negotiate(header, expected):
+    assert gzip_only().negotiate(header) == expected
+
+
+def test_negotiate_prefers_highest_quality_then_server_order():
+    compressor = ResponseCompressor(enabled=True, encodings=["gzip"])
+    compressor.encodings = ["br", "gzip"]
+    assert compressor.negotiate("gzip;q=0.9, br;q=0.5") == "gzip"
+    assert compressor.negotiate("gzip, br") == "br"
+
+
+def test_small_buffered_response_is_sent_as_is():
+    body = b'{"ok": true}'
+    compressor = gzip_only(min_size=1024)
+    start, message = call(CompressionMiddleware(buffered_app(body), compressor))
+    assert "content-encoding" not in headers_of(start)
+    assert message["body"] == body
+    assert compressor.skipped_small == 1
+
+
+def test_large_buffered_response_is_compressed_with_weak_etag():
+    body = b'{"data": "' + b"x" * 4096 + b'"}'
+    app = buffered_app(body, headers=[(b"etag", b'"abc"')])
+    start, message = call(CompressionMiddleware(app, gzip_only(min_size=1024)))
+    headers = headers_of(start)
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert headers["etag"] == 'W/"abc"'
+    assert int(headers["content-length"]) == len(message["body"])
+    assert gzip.decompress(message["body"]) == body
+
+
+def test_uncompressed_response_keeps_strong_etag():
+    app = buffered_app(b"{}" * 1000, headers=[(b"etag", b'"abc"')])
+    start, _ = call(CompressionMiddleware(app, gzip_only()), accept_encoding="identity")
+    assert headers_of(start)["etag"] == '"abc"'
+
+
+def test_not_modified_to_encoding_client_has_weak_etag():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 304, "headers": [(b"etag", b'"abc"')]})
+        await send({"type": "http.response.body", "body": b""})
+
+    start, _ = call(CompressionMiddleware(app, gzip_only()))
+    assert headers_of(start)["etag"] == 'W/"abc"'
+    assert "content-encoding" not in headers_of(start)
+
+
+def test_stream_chunks_decode_as_they_arrive():
+    events = [f"data: event {i}\n\n".encode() for i in range(5)]
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        for event in events:
+            await send({"type": "http.response.body", "body": event, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    compressor = gzip_only()
+    start, *bodies = call(CompressionMiddleware(app, compressor))
+    assert headers_of(start)["content-encoding"] == "gzip"
+    decoder = zlib.decompressobj(31)
+    # Every event is fully decodable as soon as its chunk arrives
+    for event, message in zip(events, bodies):
+        assert message["more_body"] is True
+        assert decoder.decompress(message["body"]) == event
+    decoder.decompress(bodies[-1]["body"])
+    assert decoder.eof
+    assert compressor.stats()["encodings"]["gzip"]["responses"] == 1
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", W/"abc"', True),
+    ("*", True),
+    ('"other"', False),
+    (None, False),
+])
+def test_etag_matches_uses_weak_comparison(header, matches):
+    assert etag_matches(header, '"abc"') is matches
@@ -0,0 +1,73 @@
+"""
+The orjson fast path must return the same /query body as the validated path
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from api import fast_json, main
+from api.response_compiler import calculate_cost
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("orjson")
+
+
+def fake_hedged(session, model_id, prompt, max_tokens, temperature):
+    async def call():
+        return {
+            "model": model_id,
+            "response": f"Answer from {model_id}: été ✓ \"quoted\"\n- item",
+            "tokens": 42,
+            "success": True,
+        }
+    return call()
+
+
+def post_query(payload):
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/query", json=payload)
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    body = response.json()
+    body.pop("timestamp")
+    return body
+
+
+@pytest.mark.parametrize("payload", [
+    {"prompt": "Write a python function that sorts a list"},
+    {"prompt": "Write a python function that sorts a list", "response_mode": "document"},
+    {"prompt": "Write a python function that sorts a list", "response_mode": "responses"},
+    {"prompt": "Write a python function that sorts a list", "routing_mode": "adaptive", "max_models": 2},
+])
+def test_fast_path_matches_validated_path(monkeypatch, payload):
+    monkeypatch.setattr(main, "query_model_hedged", fake_hedged)
+    monkeypatch.setattr(main, "SINGLEFLIGHT_ENABLED", False)
+    monkeypatch.setattr(main.response_cache, "enabled", False)
+
+    monkeypatch.setattr(main, "fast_json_active", False)
+    monkeypatch.setattr(fast_json, "fast_json_active", False)
+    validated = post_query(payload)
+
+    rendered = []
+    render = fast_json.FastJSONResponse.render
+    monkeypatch.setattr(fast_json.FastJSONResponse, "render", lambda self, content: rendered.append(1) or render(self, content))
+    monkeypatch.setattr(main, "fast_json_active", True)
+    monkeypatch.setattr(fast_json, "fast_json_active", True)
+    fast = post_query(payload)
+
+    assert rendered, "the fast path was not taken"
+    assert fast == validated
+    # Same JSON types too, not only equal Python values (1 == 1.0)
+    assert {k: type(v) for k, v in fast.items()} == {k: type(v) for k, v in validated.items()}
+    assert json.dumps(fast, sort_keys=True) == json.dumps(validated, sort_keys=True)
+
+
+def test_empty_fan_out_cost_is_a_float():
+    assert type(calculate_cost([])) is float
+    # orjson writes an int 0 as `0`; the validated path would have coerced it to 0.0
+    assert fast_json.FastJSONResponse({"estimated_cost": calculate_cost([])}).body == b'{"estimated_cost":0.0}'
@@ -0,0 +1,82 @@
+"""
+Hedged upstream calls: latency accounting and the cost of the duplicate
+"""
+
+import asyncio
+
+import pytest
+
+from api import main
+from api.model_stats import HedgeBudget, LatencyTracker
+from api.response_compiler import call_cost
+from api.usage_ledger import UsageLedger
+
+MODEL = "qwen/qwen-2.5-coder-32b"
+
+
+@pytest.fixture
+def hedging(monkeypatch, fake_upstream):
+    """Hedge after ~20 ms, with budget for every call"""
+    tracker = LatencyTracker()
+    for _ in range(main.HEDGE_MIN_SAMPLES):
+        tracker.record(MODEL, 0.02)
+    monkeypatch.setattr(main, "latency_tracker", tracker)
+    monkeypatch.setattr(main, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(main, "hedge_budget", HedgeBudget(ratio=1.0, burst=5))
+    return tracker
+
+
+def run_hedged(session):
+    return asyncio.run(main.query_model_hedged(session, MODEL, "prompt", 100, 0.7))
+
+
+def test_slow_primary_is_hedged_and_its_elapsed_time_recorded(hedging, fake_upstream):
+    delays = [0.3, 0.0]
+
+    async def answer(payload):
+        await asyncio.sleep(delays.pop(0))
+        return await fake_upstream.answer(payload)
+
+    fake_upstream.handler = answer
+    result = run_hedged(fake_upstream)
+
+    assert result["success"] is True
+    assert len(fake_upstream.calls) == 2
+    # The cancelled primary still bills like the winner
+    assert result["hedge_usage"] == {"tokens": 12, "prompt_tokens": 5, "completion_tokens": 7}
+    # Besides the fast winner, the abandoned primary enters the window with at least the hedge delay
+    new_samples = sorted(list(hedging._samples[MODEL])[main.HEDGE_MIN_SAMPLES:])
+    assert len(new_samples) == 2
+    assert new_samples[0] < 0.02 <= new_samples[1]
+
+
+def test_fast_primary_is_not_hedged(hedging, fake_upstream):
+    result = run_hedged(fake_upstream)
+    assert len(fake_upstream.calls) == 1
+    assert "hedge_usage" not in result
+
+
+def test_failed_hedge_costs_nothing_extra(hedging, fake_upstream):
+    async def answer(payload):
+        if len(fake_upstream.calls) == 1:
+            await asyncio.sleep(0.1)
+            return await fake_upstream.answer(payload)
+        return 500, {"error": "down"}
+
+    fake_upstream.handler = answer
+    result = run_hedged(fake_upstream)
+    assert result["success"] is True
+    assert "hedge_usage" not in result
+
+
+def test_hedge_usage_is_costed_and_ledgered():
+    result = {"model": MODEL, "response": "x", "success": True, "tokens": 12, "prompt_tokens": 5, "completion_tokens": 7}
+    hedged = {**result, "hedge_usage": {"tokens": 12, "prompt_tokens": 5, "completion_tokens": 7}}
+    assert call_cost(hedged) == pytest.approx(2 * call_cost(result))
+
+    ledger = UsageLedger()
+    ledger.record("key-A", "code_generation", [hedged])
+    total = ledger.usage("key-A")["total"]
+    assert total["calls"] == 1
+    assert total["total_tokens"] == 24
+    assert total["prompt_tokens"] == 10
@@ -0,0 +1,113 @@
+"""
+Background jobs: long-polling, progress and restart recovery
+"""
+
+import asyncio
+
+from api.jobs import JobManager
+
+
+def make_runner(gate: asyncio.Event, calls: list):
+    async def runner(request, finished, on_plan, on_result):
+        calls.append(dict(finished))
+        on_plan("code_generation", ["mock/a", "mock/b"])
+        if "mock/a" not in finished:
+            on_result({"model": "mock/a", "success": True, "response": "A", "tokens": 1})
+        await gate.wait()
+        on_result({"model": "mock/b", "success": True, "response": "B", "tokens": 1})
+        return {"prompt": request["prompt"], "unified_document": "doc"}
+    return runner
+
+
+def test_long_poll_waits_for_finish_and_cleans_up(tmp_path):
+    async def scenario():
+        gate, calls = asyncio.Event(), []
+        manager = JobManager(str(tmp_path / "jobs.db"), workers=1)
+        await manager.start(make_runner(gate, calls))
+        try:
+            job_id = await manager.submit({"prompt": "p"}, "client")
+            poll = asyncio.ensure_future(manager.get(job_id, wait=5))
+            await asyncio.sleep(0.05)
+            assert not poll.done()
+            gate.set()
+            job = await poll
+            assert job["status"] == "succeeded"
+            assert job["result"]["unified_document"] == "doc"
+            assert manager._events == {} and manager._waiters == {}
+        finally:
+            await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_since_returns_on_next_change(tmp_path):
+    async def scenario():
+        gate, calls = asyncio.Event(), []
+        manager = JobManager(str(tmp_path / "jobs.db"), workers=1)
+        await manager.start(make_runner(gate, calls))
+        try:
+            job_id = await manager.submit({"prompt": "p"}, "client")
+            first = await manager.get(job_id)
+            changed = await manager.get(job_id, since=first["version"], wait=5)
+            assert changed["version"] > first["version"]
+            assert changed["status"] != "succeeded"
+            gate.set()
+            assert (await manager.get(job_id, wait=5))["status"] == "succeeded"
+        finally:
+            await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_polling_unknown_and_finished_jobs_leaves_no_events(tmp_path):
+    async def scenario():
+        gate, calls = asyncio.Event(), []
+        gate.set()
+        manager = JobManager(str(tmp_path / "jobs.db"), workers=1)
+        await manager.start(make_runner(gate, calls))
+        try:
+            for i in range(20):
+                assert await manager.get(f"missing-{i}", wait=1) is None
+            job_id = await manager.submit({"prompt": "p"}, "client")
+            await manager.get(job_id, wait=5)
+            for _ in range(5):
+                assert (await manager.get(job_id, wait=1))["status"] == "succeeded"
+            # A poll that times out also releases its event
+            assert (await manager.get(job_id, since=10**6, wait=0.05))["status"] == "succeeded"
+            assert manager._events == {} and manager._waiters == {}
+        finally:
+            await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_interrupted_job_resumes_with_saved_results(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def first_run():
+        gate, calls = asyncio.Event(), []
+        manager = JobManager(path, workers=1)
+        await manager.start(make_runner(gate, calls))
+        job_id = await manager.submit({"prompt": "p"}, "client")
+        job = await manager.get(job_id)
+        while job["completed_models"] < 1:
+            job = await manager.get(job_id, since=job["version"], wait=5)
+        await manager.stop()
+        return job_id
+
+    async def second_run(job_id):
+        gate, calls = asyncio.Event(), []
+        gate.set()
+        manager = JobManager(path, workers=1)
+        await manager.start(make_runner(gate, calls))
+        try:
+            job = await manager.get(job_id, wait=5)
+        finally:
+            await manager.stop()
+        return job, calls
+
+    job_id = asyncio.run(first_run())
+    job, calls = asyncio.run(second_run(job_id))
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 2
+    assert list(calls[0]) == ["mock/a"]
@@ -0,0 +1,32 @@
+"""
+Prometheus exposition of pipeline metrics
+"""
+
+import asyncio
+
+from api.metrics import PipelineMetrics
+from api import rate_limiter as rate_limiter_module
+from api.rate_limiter import RateLimiter
+
+
+def test_rate_limiter_queue_and_wait_are_exported(monkeypatch):
+    metrics = PipelineMetrics(enabled=True)
+    monkeypatch.setattr(rate_limiter_module, "pipeline_metrics", metrics)
+
+    async def scenario():
+        limiter = RateLimiter(rps=100, segment=None)
+        limiter.global_requests.tokens = 0
+        await asyncio.gather(*[limiter.acquire("mock/model", 1, client) for client in ("a", "b")])
+
+    asyncio.run(scenario())
+    text = metrics.render()
+    assert "# TYPE uoz_rate_limit_queue_depth gauge" in text
+    assert "uoz_rate_limit_queue_depth 0" in text
+    assert "uoz_rate_limit_wait_seconds_count 2" in text
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = PipelineMetrics(enabled=False)
+    metrics.record_rate_limit_queue(3)
+    metrics.observe_rate_limit_wait(0.5)
+    assert "uoz_rate_limit_queue_depth 3" not in metrics.render()
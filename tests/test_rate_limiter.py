@@ -0,0 +1,56 @@
+"""
+Upstream rate limiting: token estimates and per-client fair queueing
+"""
+
+import asyncio
+
+import httpx
+
+from api import main
+from api.rate_limiter import RATE_LIMIT_DEFAULT_MAX_TOKENS, RateLimiter, estimate_tokens
+
+
+def post(path, payload):
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=10) as client:
+            return await client.post(path, json=payload)
+
+    return asyncio.run(scenario())
+
+
+def test_unset_max_tokens_uses_the_default_budget():
+    assert estimate_tokens("x" * 40, None) == 10 + RATE_LIMIT_DEFAULT_MAX_TOKENS
+    assert estimate_tokens("x" * 40, 100) == 110
+
+
+def test_null_max_tokens_is_accepted(fake_upstream):
+    response = post("/query", {"prompt": "Write a python function", "max_tokens": None, "max_models": 2})
+    assert response.status_code == 200
+    assert len(response.json()["models_used"]) == 2
+    # The upstream still gets null, so the model's own default applies
+    assert all(call["max_tokens"] is None for call in fake_upstream.calls)
+
+
+def test_null_max_tokens_with_adaptive_routing(fake_upstream):
+    response = post("/query", {"prompt": "Write a python function", "max_tokens": None, "routing_mode": "adaptive"})
+    assert response.status_code == 200
+
+
+def test_queued_calls_are_granted_round_robin_across_clients():
+    async def scenario():
+        limiter = RateLimiter(rps=200, segment=None)
+        order = []
+
+        async def call(client):
+            await limiter.acquire("mock/model", 1, client)
+            order.append(client)
+
+        # Empty the burst so every call below has to queue
+        limiter.global_requests.tokens = 0
+        calls = [call("greedy") for _ in range(4)] + [call("polite")]
+        await asyncio.gather(*calls)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order.index("polite") <= 1
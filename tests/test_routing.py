@@ -0,0 +1,41 @@
+"""
+Model selection for a request
+"""
+
+import pytest
+from fastapi import HTTPException
+
+from api.main import QueryRequest, select_models
+from api.model_router import get_top_model_records, get_top_models
+
+
+def test_max_models_limits_static_fan_out():
+    models, routing = select_models(QueryRequest(prompt="hi", max_models=2), "code_generation")
+    assert len(models) == 2
+    assert routing is None
+
+
+def test_default_fan_out_is_five():
+    models, _ = select_models(QueryRequest(prompt="hi"), "code_generation")
+    assert len(models) == 5
+
+
+def test_max_models_limits_adaptive_fan_out():
+    models, routing = select_models(
+        QueryRequest(prompt="hi", routing_mode="adaptive", max_models=3), "code_generation"
+    )
+    assert len(models) == 3
+    assert routing is not None
+
+
+def test_max_models_must_be_positive():
+    with pytest.raises(HTTPException) as error:
+        select_models(QueryRequest(prompt="hi", max_models=0), "code_generation")
+    assert error.value.status_code == 400
+
+
+def test_get_top_models_keeps_registry_dict_shape():
+    models = get_top_models("code_generation", limit=2)
+    assert [type(model) for model in models] == [dict, dict]
+    assert {"id", "name", "cost_per_m", "specialization"} <= set(models[0])
+    assert [model["id"] for model in models] == [record.id for record in get_top_model_records("code_generation", 2)]
@@ -0,0 +1,64 @@
+"""
+Semantic cache matching, partitioning and memory bounds
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from api.semantic_cache import SemanticCache
+
+KEY = ("research", ("mock/a", "mock/b"), 2000, 0.7, True, "full")
+
+
+def make_cache(**kwargs):
+    return SemanticCache(enabled=True, dim=1024, **kwargs)
+
+
+def test_paraphrase_hits_and_unrelated_prompt_misses():
+    cache = make_cache(threshold=0.6)
+    cache.store(KEY, "Explain how photosynthesis works in plants", {"answer": 1})
+    payload, prompt, score = cache.lookup(KEY, "how does photosynthesis work in plants?")
+    assert payload == {"answer": 1}
+    assert prompt == "Explain how photosynthesis works in plants"
+    assert score >= 0.6
+    assert cache.lookup(KEY, "Write a SQL query joining orders and customers") is None
+
+
+def test_hits_never_cross_model_sets():
+    cache = make_cache()
+    cache.store(KEY, "Explain how photosynthesis works in plants", {"answer": 1})
+    other_models = (KEY[0], ("mock/c",)) + KEY[2:]
+    assert cache.lookup(other_models, "Explain how photosynthesis works in plants") is None
+
+
+def test_partition_capacity_evicts_least_recently_used_entry():
+    cache = make_cache(capacity=40)
+    prompts = [f"question number {i} about topic{i} and subject{i * 7}" for i in range(41)]
+    for i, prompt in enumerate(prompts[:40]):
+        cache.store(KEY, prompt, {"i": i})
+    cache.lookup(KEY, prompts[0])
+    cache.store(KEY, prompts[40], {"i": 40})
+    assert cache.stats()["entries"] == 40
+    assert cache.lookup(KEY, prompts[0])[0] == {"i": 0}
+    # prompts[1] was the least recently used entry when prompts[40] arrived
+    result = cache.lookup(KEY, prompts[1])
+    assert result is None or result[0] != {"i": 1}
+
+
+def test_partition_count_is_bounded():
+    cache = make_cache(max_partitions=4)
+    for max_tokens in range(100):
+        cache.store(("research", (), max_tokens, 0.7, True, "full"), "same prompt", {"t": max_tokens})
+    stats = cache.stats()
+    assert stats["partitions"] == 4
+    assert stats["partitions_evicted"] == 96
+    assert cache.lookup(("research", (), 99, 0.7, True, "full"), "same prompt")[0] == {"t": 99}
+    assert cache.lookup(("research", (), 0, 0.7, True, "full"), "same prompt") is None
+
+
+def test_partitions_allocate_lazily():
+    cache = make_cache(capacity=1000)
+    cache.store(KEY, "one prompt", {})
+    partition = cache._partitions[KEY]
+    assert len(partition.vectors) < 1000
@@ -0,0 +1,142 @@
+"""
+Single-flight coalescing and its interaction with request deadlines
+"""
+
+import asyncio
+import contextvars
+import time
+
+import pytest
+
+from api import main
+from api.request_context import current_client, remaining_seconds, request_deadline
+from api.singleflight import SingleFlight
+
+
+def run_in_context(coro, deadline_seconds=None, client=None):
+    """Start `coro` as a task in a fresh context, as a separate request would be"""
+    context = contextvars.Context()
+    if deadline_seconds is not None:
+        context.run(request_deadline.set, time.monotonic() + deadline_seconds)
+    if client is not None:
+        context.run(current_client.set, client)
+    return context.run(asyncio.ensure_future, coro)
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(flight.do("k", factory), flight.do("k", factory))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True]
+    assert all(value == "result" for value, _ in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_shared_call_does_not_inherit_leader_deadline():
+    flight = SingleFlight()
+    seen = {}
+
+    async def factory():
+        seen["deadline"] = request_deadline.get()
+        return "ok"
+
+    async def scenario():
+        return await run_in_context(flight.do("k", factory), deadline_seconds=5, client="leader")
+
+    assert asyncio.run(scenario()) == ("ok", False)
+    assert seen == {"deadline": None}
+
+
+def test_shared_upstream_call_keeps_the_client_identity(monkeypatch):
+    seen = []
+
+    async def fake_hedged(session, model_id, prompt, max_tokens, temperature):
+        seen.append((current_client.get(), request_deadline.get()))
+        return {"model": model_id, "response": "answer", "tokens": 3, "success": True}
+
+    monkeypatch.setattr(main, "query_model_hedged", fake_hedged)
+    monkeypatch.setattr(main, "SINGLEFLIGHT_ENABLED", True)
+    monkeypatch.setattr(main.response_cache, "enabled", False)
+
+    async def scenario():
+        query = main.query_model(None, "mock/model", "prompt", 100, 0.7)
+        return await run_in_context(query, deadline_seconds=5, client="key-A")
+
+    assert asyncio.run(scenario())["success"] is True
+    # The rate limiter inside the shared call queues it as key-A, without key-A's deadline
+    assert seen == [("key-A", None)]
+
+
+def test_short_timeout_leaves_shared_call_running_for_others():
+    flight = SingleFlight()
+
+    async def factory():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def scenario():
+        short = asyncio.ensure_future(flight.do("k", factory, timeout=0.02))
+        await asyncio.sleep(0)
+        patient = asyncio.ensure_future(flight.do("k", factory))
+        with pytest.raises(asyncio.TimeoutError):
+            await short
+        return await patient
+
+    assert asyncio.run(scenario()) == ("done", True)
+
+
+def test_last_waiter_timing_out_cancels_shared_call():
+    flight = SingleFlight()
+    cancelled = []
+
+    async def factory():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("k", factory, timeout=0.01)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_no_deadline_caller_unaffected_by_short_deadline_leader(monkeypatch):
+    async def fake_hedged(session, model_id, prompt, max_tokens, temperature):
+        await asyncio.sleep(0.1)
+        if remaining_seconds() == 0:
+            return main.deadline_exceeded_result(model_id)
+        return {"model": model_id, "response": "answer", "tokens": 3, "success": True}
+
+    monkeypatch.setattr(main, "query_model_hedged", fake_hedged)
+    monkeypatch.setattr(main, "SINGLEFLIGHT_ENABLED", True)
+    monkeypatch.setattr(main.response_cache, "enabled", False)
+
+    async def scenario():
+        query = lambda: main.query_model(None, "mock/model", "same prompt", 100, 0.7)
+        leader = run_in_context(query(), deadline_seconds=0.04)
+        await asyncio.sleep(0)
+        follower = run_in_context(query())
+        return await leader, await follower
+
+    leader, follower = asyncio.run(scenario())
+    assert leader["success"] is False
+    assert leader["response"] == "Error: request deadline exceeded"
+    assert follower["success"] is True
+    assert follower["response"] == "answer"
+    assert follower["coalesced"] is True
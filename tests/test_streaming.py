@@ -0,0 +1,59 @@
+"""
+/query/stream always terminates, and failed calls give back breaker probe slots
+"""
+
+import asyncio
+
+import httpx
+
+from api import main
+from api.circuit_breaker import CircuitBreaker, HALF_OPEN
+
+
+def stream_events(payload):
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await asyncio.wait_for(client.post("/query/stream", json=payload), 5)
+            return response.status_code, response.text
+
+    status, text = asyncio.run(scenario())
+    return status, [line[len("event: "):] for line in text.splitlines() if line.startswith("event: ")]
+
+
+def test_stream_finishes_when_a_model_call_raises(monkeypatch):
+    async def broken(session, model_id, prompt, max_tokens, temperature, queue):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "query_model_stream", broken)
+    status, events = stream_events({"prompt": "Write a python function", "max_models": 2})
+    assert status == 200
+    assert events == ["start", "model_done", "model_done", "done"]
+
+
+def test_stream_with_null_max_tokens(fake_upstream):
+    status, events = stream_events({"prompt": "Write a python function", "max_tokens": None, "max_models": 1})
+    assert status == 200
+    assert events[0] == "start" and "token" in events
+    assert events[-2:] == ["model_done", "done"]
+
+
+def test_probe_slot_returned_when_the_call_cannot_be_built(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=0)
+    breaker.record_failure()
+    assert not breaker.is_open() and breaker.state == HALF_OPEN
+    monkeypatch.setattr(main.circuit_breakers, "enabled", True)
+    monkeypatch.setattr(main.circuit_breakers, "get", lambda model_id: breaker)
+
+    def broken_payload(*args, **kwargs):
+        raise ValueError("bad payload")
+
+    monkeypatch.setattr(main, "build_payload", broken_payload)
+
+    async def scenario():
+        return await main.query_model_stream(None, "mock/model", "prompt", 10, 0.7, asyncio.Queue())
+
+    result = asyncio.run(scenario())
+    assert result["success"] is False
+    # The failed probe is settled instead of holding the only probe slot forever
+    assert breaker.probes == 0
@@ -0,0 +1,65 @@
+"""
+Task classification engines
+"""
+
+import pytest
+
+from api.task_classifier import KeywordClassifier
+from api.task_detector import detect_task_type
+
+PROMPTS = [
+    "Write a Python function that merges overlapping intervals",
+    "Write a blog post about remote work productivity tips",
+    "Analyze this quarterly sales data and find the main trends",
+    "Review this contract clause for liability and indemnification risks",
+    "What are the common symptoms of type 2 diabetes?",
+    "Write a short story about a lighthouse keeper",
+]
+
+TRAINING = [
+    ("Write a Python function to parse JSON", "code_generation"),
+    ("Fix the bug in this JavaScript code", "code_generation"),
+    ("Implement a binary search in Rust", "code_generation"),
+    ("Write a blog post about healthy eating", "content_generation"),
+    ("Draft a newsletter article on travel", "content_generation"),
+    ("Write marketing copy for a new phone", "content_generation"),
+    ("Review this contract for liability", "legal"),
+    ("Is this NDA clause enforceable", "legal"),
+    ("Explain the indemnification terms in this agreement", "legal"),
+]
+
+
+def test_keyword_batch_matches_single_prompt_classification():
+    assert KeywordClassifier().classify_batch(PROMPTS) == [detect_task_type(p) for p in PROMPTS]
+
+
+def test_linear_batch_is_chunked_and_matches_single_prompt_classification():
+    pytest.importorskip("numpy")
+    from api.task_classifier import HashedLinearClassifier
+
+    prompts, labels = zip(*TRAINING)
+    classifier = HashedLinearClassifier.train(list(prompts), list(labels), dim=512, epochs=30)
+    classifier.chunk_size = 4
+    rows_seen = []
+    transform_batch = classifier.vectorizer.transform_batch
+
+    def recording_transform(texts):
+        rows_seen.append(len(texts))
+        return transform_batch(texts)
+
+    classifier.vectorizer.transform_batch = recording_transform
+    batch = PROMPTS * 3
+    labels = classifier.classify_batch(batch)
+    assert max(rows_seen) == 4
+    assert sum(rows_seen) == len(batch)
+    assert labels == [classifier.classify(p) for p in batch]
+    assert classifier.classify_batch([]) == []
+    assert classifier.classify("Write a Go function to reverse a linked list") == "code_generation"
+
+
+def test_linear_classifier_rejects_empty_chunks():
+    np = pytest.importorskip("numpy")
+    from api.task_classifier import HashedLinearClassifier
+
+    with pytest.raises(RuntimeError, match="TASK_CLASSIFIER_CHUNK_SIZE"):
+        HashedLinearClassifier(np.zeros((8, 2)), np.zeros(2), ["a", "b"], dim=8, chunk_size=0)
@@ -0,0 +1,37 @@
+"""
+Per-client usage totals
+"""
+
+from api.usage_ledger import UsageLedger
+
+
+def result(tokens=10, **extra):
+    return {"model": "qwen/qwen-2.5-coder-32b", "response": "x", "success": True, "tokens": tokens, **extra}
+
+
+def test_totals_by_client_and_task_type():
+    ledger = UsageLedger()
+    ledger.record("key-A", "code_generation", [result(), result(cached=True), {**result(), "success": False}])
+    ledger.record("key-B", "research", [result(20)])
+    usage = ledger.usage("key-A")
+    assert usage["total"]["requests"] == 1
+    assert usage["total"]["calls"] == 1
+    assert usage["total"]["reused_calls"] == 1
+    assert usage["total"]["total_tokens"] == 10
+    assert ledger.usage()["total"]["total_tokens"] == 30
+
+
+def test_least_recently_updated_entry_is_evicted():
+    ledger = UsageLedger(max_entries=2)
+    ledger.record("key-A", "code_generation", [result()])
+    ledger.record("key-B", "code_generation", [result()])
+    ledger.record("key-A", "code_generation", [result()])
+    ledger.record("key-C", "code_generation", [result()])
+    assert ledger.usage("key-A")["total"]["requests"] == 2
+    assert ledger.usage("key-B")["total"]["requests"] == 0
+    # A spoofed key per request cannot grow the ledger past its cap
+    for i in range(100):
+        ledger.record(f"spoofed-{i}", "code_generation", [result()])
+    stats = ledger.stats()
+    assert stats["entries"] == 2
+    assert stats["evicted"] == 101